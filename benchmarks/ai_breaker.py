@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Проверка автомата отключения AI на локальной заглушке OpenAI
+
+Заглушка работает нормально, затем отвечает ошибкой 500 (автомат
+размыкается), затем после паузы пробный запрос упирается в таймаут
+(автомат снова размыкается) и, наконец, проба проходит. Для каждой фазы
+выполняется серия check_content_safety и показывается время ответа,
+число запросов, дошедших до заглушки, и состояние автомата.
+
+Использование:
+    python benchmarks/ai_breaker.py [запросов_на_фазу]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TIMEOUT = 1.0
+FAILURES = 3
+RECOVERY = 2.0
+
+# (фаза, режим заглушки, пауза перед фазой)
+PHASES = [
+    ('норма', 'ok', 0),
+    ('ошибки 500', 'error', 0),
+    ('разомкнут', 'ok', 0),
+    ('проба: медленно', 'slow', RECOVERY + 0.1),
+    ('проба: норма', 'ok', RECOVERY + 0.1),
+]
+
+
+async def start_fake_openai():
+    """Заглушка /v1/chat/completions с переключаемым режимом"""
+    state = {'mode': 'ok', 'requests': 0}
+
+    async def handle(request: web.Request):
+        state['requests'] += 1
+        if state['mode'] == 'error':
+            return web.json_response({'error': {'message': 'injected failure'}}, status=500)
+        if state['mode'] == 'slow':
+            await asyncio.sleep(TIMEOUT * 3)
+        await asyncio.sleep(0.05)
+        return web.json_response({
+            'id': 'chatcmpl-local',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': 'gpt-3.5-turbo',
+            'usage': {'prompt_tokens': 90, 'completion_tokens': 1, 'total_tokens': 91},
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': 'ДА'}}],
+        })
+
+    app = web.Application()
+    app.router.add_post('/{tail:.*}', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}/v1', state
+
+
+async def main():
+    per_phase = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    runner, base_url, state = await start_fake_openai()
+
+    # Клиент OpenAI читает адрес и ключ из окружения при создании
+    os.environ['OPENAI_API_KEY'] = 'sk-local-stub'
+    os.environ['OPENAI_BASE_URL'] = base_url
+    from utils.ai_helper import AIHelper, CircuitBreaker
+
+    helper = AIHelper(timeout=TIMEOUT)
+    helper.breaker = CircuitBreaker(failure_threshold=FAILURES, recovery_timeout=RECOVERY)
+    # Кэш выключен, чтобы каждый вызов доходил до автомата
+    helper.cache.ttl = 0
+
+    print(f"🔌 Таймаут {TIMEOUT} с, размыкание после {FAILURES} сбоев, проба через {RECOVERY} с")
+    print(f"{'фаза':<16} | {'вызовов':>7} | {'средн., мс':>10} | {'макс., мс':>9} | {'до заглушки':>11} | {'автомат':<9}")
+    print("-" * 80)
+
+    try:
+        for index, (name, mode, pause) in enumerate(PHASES):
+            await asyncio.sleep(pause)
+            state['mode'] = mode
+            requests_before = state['requests']
+            latencies = []
+            for call in range(per_phase):
+                started = time.perf_counter()
+                # Каждый текст разный - вызовы не объединяются
+                await helper.check_content_safety(f"привет {index}-{call}")
+                latencies.append(time.perf_counter() - started)
+
+            print(
+                f"{name:<16} | {per_phase:>7} | {sum(latencies) / len(latencies) * 1000:>10.1f} | "
+                f"{max(latencies) * 1000:>9.1f} | {state['requests'] - requests_before:>11} | {helper.breaker.state:<9}"
+            )
+
+        print(f"\n📊 Автомат: {helper.breaker.stats()}")
+    finally:
+        await helper.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(level=logging.CRITICAL)
+    asyncio.run(main())
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест приема обновлений: long polling, webhook и воркеры
+
+В отдельном процессе работает "Telegram": заглушка Bot API (getMe,
+getUpdates, sendMessage и т.д.) с имитацией сетевой задержки и
+генератор синтетических обновлений с заданной частотой. В режиме
+polling обновления отдаются через getUpdates, в режиме webhook
+отправляются POST-запросами на WebhookServer (40 соединений, как у
+Telegram по умолчанию; на 503 запрос повторяется). Бот работает
+в основном процессе, его хендлер имитирует работу с базой паузой и
+отвечает сообщением через заглушку. В режиме workers основной процесс
+только получает обновления и раскладывает их по N процессам-воркерам
+по user_id (BOT_WORKERS > 1).
+
+Показывается пропускная способность (обновлений в секунду) и время от
+появления обновления в "Telegram" до конца его обработки (p50/p99).
+
+Использование:
+    python benchmarks/bot_updates.py [обновлений] [обновлений_в_секунду] [работа_мс] [rtt_мс] [воркеров]
+"""
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+from aiohttp import ClientSession, TCPConnector, web
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TOKEN = '123456:local-benchmark-token'
+USERS = 500
+TELEGRAM_CONNECTIONS = 40
+
+
+def make_update(update_id: int) -> dict:
+    user_id = 1000 + update_id % USERS
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Тест'},
+            # Время появления обновления (CLOCK_MONOTONIC общий для процессов)
+            'text': f"{update_id}:{time.monotonic()}",
+        },
+    }
+
+
+class FakeTelegram:
+    """Заглушка Bot API и генератор обновлений (работает в дочернем процессе)"""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.pending = []
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.retries = 0
+
+    async def handle(self, request: web.Request):
+        method = request.match_info['method']
+        # aiogram отправляет form-data, входной процесс воркеров - JSON
+        fields = await request.json() if request.content_type == 'application/json' else await request.post()
+        if method == 'getUpdates':
+            return web.json_response({'ok': True, 'result': await self._get_updates(fields)})
+
+        await asyncio.sleep(self.rtt)
+        if method == 'getMe':
+            result = {'id': 123456, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        elif method == 'sendMessage':
+            self.sent += 1
+            result = {
+                'message_id': self.sent,
+                'date': int(time.time()),
+                'chat': {'id': int(fields['chat_id']), 'type': 'private'},
+                'text': fields.get('text', ''),
+            }
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def _get_updates(self, fields):
+        # Половина RTT - запрос до Telegram, половина - ответ обратно
+        await asyncio.sleep(self.rtt / 2)
+        offset = int(fields.get('offset') or 0)
+        self.pending = [u for u in self.pending if u['update_id'] >= offset]
+        if not self.pending:
+            self.ready.clear()
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout=float(fields.get('timeout') or 0))
+            except asyncio.TimeoutError:
+                pass
+        updates = self.pending[:100]
+        await asyncio.sleep(self.rtt / 2)
+        return updates
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        return f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    async def generate(self, count: int, rate: float, webhook_url: str = None):
+        """Выдать count обновлений с частотой rate в секунду"""
+        session = ClientSession(connector=TCPConnector(limit=TELEGRAM_CONNECTIONS)) if webhook_url else None
+        posts = set()
+
+        async def post(update_id):
+            await asyncio.sleep(self.rtt / 2)
+            update = make_update(update_id)
+            while True:
+                async with session.post(webhook_url, json=update) as response:
+                    if response.status == 200:
+                        return
+                self.retries += 1
+                await asyncio.sleep(0.05)
+
+        started = time.perf_counter()
+        for update_id in range(1, count + 1):
+            delay = started + update_id / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if session is None:
+                self.pending.append(make_update(update_id))
+                self.ready.set()
+            else:
+                task = asyncio.create_task(post(update_id))
+                posts.add(task)
+                task.add_done_callback(posts.discard)
+
+        if session is not None:
+            await asyncio.gather(*list(posts))
+            await session.close()
+
+
+def telegram_process(rtt: float, to_bot, from_bot):
+    """Дочерний процесс: Bot API, затем генерация по команде (count, rate, webhook_url)"""
+    import logging
+    logging.basicConfig(level=logging.CRITICAL)
+
+    async def main():
+        telegram = FakeTelegram(rtt)
+        to_bot.put(await telegram.start())
+        count, rate, webhook_url = await asyncio.to_thread(from_bot.get)
+        await telegram.generate(count, rate, webhook_url)
+        to_bot.put(telegram.retries)
+        # Продолжаем отвечать на sendMessage, пока бот не закончит
+        await asyncio.to_thread(from_bot.get)
+        await telegram.runner.cleanup()
+
+    asyncio.run(main())
+
+
+def build_dispatcher(work: float, latencies: list, count: int = 0, finished: asyncio.Event = None):
+    """Диспетчер с одним хендлером: пауза, ответ, замер времени"""
+    from aiogram import Dispatcher, F
+    from aiogram.types import Message
+
+    dp = Dispatcher()
+
+    @dp.message(F.text)
+    async def handle(message: Message):
+        await asyncio.sleep(work)
+        await message.answer("ok")
+        latencies.append(time.monotonic() - float(message.text.split(':')[1]))
+        if finished is not None and len(latencies) >= count:
+            finished.set()
+
+    return dp
+
+
+def worker_process(updates, results, api_url: str, work: float):
+    """Процесс-воркер: обрабатывает свою очередь и возвращает замеры"""
+    import logging
+    logging.basicConfig(level=logging.CRITICAL)
+    from utils.bot_factory import create_bot
+    from utils.workers import WorkerFeeder
+
+    async def main():
+        latencies = []
+        bot = create_bot(TOKEN, api_url=api_url)
+        await WorkerFeeder(build_dispatcher(work, latencies), bot, updates).run()
+        await bot.session.close()
+        results.put(latencies)
+
+    asyncio.run(main())
+
+
+async def run_workers(count: int, rate: float, work: float, rtt: float, workers: int):
+    from utils.workers import UpdateRouter, poll_updates
+
+    ctx = multiprocessing.get_context('spawn')
+    to_bot, from_bot, results = ctx.Queue(), ctx.Queue(), ctx.Queue()
+    telegram = ctx.Process(target=telegram_process, args=(rtt, to_bot, from_bot))
+    telegram.start()
+    api_url = await asyncio.to_thread(to_bot.get)
+
+    queues = [ctx.Queue(maxsize=1000) for _ in range(workers)]
+    processes = [ctx.Process(target=worker_process, args=(q, results, api_url, work)) for q in queues]
+    for process in processes:
+        process.start()
+    router = UpdateRouter(queues)
+    receiver = asyncio.create_task(poll_updates(router, TOKEN, api_url=api_url, timeout=10))
+
+    # Воркеры стартуют дольше, чем основной процесс
+    await asyncio.sleep(3)
+    started = time.monotonic()
+    from_bot.put((count, rate, None))
+    await asyncio.to_thread(to_bot.get)
+    while sum(router.stats['routed']) < count:
+        await asyncio.sleep(0.01)
+    receiver.cancel()
+    await asyncio.gather(receiver, return_exceptions=True)
+    # Воркеры дорабатывают очередь и завершаются
+    router.stop_workers()
+    latencies = []
+    for _ in processes:
+        latencies.extend(await asyncio.to_thread(results.get))
+    elapsed = time.monotonic() - started
+    for process in processes:
+        process.join()
+    from_bot.put('stop')
+    telegram.join()
+
+    report(f"workers/{workers}", latencies, elapsed)
+
+
+def report(name: str, latencies: list, elapsed: float, extra: str = ''):
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{name:<12} | {len(latencies):>10} | {len(latencies) / elapsed:>7.0f} | {p50:>8.1f} | {p99:>8.1f} | {extra}")
+
+
+async def run(mode: str, count: int, rate: float, work: float, rtt: float, max_concurrency: int = 64):
+    from utils.bot_factory import create_bot
+    from utils.webhook import WebhookServer
+
+    ctx = multiprocessing.get_context('spawn')
+    to_bot, from_bot = ctx.Queue(), ctx.Queue()
+    telegram = ctx.Process(target=telegram_process, args=(rtt, to_bot, from_bot))
+    telegram.start()
+    api_url = await asyncio.to_thread(to_bot.get)
+
+    latencies = []
+    finished = asyncio.Event()
+    dp = build_dispatcher(work, latencies, count, finished)
+
+    bot = create_bot(TOKEN, api_url=api_url)
+    server = None
+    if mode == 'polling':
+        runner = asyncio.create_task(dp.start_polling(bot, polling_timeout=10, handle_signals=False))
+        webhook_url = None
+    else:
+        server = WebhookServer(dp, bot, host='127.0.0.1', port=0, max_concurrency=max_concurrency)
+        await server.start()
+        webhook_url = f"http://127.0.0.1:{server.port}{server.path}"
+
+    await asyncio.sleep(0.3)
+    started = time.monotonic()
+    from_bot.put((count, rate, webhook_url))
+    try:
+        await asyncio.wait_for(finished.wait(), timeout=300)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.monotonic() - started
+    retries = await asyncio.to_thread(to_bot.get)
+
+    if server is not None:
+        await server.stop()
+    else:
+        await dp.stop_polling()
+        await runner
+    await bot.session.close()
+    from_bot.put('stop')
+    telegram.join()
+
+    name = mode if server is None else f"{mode}/{max_concurrency}"
+    extra = f"повторов после 503: {retries}" if server is not None else ''
+    report(name, latencies, elapsed, extra)
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 500
+    work = (float(sys.argv[3]) if len(sys.argv) > 3 else 20) / 1000
+    rtt = (float(sys.argv[4]) if len(sys.argv) > 4 else 50) / 1000
+    workers = int(sys.argv[5]) if len(sys.argv) > 5 else os.cpu_count()
+
+    print(f"📨 Обновлений: {count}, частота: {rate:.0f}/с, работа хендлера: {work * 1000:.0f} мс, RTT: {rtt * 1000:.0f} мс")
+    print(f"{'режим':<12} | {'обработано':>10} | {'обн./с':>7} | {'p50, мс':>8} | {'p99, мс':>8} |")
+    print("-" * 76)
+    await run('polling', count, rate, work, rtt)
+    for max_concurrency in (16, 64, 256):
+        await run('webhook', count, rate, work, rtt, max_concurrency)
+    if workers > 1:
+        await run_workers(count, rate, work, rtt, workers)
+
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(level=logging.CRITICAL)
+    asyncio.run(main())
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк детекции лиц: полное разрешение против уменьшения перед детекцией
+
+Для каждого фото из папки сравнивает прежнюю детекцию (полное декодирование
+в цвет + cvtColor + каскад по всем пикселям) с текущей
+(уменьшенное декодирование JPEG до FACE_DETECTION_MAX_SIDE). Показывает
+процессорное время на фото и совпадение количества найденных лиц.
+
+Без своих фото можно взять синтетические: нарисованные лица разного размера
+на шумном фоне в размерах Telegram (1280 px) и камеры телефона (до 4032 px).
+Четверть фото - с маленьким лицом (3-8% короткой стороны, снимок в полный
+рост), четверть - без лица; совпадение на маленьких лицах показывается
+отдельно. Набор одинаков при каждом запуске.
+
+Использование:
+    python benchmarks/face_downscale.py <папка_с_фото> [max_side]
+    python benchmarks/face_downscale.py --synthetic [количество] [max_side]
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from config import Config
+from utils.face_detection import face_cascade, detect_face_boxes
+
+REPEATS = 3
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+SYNTHETIC_SIZES = ((1280, 960), (960, 1280), (1280, 1280), (2048, 1536), (4032, 3024))
+SYNTHETIC_SEED = 12
+# Размер лица в долях короткой стороны; виды чередуются независимо от размеров фото
+SYNTHETIC_FACES = {'face': (0.15, 0.6), 'small': (0.03, 0.08), 'none': None}
+SYNTHETIC_KINDS = ('face', 'small', 'face', 'none')
+
+
+def draw_face(image: np.ndarray, cx: int, cy: int, size: int, rng: np.random.Generator):
+    """Нарисовать схематичное лицо размером size пикселей"""
+    skin = int(rng.integers(150, 220))
+    cv2.ellipse(image, (cx, cy), (int(size * 0.42), int(size * 0.55)), 0, 0, 360, (skin - 20, skin, skin + 20), -1)
+    # Волосы
+    cv2.ellipse(image, (cx, cy - int(size * 0.52)), (int(size * 0.45), int(size * 0.22)), 0, 180, 360, (30, 30, 40), -1)
+    for side in (-1, 1):
+        ex, ey = cx + side * int(size * 0.17), cy - int(size * 0.1)
+        cv2.ellipse(image, (ex, ey - int(size * 0.09)), (int(size * 0.1), int(size * 0.025)), 0, 0, 360, (40, 40, 50), -1)
+        cv2.ellipse(image, (ex, ey), (int(size * 0.08), int(size * 0.04)), 0, 0, 360, (255, 255, 255), -1)
+        cv2.circle(image, (ex, ey), int(size * 0.035), (30, 20, 20), -1)
+    cv2.line(image, (cx, cy - int(size * 0.05)), (cx - int(size * 0.04), cy + int(size * 0.12)),
+             (skin - 60,) * 3, max(1, size // 60))
+    cv2.ellipse(image, (cx, cy + int(size * 0.25)), (int(size * 0.13), int(size * 0.04)), 0, 0, 360, (60, 60, 150), -1)
+
+
+def synthetic_photos(count: int):
+    """Синтетические JPEG: (имя, содержимое)"""
+    rng = np.random.default_rng(SYNTHETIC_SEED)
+    for index in range(count):
+        width, height = SYNTHETIC_SIZES[index % len(SYNTHETIC_SIZES)]
+        background = np.full((height, width, 3), rng.integers(60, 200, size=3), np.uint8)
+        noise = rng.normal(0, 12, background.shape)
+        image = cv2.GaussianBlur((background + noise).clip(0, 255).astype(np.uint8), (0, 0), 2)
+
+        kind = SYNTHETIC_KINDS[index % len(SYNTHETIC_KINDS)]
+        face_range = SYNTHETIC_FACES[kind]
+        if face_range is not None:
+            size = int(min(width, height) * rng.uniform(*face_range))
+            cx = int(rng.integers(size // 2, width - size // 2))
+            cy = int(rng.integers(size, height - size // 2))
+            draw_face(image, cx, cy, size, rng)
+        image = cv2.GaussianBlur(image, (0, 0), max(width, height) / 1500)
+
+        jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 87])[1].tobytes()
+        yield f"synthetic_{index:02d}_{kind}.jpg", jpeg
+
+
+def folder_photos(folder: str):
+    """Фото из папки: (имя, содержимое)"""
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith(EXTENSIONS):
+            with open(os.path.join(folder, name), 'rb') as f:
+                yield name, f.read()
+
+
+def detect_legacy(image_bytes: bytes) -> int:
+    """Детекция в том виде, в каком она была до уменьшения фото"""
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return -1
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    faces = face_cascade.detectMultiScale(
+        gray,
+        scaleFactor=1.1,
+        minNeighbors=5,
+        minSize=(30, 30),
+        flags=cv2.CASCADE_SCALE_IMAGE
+    )
+    return len(faces)
+
+
+def detect_downscaled(image_bytes: bytes, max_side: int) -> int:
+    boxes, _ = detect_face_boxes(image_bytes, face_cascade, max_side)
+    return -1 if boxes is None else len(boxes)
+
+
+def verdict(face_count: int) -> str:
+    """Итог проверки фото, который видит пользователь"""
+    if face_count < 0:
+        return 'ошибка'
+    return {0: 'нет лица', 1: 'одно лицо'}.get(face_count, 'несколько')
+
+
+def cpu_time(func, *args):
+    """Среднее процессорное время вызова и его результат"""
+    result = None
+    started = time.process_time()
+    for _ in range(REPEATS):
+        result = func(*args)
+    return (time.process_time() - started) / REPEATS, result
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    if sys.argv[1] == '--synthetic':
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+        max_side = int(sys.argv[3]) if len(sys.argv) > 3 else Config.FACE_DETECTION_MAX_SIDE
+        photos = list(synthetic_photos(count))
+    else:
+        max_side = int(sys.argv[2]) if len(sys.argv) > 2 else Config.FACE_DETECTION_MAX_SIDE
+        photos = list(folder_photos(sys.argv[1]))
+        if not photos:
+            print(f"❌ В папке {sys.argv[1]} нет фото")
+            sys.exit(1)
+    cv2.setNumThreads(1)
+
+    print(f"📸 Фото: {len(photos)}, max_side={max_side}, повторов: {REPEATS}")
+    print(f"{'файл':<28} | {'размер':>11} | {'было, мс':>9} | {'стало, мс':>9} | {'лиц было/стало':>14}")
+    print("-" * 84)
+
+    legacy_total = current_total = 0.0
+    agreed = 0
+    verdicts_agreed = 0
+    # Маленькие лица: их уменьшение теряет первым
+    small = small_agreed = 0
+    for name, image_bytes in photos:
+        height, width = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_GRAYSCALE).shape[:2]
+
+        legacy_time, legacy_faces = cpu_time(detect_legacy, image_bytes)
+        current_time, current_faces = cpu_time(detect_downscaled, image_bytes, max_side)
+        legacy_total += legacy_time
+        current_total += current_time
+        agreed += legacy_faces == current_faces
+        verdicts_agreed += verdict(legacy_faces) == verdict(current_faces)
+        if '_small' in name:
+            small += 1
+            small_agreed += verdict(legacy_faces) == verdict(current_faces)
+
+        mark = "" if verdict(legacy_faces) == verdict(current_faces) else "  ⚠️"
+        print(
+            f"{name[:28]:<28} | {f'{width}x{height}':>11} | {legacy_time * 1000:>9.1f} | "
+            f"{current_time * 1000:>9.1f} | {f'{legacy_faces}/{current_faces}':>14}{mark}"
+        )
+
+    count = len(photos)
+    print("-" * 84)
+    print(f"⏱️  Среднее CPU-время на фото: {legacy_total / count * 1000:.1f} мс -> {current_total / count * 1000:.1f} мс "
+          f"(x{legacy_total / current_total:.1f})")
+    print(f"🎯 Совпадение количества лиц: {agreed}/{count} ({agreed / count:.0%})")
+    print(f"✅ Совпадение итога проверки (нет/одно/несколько): {verdicts_agreed}/{count} ({verdicts_agreed / count:.0%})")
+    if small:
+        print(f"🔍 Из них фото с маленьким лицом (3-8% стороны): {small_agreed}/{small} ({small_agreed / small:.0%})")
+
+
+if __name__ == "__main__":
+    main()
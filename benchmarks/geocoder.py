@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк офлайн-геокодера: KD-дерево против полного перебора
+
+Запросы - случайные точки в пределах 30 км от городов набора (так выглядят
+реальные геолокации пользователей). Проверяет, что дерево находит тот же
+город, что и перебор всех городов, и показывает время одного запроса.
+
+Использование:
+    python benchmarks/geocoder.py [количество_запросов]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from utils.geocoder import ReverseGeocoder, to_unit_vectors
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    geocoder = ReverseGeocoder()
+
+    started = time.perf_counter()
+    geocoder.load()
+    print(f"🗺️ Городов: {len(geocoder.cities)}, загрузка и построение дерева: {time.perf_counter() - started:.2f} с")
+
+    random.seed(42)
+    queries = []
+    for city in random.choices(geocoder.cities, k=total):
+        queries.append((
+            max(-90.0, min(90.0, city.latitude + random.uniform(-0.27, 0.27))),
+            city.longitude + random.uniform(-0.27, 0.27)
+        ))
+
+    started = time.perf_counter()
+    tree_results = [geocoder.nearest(lat, lon)[0] for lat, lon in queries]
+    tree_time = (time.perf_counter() - started) / total
+
+    # Полный перебор на NumPy: расстояние до каждого города
+    points = to_unit_vectors(
+        np.array([c.latitude for c in geocoder.cities]),
+        np.array([c.longitude for c in geocoder.cities])
+    )
+    brute_count = min(total, 2000)
+    started = time.perf_counter()
+    mismatches = 0
+    for (lat, lon), found in zip(queries[:brute_count], tree_results):
+        point = to_unit_vectors(np.array([lat]), np.array([lon]))[0]
+        distances = ((points - point) ** 2).sum(axis=1)
+        best = distances.min()
+        found_point = to_unit_vectors(np.array([found.latitude]), np.array([found.longitude]))[0]
+        mismatches += ((found_point - point) ** 2).sum() > best + 1e-12
+    brute_time = (time.perf_counter() - started) / brute_count
+
+    print(f"🔎 Запросов: {total} (проверка перебором: {brute_count})")
+    print(f"⏱️  KD-дерево: {tree_time * 1e6:.1f} мкс на запрос")
+    print(f"⏱️  Перебор:   {brute_time * 1e6:.1f} мкс на запрос (x{brute_time / tree_time:.0f})")
+    if mismatches:
+        print(f"❌ Расхождений с перебором: {mismatches}")
+        return 1
+    print("✅ Результаты совпадают с перебором")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
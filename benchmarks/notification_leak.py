@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Проверка утечки соединений при отправке уведомлений о лайках
+
+Поднимает локальную заглушку Telegram Bot API, отправляет уведомления сразу,
+в обход очереди (как до появления notification_outbox), и следит за числом
+открытых файловых дескрипторов процесса (Linux, /proc/self/fd).
+
+Использование:
+    python benchmarks/notification_leak.py [количество] [--legacy]
+
+--legacy создает новый Bot(token=...) на каждое уведомление, как делалось
+раньше, чтобы увидеть утечку. Каждый такой Bot заново загружает SSL-контекст,
+поэтому для этого режима лучше брать несколько сотен уведомлений.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from database import Database
+from utils.bot_factory import create_bot
+
+TOKEN = '123456:TEST-TOKEN-for-local-stub'
+CONCURRENCY = 100
+POOL_SIZE = 20
+CHECKPOINTS = 10
+# Допустимый рост дескрипторов: пул соединений и служебные файлы
+ALLOWED_GROWTH = POOL_SIZE + 10
+
+
+def open_fds() -> int:
+    return len(os.listdir('/proc/self/fd'))
+
+
+async def send_like_notification(db: Database, to_user_id: int, bot: Bot) -> bool:
+    """Отправить уведомление о лайке сразу, без очереди"""
+    try:
+        text = await db.get_likes_notification_text(to_user_id)
+        if text is None:
+            return False
+        await bot.send_message(chat_id=to_user_id, text=text, parse_mode="HTML")
+        return True
+    except Exception as e:
+        print(f"❌ Не удалось отправить уведомление: {e}")
+        return False
+
+
+async def start_stub_api():
+    """Заглушка Bot API: на любой метод отвечает успешным sendMessage"""
+    sent = {'count': 0}
+
+    async def handle(request: web.Request):
+        sent['count'] += 1
+        data = await request.post()
+        return web.json_response({
+            'ok': True,
+            'result': {
+                'message_id': sent['count'],
+                'date': int(time.time()),
+                'chat': {'id': int(data.get('chat_id', 0)), 'type': 'private'},
+                'text': data.get('text', ''),
+            }
+        })
+
+    app = web.Application()
+    app.router.add_post('/{tail:.*}', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}', sent
+
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 10000
+    legacy = '--legacy' in sys.argv
+
+    runner, api_url, sent = await start_stub_api()
+    db = Database(os.path.join(tempfile.mkdtemp(), 'leak.db'))
+    await db.init_db()
+
+    shared_bot = create_bot(TOKEN, pool_size=POOL_SIZE, api_url=api_url)
+    legacy_bots = []
+
+    try:
+        # Получатель уведомлений и один непросмотренный лайк для него
+        await db.create_or_update_user(1, name='sender', age=25, gender='male', looking_for='female')
+        await db.create_or_update_user(2, name='receiver', age=25, gender='female', looking_for='male')
+        await db.create_swipe(1, 2, is_like=True)
+
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+
+        async def notify():
+            async with semaphore:
+                if legacy:
+                    bot = Bot(token=TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(api_url)))
+                    legacy_bots.append(bot)
+                else:
+                    bot = shared_bot
+                return await send_like_notification(db, 2, bot)
+
+        # Прогрев: первое соединение к заглушке и загрузка кэшей
+        await notify()
+        baseline = open_fds()
+
+        print(f"📨 Уведомлений: {total} ({'новый Bot на каждое' if legacy else 'общий Bot'})")
+        print(f"📂 Дескрипторов после прогрева: {baseline}")
+        print(f"{'отправлено':>12} | {'дескрипторов':>13} | {'рост':>6}")
+        print("-" * 38)
+
+        started = time.perf_counter()
+        step = max(1, total // CHECKPOINTS)
+        failed = 0
+        max_growth = 0
+        for done in range(0, total, step):
+            batch = min(step, total - done)
+            results = await asyncio.gather(*[notify() for _ in range(batch)])
+            failed += results.count(False)
+            fds = open_fds()
+            max_growth = max(max_growth, fds - baseline)
+            print(f"{done + batch:>12} | {fds:>13} | {fds - baseline:>+6}")
+        elapsed = time.perf_counter() - started
+
+        print(f"\n⏱️  {elapsed:.2f} с, {total / elapsed:.0f} уведомлений/с, ошибок: {failed}")
+        print(f"📬 Заглушка получила запросов: {sent['count']}")
+        if max_growth <= ALLOWED_GROWTH:
+            print(f"✅ Утечки нет: рост дескрипторов {max_growth} <= {ALLOWED_GROWTH}")
+            return 0
+        print(f"❌ Дескрипторы растут: +{max_growth} (допустимо {ALLOWED_GROWTH})")
+        return 1
+    finally:
+        for bot in legacy_bots:
+            await bot.session.close()
+        await shared_bot.session.close()
+        await db.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк подбора кандидатов: задержка в зависимости от количества свайпов
+
+Сравнивает прежний запрос (acos по всей таблице + NOT IN по swipes)
+с текущим Database.get_users_for_swipe (R*Tree + множество просмотренных).
+
+Использование:
+    python benchmarks/seen_set.py [количество_пользователей]
+"""
+
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+VIEWER_ID = 1
+SWIPE_COUNTS = [0, 100, 1000, 10000, 50000, 100000]
+REPEATS = 20
+
+LEGACY_QUERY = '''
+    SELECT * FROM (
+        SELECT *,
+               (6371 * acos(cos(radians(?)) * cos(radians(latitude)) *
+                cos(radians(longitude) - radians(?)) +
+                sin(radians(?)) * sin(radians(latitude)))) AS distance
+        FROM users
+        WHERE user_id != ?
+        AND is_active = 1
+        AND age BETWEEN ? AND ?
+        AND gender = ?
+        AND latitude IS NOT NULL
+        AND longitude IS NOT NULL
+        AND user_id NOT IN (
+            SELECT to_user_id FROM swipes WHERE from_user_id = ?
+        )
+    ) subquery
+    WHERE distance <= 100
+    ORDER BY distance ASC, last_active DESC
+    LIMIT ?
+'''
+
+
+def populate(path: str, users: int):
+    """Наполнить базу случайными анкетами по европейской части России"""
+    rnd = random.Random(42)
+    conn = sqlite3.connect(path)
+    conn.execute(
+        'INSERT INTO users (user_id, name, age, gender, looking_for, latitude, longitude, min_age, max_age, search_radius) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (VIEWER_ID, 'viewer', 25, 'male', 'female', 55.75, 37.62, 18, 40, 100)
+    )
+    conn.executemany(
+        'INSERT INTO users (user_id, name, age, gender, looking_for, latitude, longitude, last_active) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, datetime(\'now\', ?))',
+        [
+            (
+                user_id, f'user{user_id}', rnd.randint(18, 40), 'female', 'male',
+                rnd.uniform(45.0, 65.0), rnd.uniform(25.0, 60.0),
+                f'-{rnd.randint(0, 10000)} minutes'
+            )
+            for user_id in range(2, users + 2)
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+
+def add_swipes(path: str, target: int):
+    """Догнать количество свайпов зрителя до target (сначала свайпаются ближайшие)"""
+    conn = sqlite3.connect(path)
+    current = conn.execute('SELECT COUNT(*) FROM swipes WHERE from_user_id = ?', (VIEWER_ID,)).fetchone()[0]
+    rows = conn.execute(
+        'SELECT user_id FROM users WHERE user_id != ? '
+        'ORDER BY (latitude - 55.75) * (latitude - 55.75) + (longitude - 37.62) * (longitude - 37.62) '
+        'LIMIT ? OFFSET ?',
+        (VIEWER_ID, target - current, current)
+    ).fetchall()
+    conn.executemany(
+        'INSERT OR IGNORE INTO swipes (from_user_id, to_user_id, is_like) VALUES (?, ?, 0)',
+        [(VIEWER_ID, user_id) for user_id, in rows]
+    )
+    conn.commit()
+    conn.close()
+
+
+def bench_legacy(path: str) -> float:
+    conn = sqlite3.connect(path)
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        conn.execute(LEGACY_QUERY, (55.75, 37.62, 55.75, VIEWER_ID, 18, 40, 'female', VIEWER_ID, 100)).fetchall()
+    elapsed = (time.perf_counter() - started) / REPEATS
+    conn.close()
+    return elapsed
+
+
+async def bench_current(path: str) -> float:
+    db = Database(path)
+    await db.init_db()
+    try:
+        # Первый вызов загружает множество просмотренных в память
+        await db.get_users_for_swipe(VIEWER_ID, limit=100)
+        started = time.perf_counter()
+        for _ in range(REPEATS):
+            await db.get_users_for_swipe(VIEWER_ID, limit=100)
+        return (time.perf_counter() - started) / REPEATS
+    finally:
+        await db.close()
+
+
+async def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    db = Database(path)
+    await db.init_db()
+    await db.close()
+    populate(path, users)
+
+    print(f"👥 Пользователей: {users}")
+    print(f"{'свайпов':>10} | {'NOT IN + acos, мс':>18} | {'seen-set + R*Tree, мс':>22}")
+    print("-" * 58)
+    for swipes in SWIPE_COUNTS:
+        if swipes > users:
+            break
+        add_swipes(path, swipes)
+        legacy = bench_legacy(path)
+        current = await bench_current(path)
+        print(f"{swipes:>10} | {legacy * 1000:>18.2f} | {current * 1000:>22.2f}")
+
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк ограничения частоты: память и накладные расходы на событие
+
+Прогоняет события от большого числа разных пользователей через
+TokenBucketLimiter и через прежнюю схему (словарь user_id -> время
+последнего сообщения без очистки). Время моделируется, поэтому
+"час работы бота" занимает секунды.
+
+Использование:
+    python benchmarks/throttling.py [пользователей]
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middlewares.throttling import COST_AI, TokenBucketLimiter
+
+EVENTS_PER_SECOND = 2000
+IDLE_TTL = 60.0
+
+
+class LegacyLimiter:
+    """Прежняя логика ThrottlingMiddleware: интервал 1 с, ключи не удаляются"""
+
+    def __init__(self, rate_limit: float = 1.0):
+        self.rate_limit = rate_limit
+        self.last_message_time = {}
+
+    def hit(self, key: int, now: float) -> bool:
+        if now - self.last_message_time.get(key, 0) < self.rate_limit:
+            return False
+        self.last_message_time[key] = now
+        return True
+
+
+def run(limiter, users: int):
+    """Все пользователи по очереди, EVENTS_PER_SECOND событий в секунду модельного времени"""
+    random.seed(1)
+    keys = list(range(10_000_000, 10_000_000 + users))
+    random.shuffle(keys)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    now = 1.0
+    step = 1.0 / EVENTS_PER_SECOND
+    for key in keys:
+        limiter.hit(key, now)
+        now += step
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / users, current, peak, now
+
+
+def burst_check():
+    """Альбом из 10 фото, частые нажатия кнопок и дорогие вызовы"""
+    messages = TokenBucketLimiter(rate=1.0, burst=10)
+    album = sum(messages.hit(1, now=0.01 * i) for i in range(10))
+    callbacks = TokenBucketLimiter(rate=2.0, burst=5)
+    presses = sum(callbacks.hit(1, now=0.05 * i) for i in range(20))
+    legacy = LegacyLimiter()
+    legacy_album = sum(legacy.hit(1, now=1 + 0.01 * i) for i in range(10))
+    print(f"📸 Альбом из 10 фото: пропущено {album}/10 (прежде {legacy_album}/10)")
+    print(f"👆 20 нажатий за 1 с: пропущено {presses}/20 (burst 5 + 2/с)")
+    # Стоимость 5 (AI) при burst 10 и 2/с: два вызова подряд, дальше один в 2,5 с
+    callbacks = TokenBucketLimiter(rate=2.0, burst=10)
+    ai_calls = sum(callbacks.hit(1, now=0.5 * i, cost=COST_AI) for i in range(20))
+    print(f"🤖 20 вызовов AI за 10 с: пропущено {ai_calls}/20 (стоимость {COST_AI})")
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    # Отдельный прогон без tracemalloc - чистое время на событие
+    limiter = TokenBucketLimiter(rate=1.0, burst=10, idle_ttl=IDLE_TTL)
+    keys = list(range(users))
+    started = time.perf_counter()
+    for i, key in enumerate(keys):
+        limiter.hit(key, i / EVENTS_PER_SECOND)
+    per_event = (time.perf_counter() - started) / users
+
+    print(f"👥 Пользователей: {users}, {EVENTS_PER_SECOND} событий/с модельного времени")
+    print(f"⏱️  Накладные расходы: {per_event * 1e9:.0f} нс на событие")
+    print()
+    # Под tracemalloc время на событие завышено, важна разница между схемами
+    print(f"{'схема':<22} | {'ключей':>9} | {'память, МБ':>10} | {'пик, МБ':>8} | {'нс/событие':>10}")
+    print("-" * 72)
+
+    for name, limiter in (
+        ('token bucket', TokenBucketLimiter(rate=1.0, burst=10, idle_ttl=IDLE_TTL)),
+        ('прежняя (dict)', LegacyLimiter()),
+    ):
+        per_event, current, peak, end = run(limiter, users)
+        keys_held = len(limiter) if isinstance(limiter, TokenBucketLimiter) else len(limiter.last_message_time)
+        print(f"{name:<22} | {keys_held:>9} | {current / 2**20:>10.1f} | {peak / 2**20:>8.1f} | {per_event * 1e9:>10.0f}")
+
+        if isinstance(limiter, TokenBucketLimiter):
+            # Еще два интервала тишины: все ведра полные, ключи вытеснены
+            limiter.hit(0, end + 2 * limiter.rotate_interval + 1)
+            print(f"{'  после простоя':<22} | {len(limiter):>9} |")
+
+    print()
+    burst_check()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,24 @@
 import asyncio
 import logging
+import multiprocessing
+import signal
 from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import BotCommand
+from aiohttp import web
 from config import Config
-from database import Database
+from database import Database, SQLiteStorage
 from handlers import register_all_handlers
+from utils.bot_factory import create_bot
+from utils.notifications import NotificationSender
+from utils.face_detection import face_engine, photo_downloader
+from utils.ai_helper import ai_helper
+from utils.conversation_starters import conversation_starters
+from utils.geocoder import reverse_geocoder
+from middlewares import ThrottlingMiddleware
+from utils.webhook import WebhookServer
+from utils.workers import InvalidationBus, UpdateRouter, WorkerFeeder, create_webhook_app, poll_updates
 
 # Настройка логирования
 logging.basicConfig(
@@ -27,30 +40,104 @@ async def setup_bot_commands(bot: Bot):
     await bot.set_my_commands(commands)
     logger.info("Команды бота настроены")
 
-async def on_startup(bot: Bot, db: Database):
-    """Действия при запуске бота"""
-    await db.init_db()
-    await setup_bot_commands(bot)
+async def on_startup(bot: Bot, db: Database, storage: BaseStorage, notifier: NotificationSender,
+                     primary: bool = True, create_schema: bool = True):
+    """Действия при запуске бота
+    
+    primary=False - дополнительный воркер без уведомлений и команд;
+    create_schema=False - схему базы уже создал входной процесс
+    """
+    # Воркеры детекции лиц запускаем до открытия соединений с базой
+    await face_engine.start()
+    await photo_downloader.start()
+    # Дерево городов строим заранее, чтобы первая геолокация не ждала загрузки
+    await asyncio.to_thread(reverse_geocoder.load)
+    await db.init_db(create_schema=create_schema)
+    await ai_helper.cache.attach(db)
+    if isinstance(storage, SQLiteStorage):
+        storage.start()
+    if primary:
+        notifier.start()
+        await setup_bot_commands(bot)
     logger.info("Бот запущен и готов к работе!")
 
-async def on_shutdown():
+async def on_shutdown(db: Database, storage: BaseStorage, notifier: NotificationSender):
     """Действия при остановке бота"""
+    await conversation_starters.stop()
+    await notifier.stop()
+    # Незаписанные состояния FSM сохраняем, пока пул еще открыт
+    await storage.close()
+    await db.close()
+    await photo_downloader.close()
+    await ai_helper.close()
+    await reverse_geocoder.close()
+    face_engine.shutdown()
     logger.info("Бот остановлен")
 
-async def main():
-    """Главная функция запуска бота"""
-    # Проверяем наличие токена
-    if not Config.BOT_TOKEN:
-        logger.error("BOT_TOKEN не найден в переменных окружения!")
-        return
+async def wait_for_stop_signal():
+    """Ждать SIGINT/SIGTERM (в режиме webhook сигналы не обрабатывает aiogram)"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: остановка по KeyboardInterrupt
+            pass
+    await stop.wait()
+    logger.info("Получен сигнал остановки")
+
+def create_app():
+    """Бот, диспетчер с хендлерами и все, что нужно для их работы"""
+    # Создаем экземпляр бота
+    # Бот один на все приложение: хендлеры получают его аргументом bot
+    bot = create_bot(
+        Config.BOT_TOKEN,
+        pool_size=Config.BOT_HTTP_POOL_SIZE,
+        api_url=Config.TELEGRAM_API_URL or None
+    )
     
-    # Создаем экземпляры бота и диспетчера
-    bot = Bot(token=Config.BOT_TOKEN)
-    storage = MemoryStorage()
+    # Создаем экземпляр базы данных
+    db = Database(
+        Config.DATABASE_URL,
+        pool_size=Config.DB_POOL_SIZE,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_metrics=Config.DB_POOL_METRICS,
+        storage_mode=Config.DB_STORAGE_MODE,
+        cache_size_kb=Config.DB_CACHE_SIZE_KB,
+        mmap_size_mb=Config.DB_MMAP_SIZE_MB,
+        deck_size=Config.SWIPE_DECK_SIZE,
+        deck_low_water=Config.SWIPE_DECK_LOW_WATER,
+        user_cache_size=Config.USER_CACHE_SIZE,
+        user_cache_ttl=Config.USER_CACHE_TTL,
+        counters_flush_interval=Config.COUNTERS_FLUSH_INTERVAL_MS / 1000,
+        counters_flush_events=Config.COUNTERS_FLUSH_EVENTS
+    )
+    
+    # Состояния FSM храним в той же базе, чтобы анкета в процессе
+    # заполнения не терялась при перезапуске
+    if Config.FSM_STORAGE == 'memory':
+        storage = MemoryStorage()
+    else:
+        storage = SQLiteStorage(
+            db.pool,
+            ttl=Config.FSM_STATE_TTL,
+            cache_size=Config.FSM_CACHE_SIZE,
+            flush_interval=Config.FSM_FLUSH_INTERVAL_MS / 1000,
+            max_pending=Config.FSM_FLUSH_KEYS
+        )
     dp = Dispatcher(storage=storage)
     
-    # Создаем экземпляр базы данных
-    db = Database(Config.DATABASE_URL)
+    # Уведомления о лайках и матчах отправляются в фоне из очереди в базе
+    notifier = NotificationSender(
+        bot,
+        db,
+        global_rate=Config.NOTIFY_GLOBAL_RATE,
+        per_chat_interval=Config.NOTIFY_PER_CHAT_INTERVAL,
+        max_attempts=Config.NOTIFY_MAX_ATTEMPTS,
+        # Воркеры не будят отправителя из другого процесса - проверяем очередь чаще
+        poll_interval=1.0 if Config.BOT_WORKERS > 1 else 5.0
+    )
     
     # Регистрируем middleware для передачи db в хендлеры
     from aiogram import BaseMiddleware
@@ -70,15 +157,29 @@ async def main():
             data['db'] = self.db
             return await handler(event, data)
     
-    # Регистрируем middleware
+    # Регистрируем middleware. Ограничение частоты - первым: отклоненное
+    # событие не должно доходить до базы. Стоимость задается флагом
+    # throttling_cost у хендлера
+    throttling = ThrottlingMiddleware(
+        message_rate=Config.THROTTLE_MESSAGE_RATE,
+        message_burst=Config.THROTTLE_MESSAGE_BURST,
+        callback_rate=Config.THROTTLE_CALLBACK_RATE,
+        callback_burst=Config.THROTTLE_CALLBACK_BURST,
+        idle_ttl=Config.THROTTLE_IDLE_TTL
+    )
+    dp.message.middleware(throttling)
+    dp.callback_query.middleware(throttling)
     db_middleware = DatabaseMiddleware(db)
     dp.message.middleware(db_middleware)
     dp.callback_query.middleware(db_middleware)
     
     # Регистрируем обработчики
-    register_all_handlers(dp)
+    register_handlers(dp)
     
-    # Добавляем обработчики команд
+    return bot, dp, db, storage, notifier, throttling
+
+def create_commands_router():
+    """Обработчики команд меню (/profile, /search, /settings, /help)"""
     from aiogram import Router
     from aiogram.types import Message
     from aiogram.filters import Command
@@ -176,18 +277,171 @@ async def main():
             reply_markup=get_main_menu_keyboard(has_profile=True)
         )
     
-    dp.include_router(commands_router)
+    return commands_router
+
+def register_handlers(dp: Dispatcher):
+    """Регистрация всех обработчиков, включая команды меню"""
+    register_all_handlers(dp)
+    dp.include_router(create_commands_router())
+
+async def run_single():
+    """Один процесс: получение и обработка обновлений"""
+    bot, dp, db, storage, notifier, throttling = create_app()
     
     # Запускаем бота
+    webhook_server = None
     try:
-        await on_startup(bot, db)
-        await dp.start_polling(bot)
+        await on_startup(bot, db, storage, notifier)
+        if Config.BOT_RUN_MODE == 'webhook':
+            webhook_server = WebhookServer(
+                dp,
+                bot,
+                host=Config.WEBHOOK_HOST,
+                port=Config.WEBHOOK_PORT,
+                path=Config.WEBHOOK_PATH,
+                secret_token=Config.WEBHOOK_SECRET or None,
+                max_concurrency=Config.WEBHOOK_MAX_CONCURRENCY,
+                max_pending=Config.WEBHOOK_MAX_PENDING
+            )
+            await webhook_server.start()
+            await bot.set_webhook(
+                Config.WEBHOOK_URL.rstrip('/') + Config.WEBHOOK_PATH,
+                secret_token=Config.WEBHOOK_SECRET or None,
+                allowed_updates=dp.resolve_used_update_types()
+            )
+            await wait_for_stop_signal()
+        else:
+            # Пока установлен webhook, getUpdates не работает
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     except KeyboardInterrupt:
         logger.info("Получен сигнал остановки")
     finally:
-        await on_shutdown()
+        # Webhook не удаляем: пока бот перезапускается, Telegram копит обновления
+        if webhook_server is not None:
+            await webhook_server.stop()
+            logger.info(f"Webhook stats: {webhook_server.handler.stats()}")
+        logger.info(f"Throttling stats: {throttling.stats()}")
+        await on_shutdown(db, storage, notifier)
         await bot.session.close()
 
+def run_worker(index: int, updates, invalidations):
+    """Точка входа процесса-воркера (многопроцессный режим)"""
+    # Ctrl+C и SIGTERM (systemd, docker stop) получает вся группа процессов; воркер
+    # завершается по команде входного процесса, сохранив состояния FSM и счетчики
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(worker_main(index, updates, invalidations))
+
+async def worker_main(index: int, updates, invalidations):
+    """Воркер обрабатывает обновления своих пользователей из очереди"""
+    bot, dp, db, storage, notifier, throttling = create_app()
+    # Анкеты кэшируются в каждом воркере - сбросы кэша рассылаем остальным
+    bus = InvalidationBus(index, invalidations)
+    db.on_invalidate = bus.publish
+    # Уведомления и команды - только из первого воркера, чтобы не дублировать
+    primary = index == 0
+    feeder = WorkerFeeder(
+        dp,
+        bot,
+        updates,
+        max_concurrency=Config.WORKER_MAX_CONCURRENCY,
+        max_pending=Config.WORKER_QUEUE_SIZE
+    )
+    try:
+        bus.start(db)
+        # Схему и геоиндекс уже подготовил входной процесс
+        await on_startup(bot, db, storage, notifier, primary=primary, create_schema=False)
+        logger.info(f"Worker {index} started")
+        await feeder.run()
+    finally:
+        logger.info(
+            f"Worker {index} stats: {feeder.stats}, throttling: {throttling.stats()}, "
+            f"invalidations: {bus.stats}"
+        )
+        await on_shutdown(db, storage, notifier)
+        bus.stop()
+        await bot.session.close()
+
+async def run_front():
+    """Входной процесс: получает обновления и раскладывает их по воркерам по user_id"""
+    # Диспетчер нужен только для списка используемых типов обновлений:
+    # база, хранилище FSM и уведомления здесь не нужны
+    dp = Dispatcher()
+    register_handlers(dp)
+    allowed_updates = dp.resolve_used_update_types()
+    bot = create_bot(Config.BOT_TOKEN, api_url=Config.TELEGRAM_API_URL or None)
+    
+    # Схему и геоиндекс создаем один раз до запуска воркеров, а не в каждом из них
+    db = Database(Config.DATABASE_URL, pool_size=1, storage_mode=Config.DB_STORAGE_MODE)
+    await db.init_db()
+    await db.close()
+    
+    ctx = multiprocessing.get_context('spawn')
+    queues = [ctx.Queue(maxsize=Config.WORKER_QUEUE_SIZE) for _ in range(Config.BOT_WORKERS)]
+    invalidations = [ctx.Queue() for _ in range(Config.BOT_WORKERS)]
+    workers = [
+        ctx.Process(target=run_worker, args=(index, queues[index], invalidations), name=f"bot-worker-{index}")
+        for index in range(Config.BOT_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+    router = UpdateRouter(queues)
+    logger.info(f"Started {len(workers)} workers")
+    
+    receiver = None
+    runner = None
+    try:
+        if Config.BOT_RUN_MODE == 'webhook':
+            runner = web.AppRunner(
+                create_webhook_app(router, Config.WEBHOOK_PATH, Config.WEBHOOK_SECRET or None),
+                access_log=None
+            )
+            await runner.setup()
+            await web.TCPSite(runner, Config.WEBHOOK_HOST, Config.WEBHOOK_PORT).start()
+            await bot.set_webhook(
+                Config.WEBHOOK_URL.rstrip('/') + Config.WEBHOOK_PATH,
+                secret_token=Config.WEBHOOK_SECRET or None,
+                allowed_updates=allowed_updates
+            )
+        else:
+            await bot.delete_webhook()
+            receiver = asyncio.create_task(poll_updates(
+                router,
+                Config.BOT_TOKEN,
+                api_url=Config.TELEGRAM_API_URL or None,
+                allowed_updates=allowed_updates
+            ))
+        await wait_for_stop_signal()
+    finally:
+        # Сначала перестаем принимать обновления, затем воркеры дорабатывают полученные
+        if receiver is not None:
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+        if runner is not None:
+            await runner.cleanup()
+        router.stop_workers()
+        for worker in workers:
+            await asyncio.to_thread(worker.join, 60)
+            if worker.is_alive():
+                # SIGTERM воркер игнорирует
+                logger.warning(f"{worker.name} did not stop in time, killing")
+                worker.kill()
+        logger.info(f"Routed updates per worker: {router.stats}")
+        await bot.session.close()
+
+async def main():
+    """Главная функция запуска бота"""
+    # Проверяем наличие токена
+    if not Config.BOT_TOKEN:
+        logger.error("BOT_TOKEN не найден в переменных окружения!")
+        return
+    
+    if Config.BOT_WORKERS > 1:
+        await run_front()
+    else:
+        await run_single()
+
 if __name__ == "__main__":
     try:
         asyncio.run(main())
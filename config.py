@@ -6,13 +6,53 @@ load_dotenv()
 class Config:
     # Токен бота
     BOT_TOKEN = os.getenv('BOT_TOKEN')
+    BOT_HTTP_POOL_SIZE = int(os.getenv('BOT_HTTP_POOL_SIZE', 100))  # Соединений к Bot API
+    TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '')  # Собственный Bot API сервер (необязательно)
+    
+    # Получение обновлений: 'polling' или 'webhook'
+    BOT_RUN_MODE = os.getenv('BOT_RUN_MODE', 'polling')
+    WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # Публичный адрес бота, например https://bot.example.com
+    WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+    WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')  # Проверяется в заголовке каждого запроса
+    WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+    WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+    WEBHOOK_MAX_CONCURRENCY = int(os.getenv('WEBHOOK_MAX_CONCURRENCY', 64))  # Хендлеров одновременно
+    WEBHOOK_MAX_PENDING = int(os.getenv('WEBHOOK_MAX_PENDING', 1000))  # Сверх этого - 503, Telegram повторит
+    
+    # Многопроцессный режим: входной процесс раскладывает обновления по воркерам по user_id
+    BOT_WORKERS = int(os.getenv('BOT_WORKERS', 1))  # 1 - все в одном процессе; пулы базы и детекции лиц - в каждом воркере
+    WORKER_MAX_CONCURRENCY = int(os.getenv('WORKER_MAX_CONCURRENCY', 64))  # Хендлеров одновременно в воркере
+    WORKER_QUEUE_SIZE = int(os.getenv('WORKER_QUEUE_SIZE', 1000))  # Очередь воркера; заполнена - прием ждет
+    
+    # Очередь уведомлений (лимиты Telegram: ~30 сообщений/с всего, ~1/с в один чат)
+    NOTIFY_GLOBAL_RATE = float(os.getenv('NOTIFY_GLOBAL_RATE', 25))
+    NOTIFY_PER_CHAT_INTERVAL = float(os.getenv('NOTIFY_PER_CHAT_INTERVAL', 1.0))
+    NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', 5))
     
     # OpenAI
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 20))  # Максимум на один запрос к OpenAI, без ожидания очереди (сек)
+    OPENAI_MAX_CONCURRENCY = int(os.getenv('OPENAI_MAX_CONCURRENCY', 8))  # Одновременных запросов к OpenAI
+    AI_CACHE_SIZE = int(os.getenv('AI_CACHE_SIZE', 2000))  # Ответов AI в памяти
+    AI_CACHE_TTL = float(os.getenv('AI_CACHE_TTL', 86400))  # Время жизни ответа (сек), 0 - не кэшировать
+    AI_BREAKER_FAILURES = int(os.getenv('AI_BREAKER_FAILURES', 5))  # Сбоев подряд до отключения AI
+    AI_BREAKER_RECOVERY = float(os.getenv('AI_BREAKER_RECOVERY', 30))  # Через сколько секунд пробовать снова
+    CONVERSATION_STARTER_DEADLINE = float(os.getenv('CONVERSATION_STARTER_DEADLINE', 30))  # Позже совет после матча не шлем (сек)
+    CONVERSATION_STARTER_MAX_PENDING = int(os.getenv('CONVERSATION_STARTER_MAX_PENDING', 200))
     
     # База данных
     DATABASE_URL = os.getenv('DATABASE_URL', 'meet_bot.db')
     
+    # Пул соединений с базой данных
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 4))  # Количество соединений для чтения
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # Ожидание свободного соединения (сек)
+    DB_POOL_METRICS = os.getenv('DB_POOL_METRICS', 'True').lower() == 'true'
+    
+    # Режим хранения SQLite: 'default' или 'wal' (WAL + единая очередь записи)
+    DB_STORAGE_MODE = os.getenv('DB_STORAGE_MODE', 'wal')
+    DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', 16384))  # Кэш страниц на соединение
+    DB_MMAP_SIZE_MB = int(os.getenv('DB_MMAP_SIZE_MB', 128))  # Memory-mapped I/O
+    
     # Настройки
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
     ADMIN_IDS = list(map(int, os.getenv('ADMIN_IDS', '').split(',') if os.getenv('ADMIN_IDS') else []))
@@ -22,6 +62,46 @@ class Config:
     MAX_BIO_LENGTH = int(os.getenv('MAX_BIO_LENGTH', 500))
     DAILY_SWIPES_LIMIT = int(os.getenv('DAILY_SWIPES_LIMIT', 50))
     
+    # Детекция лиц в пуле процессов
+    FACE_DETECTION_WORKERS = int(os.getenv('FACE_DETECTION_WORKERS', 2))
+    FACE_DETECTION_MAX_PENDING = int(os.getenv('FACE_DETECTION_MAX_PENDING', 32))  # Больше - просим повторить позже
+    FACE_DETECTION_MAX_SIDE = int(os.getenv('FACE_DETECTION_MAX_SIDE', 1024))  # Уменьшать фото перед детекцией, 0 - нет
+    PHOTO_CHECK_CACHE_SIZE = int(os.getenv('PHOTO_CHECK_CACHE_SIZE', 5000))  # Результатов проверки фото в памяти
+    MAX_PHOTO_SIZE_MB = int(os.getenv('MAX_PHOTO_SIZE_MB', 10))  # Скачивание больших файлов прерывается
+    PHOTO_DOWNLOAD_POOL_SIZE = int(os.getenv('PHOTO_DOWNLOAD_POOL_SIZE', 20))  # Соединений для скачивания фото
+    
+    # Колода кандидатов для свайпа
+    SWIPE_DECK_SIZE = int(os.getenv('SWIPE_DECK_SIZE', 100))  # Кандидатов за один запрос
+    SWIPE_DECK_LOW_WATER = int(os.getenv('SWIPE_DECK_LOW_WATER', 10))  # Порог фонового дозаполнения
+    
+    # Кэш анкет в памяти
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))  # 0 - выключить кэш
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 60))  # Время жизни записи (сек)
+    
+    # Отложенная запись last_active и просмотров анкет
+    COUNTERS_FLUSH_INTERVAL_MS = int(os.getenv('COUNTERS_FLUSH_INTERVAL_MS', 1000))
+    COUNTERS_FLUSH_EVENTS = int(os.getenv('COUNTERS_FLUSH_EVENTS', 500))  # Запись сразу после N событий
+    
+    # Хранилище состояний FSM: 'sqlite' (переживает перезапуск) или 'memory'
+    FSM_STORAGE = os.getenv('FSM_STORAGE', 'sqlite')
+    FSM_STATE_TTL = float(os.getenv('FSM_STATE_TTL', 86400))  # Брошенное состояние забывается (сек), 0 - никогда
+    FSM_CACHE_SIZE = int(os.getenv('FSM_CACHE_SIZE', 10000))
+    FSM_FLUSH_INTERVAL_MS = int(os.getenv('FSM_FLUSH_INTERVAL_MS', 1000))
+    FSM_FLUSH_KEYS = int(os.getenv('FSM_FLUSH_KEYS', 200))  # Запись сразу после N измененных состояний
+    
+    # Определение города по геолокации (офлайн, см. utils/geocoder.py)
+    GEOCODER_DATASET = os.getenv('GEOCODER_DATASET', '')  # Пусто - data/cities.csv.gz
+    GEOCODER_MAX_DISTANCE_KM = float(os.getenv('GEOCODER_MAX_DISTANCE_KM', 100))  # Дальше - город не найден
+    GEOCODER_CACHE_SIZE = int(os.getenv('GEOCODER_CACHE_SIZE', 10000))
+    GEOCODER_ONLINE_FALLBACK = os.getenv('GEOCODER_ONLINE_FALLBACK', 'False').lower() == 'true'  # Nominatim, если офлайн не нашли
+    
+    # Ограничение частоты запросов (token bucket на пользователя)
+    THROTTLE_MESSAGE_RATE = float(os.getenv('THROTTLE_MESSAGE_RATE', 1.0))  # Сообщений в секунду, 0 - без ограничения
+    THROTTLE_MESSAGE_BURST = int(os.getenv('THROTTLE_MESSAGE_BURST', 10))  # Сообщений подряд (альбом фото)
+    THROTTLE_CALLBACK_RATE = float(os.getenv('THROTTLE_CALLBACK_RATE', 2.0))  # Нажатий в секунду, 0 - без ограничения
+    THROTTLE_CALLBACK_BURST = int(os.getenv('THROTTLE_CALLBACK_BURST', 10))  # Нажатий подряд
+    THROTTLE_IDLE_TTL = float(os.getenv('THROTTLE_IDLE_TTL', 60))  # Через сколько секунд забывать пользователя
+    
     # Возрастные ограничения
     MIN_AGE = 18
     MAX_AGE = 80
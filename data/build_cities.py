@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Сборка набора городов для офлайн-геокодера (utils/geocoder.py)
+
+Источник - выгрузка GeoNames cities15000 (CC BY 4.0):
+    https://download.geonames.org/export/dump/cities15000.zip
+
+Использование:
+    python data/build_cities.py cities15000.txt [data/cities.csv.gz]
+
+Районы городов (код PPLX) и населенные пункты, лежащие внутри крупного
+города, отбрасываются - иначе для жителя Москвы нашелся бы ближайший
+район, а не город. Крупные города СНГ получают русские названия.
+"""
+
+import csv
+import gzip
+import math
+import os
+import sys
+
+# Колонки выгрузки GeoNames
+NAME, LATITUDE, LONGITUDE, FEATURE_CODE, COUNTRY, POPULATION = 1, 4, 5, 7, 8, 14
+
+# Населенный пункт считается частью города с населением в SWALLOW_RATIO раз
+# больше, если лежит ближе его "радиуса" (км): 7.5 * (население в млн) ** 0.4
+SWALLOW_RATIO = 4
+
+# Русские названия крупных городов (название GeoNames, код страны)
+RU_NAMES = {
+    ('Moscow', 'RU'): 'Москва',
+    ('Saint Petersburg', 'RU'): 'Санкт-Петербург',
+    ('Novosibirsk', 'RU'): 'Новосибирск',
+    ('Yekaterinburg', 'RU'): 'Екатеринбург',
+    ('Nizhniy Novgorod', 'RU'): 'Нижний Новгород',
+    ('Kazan', 'RU'): 'Казань',
+    ('Chelyabinsk', 'RU'): 'Челябинск',
+    ('Omsk', 'RU'): 'Омск',
+    ('Samara', 'RU'): 'Самара',
+    ('Rostov-on-Don', 'RU'): 'Ростов-на-Дону',
+    ('Ufa', 'RU'): 'Уфа',
+    ('Krasnoyarsk', 'RU'): 'Красноярск',
+    ('Voronezh', 'RU'): 'Воронеж',
+    ('Volgograd', 'RU'): 'Волгоград',
+    ('Perm', 'RU'): 'Пермь',
+    ('Krasnodar', 'RU'): 'Краснодар',
+    ('Saratov', 'RU'): 'Саратов',
+    ('Tyumen', 'RU'): 'Тюмень',
+    ('Tolyatti', 'RU'): 'Тольятти',
+    ('Izhevsk', 'RU'): 'Ижевск',
+    ('Barnaul', 'RU'): 'Барнаул',
+    ('Ulyanovsk', 'RU'): 'Ульяновск',
+    ('Irkutsk', 'RU'): 'Иркутск',
+    ('Khabarovsk', 'RU'): 'Хабаровск',
+    ('Yaroslavl', 'RU'): 'Ярославль',
+    ('Vladivostok', 'RU'): 'Владивосток',
+    ('Makhachkala', 'RU'): 'Махачкала',
+    ('Tomsk', 'RU'): 'Томск',
+    ('Orenburg', 'RU'): 'Оренбург',
+    ('Kemerovo', 'RU'): 'Кемерово',
+    ('Novokuznetsk', 'RU'): 'Новокузнецк',
+    ('Ryazan’', 'RU'): 'Рязань',
+    ('Astrakhan', 'RU'): 'Астрахань',
+    ('Penza', 'RU'): 'Пенза',
+    ('Naberezhnyye Chelny', 'RU'): 'Набережные Челны',
+    ('Lipetsk', 'RU'): 'Липецк',
+    ('Kirov', 'RU'): 'Киров',
+    ('Cheboksary', 'RU'): 'Чебоксары',
+    ('Tula', 'RU'): 'Тула',
+    ('Kaliningrad', 'RU'): 'Калининград',
+    ('Kursk', 'RU'): 'Курск',
+    ('Stavropol', 'RU'): 'Ставрополь',
+    ('Bryansk', 'RU'): 'Брянск',
+    ('Tver', 'RU'): 'Тверь',
+    ('Magnitogorsk', 'RU'): 'Магнитогорск',
+    ('Ivanovo', 'RU'): 'Иваново',
+    ('Nizhny Tagil', 'RU'): 'Нижний Тагил',
+    ('Ulan-Ude', 'RU'): 'Улан-Удэ',
+    ('Vladimir', 'RU'): 'Владимир',
+    ('Arkhangel’sk', 'RU'): 'Архангельск',
+    ('Chita', 'RU'): 'Чита',
+    ('Belgorod', 'RU'): 'Белгород',
+    ('Kaluga', 'RU'): 'Калуга',
+    ('Smolensk', 'RU'): 'Смоленск',
+    ('Sochi', 'RU'): 'Сочи',
+    ('Volzhsky', 'RU'): 'Волжский',
+    ('Saransk', 'RU'): 'Саранск',
+    ('Cherepovets', 'RU'): 'Череповец',
+    ('Vologda', 'RU'): 'Вологда',
+    ('Kurgan', 'RU'): 'Курган',
+    ('Vladikavkaz', 'RU'): 'Владикавказ',
+    ('Orël', 'RU'): 'Орёл',
+    ('Surgut', 'RU'): 'Сургут',
+    ('Grozny', 'RU'): 'Грозный',
+    ('Murmansk', 'RU'): 'Мурманск',
+    ('Tambov', 'RU'): 'Тамбов',
+    ('Petrozavodsk', 'RU'): 'Петрозаводск',
+    ('Taganrog', 'RU'): 'Таганрог',
+    ('Kostroma', 'RU'): 'Кострома',
+    ('Komsomolsk-on-Amur', 'RU'): 'Комсомольск-на-Амуре',
+    ('Yoshkar-Ola', 'RU'): 'Йошкар-Ола',
+    ('Sterlitamak', 'RU'): 'Стерлитамак',
+    ('Bratsk', 'RU'): 'Братск',
+    ('Orsk', 'RU'): 'Орск',
+    ('Syktyvkar', 'RU'): 'Сыктывкар',
+    ('Nizhnevartovsk', 'RU'): 'Нижневартовск',
+    ('Angarsk', 'RU'): 'Ангарск',
+    ('Novorossiysk', 'RU'): 'Новороссийск',
+    ('Khimki', 'RU'): 'Химки',
+    ('Nalchik', 'RU'): 'Нальчик',
+    ('Yakutsk', 'RU'): 'Якутск',
+    ('Nizhnekamsk', 'RU'): 'Нижнекамск',
+    ('Dzerzhinsk', 'RU'): 'Дзержинск',
+    ('Pskov', 'RU'): 'Псков',
+    ('Velikiy Novgorod', 'RU'): 'Великий Новгород',
+    ('Podolsk', 'RU'): 'Подольск',
+    ('Balashikha', 'RU'): 'Балашиха',
+    ('Blagoveshchensk', 'RU'): 'Благовещенск',
+    ('Yuzhno-Sakhalinsk', 'RU'): 'Южно-Сахалинск',
+    ('Petropavlovsk-Kamchatsky', 'RU'): 'Петропавловск-Камчатский',
+    ('Magadan', 'RU'): 'Магадан',
+    ('Norilsk', 'RU'): 'Норильск',
+    ('Tobolsk', 'RU'): 'Тобольск',
+    ('Sevastopol', 'UA'): 'Севастополь',
+    ('Simferopol', 'UA'): 'Симферополь',
+    ('Minsk', 'BY'): 'Минск',
+    ('Homyel\'', 'BY'): 'Гомель',
+    ('Hrodna', 'BY'): 'Гродно',
+    ('Vitebsk', 'BY'): 'Витебск',
+    ('Mahilyow', 'BY'): 'Могилёв',
+    ('Brest', 'BY'): 'Брест',
+    ('Almaty', 'KZ'): 'Алматы',
+    ('Astana', 'KZ'): 'Астана',
+    ('Shymkent', 'KZ'): 'Шымкент',
+    ('Aktobe', 'KZ'): 'Актобе',
+    ('Karagandy', 'KZ'): 'Караганда',
+    ('Taraz', 'KZ'): 'Тараз',
+    ('Pavlodar', 'KZ'): 'Павлодар',
+    ('Ust-Kamenogorsk', 'KZ'): 'Усть-Каменогорск',
+    ('Semey', 'KZ'): 'Семей',
+    ('Atyrau', 'KZ'): 'Атырау',
+    ('Oral', 'KZ'): 'Уральск',
+    ('Kyzylorda', 'KZ'): 'Кызылорда',
+    ('Kostanay', 'KZ'): 'Костанай',
+    ('Petropavl', 'KZ'): 'Петропавловск',
+    ('Aktau', 'KZ'): 'Актау',
+    ('Kyiv', 'UA'): 'Киев',
+    ('Kharkiv', 'UA'): 'Харьков',
+    ('Odesa', 'UA'): 'Одесса',
+    ('Dnipro', 'UA'): 'Днепр',
+    ('Donetsk', 'UA'): 'Донецк',
+    ('Lviv', 'UA'): 'Львов',
+    ('Zaporizhzhya', 'UA'): 'Запорожье',
+    ('Kryvyy Rih', 'UA'): 'Кривой Рог',
+    ('Mykolayiv', 'UA'): 'Николаев',
+    ('Luhansk', 'UA'): 'Луганск',
+    ('Vinnytsya', 'UA'): 'Винница',
+    ('Poltava', 'UA'): 'Полтава',
+    ('Chernihiv', 'UA'): 'Чернигов',
+    ('Kherson', 'UA'): 'Херсон',
+    ('Cherkasy', 'UA'): 'Черкассы',
+    ('Sumy', 'UA'): 'Сумы',
+    ('Zhytomyr', 'UA'): 'Житомир',
+    ('Tashkent', 'UZ'): 'Ташкент',
+    ('Samarkand', 'UZ'): 'Самарканд',
+    ('Bukhara', 'UZ'): 'Бухара',
+    ('Bishkek', 'KG'): 'Бишкек',
+    ('Osh', 'KG'): 'Ош',
+    ('Dushanbe', 'TJ'): 'Душанбе',
+    ('Ashgabat', 'TM'): 'Ашхабад',
+    ('Baku', 'AZ'): 'Баку',
+    ('Yerevan', 'AM'): 'Ереван',
+    ('Tbilisi', 'GE'): 'Тбилиси',
+    ('Chisinau', 'MD'): 'Кишинёв',
+}
+
+
+def urban_radius_km(population: int) -> float:
+    return 7.5 * (population / 1_000_000) ** 0.4
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(a))
+
+
+def read_geonames(path: str):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            row = line.rstrip('\n').split('\t')
+            if row[FEATURE_CODE] == 'PPLX':
+                continue
+            yield {
+                'name': row[NAME],
+                'latitude': float(row[LATITUDE]),
+                'longitude': float(row[LONGITUDE]),
+                'country_code': row[COUNTRY],
+                'population': int(row[POPULATION] or 0),
+            }
+
+
+def drop_swallowed(places):
+    """Убрать пункты внутри городов, которые в SWALLOW_RATIO раз крупнее"""
+    # Сетка 1x1 градус: достаточно проверить соседние клетки (радиус < 30 км)
+    grid = {}
+    for place in places:
+        cell = (int(math.floor(place['latitude'])), int(math.floor(place['longitude'])))
+        grid.setdefault(cell, []).append(place)
+
+    kept = []
+    for place in places:
+        lat_cell, lon_cell = int(math.floor(place['latitude'])), int(math.floor(place['longitude']))
+        swallowed = False
+        for dlat in (-1, 0, 1):
+            for dlon in (-1, 0, 1):
+                for other in grid.get((lat_cell + dlat, lon_cell + dlon), ()):
+                    if other['population'] < place['population'] * SWALLOW_RATIO:
+                        continue
+                    if distance_km(place['latitude'], place['longitude'],
+                                   other['latitude'], other['longitude']) < urban_radius_km(other['population']):
+                        swallowed = True
+                        break
+                if swallowed:
+                    break
+            if swallowed:
+                break
+        if not swallowed:
+            kept.append(place)
+    return kept
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    output = sys.argv[2] if len(sys.argv) > 2 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cities.csv.gz')
+    places = list(read_geonames(sys.argv[1]))
+    kept = drop_swallowed(places)
+    kept.sort(key=lambda p: (p['country_code'], -p['population']))
+
+    with gzip.open(output, 'wt', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['latitude', 'longitude', 'name', 'country_code', 'population'])
+        for place in kept:
+            name = RU_NAMES.get((place['name'], place['country_code']), place['name'])
+            writer.writerow([f"{place['latitude']:.5f}", f"{place['longitude']:.5f}", name,
+                             place['country_code'], place['population']])
+
+    print(f"✅ Городов: {len(kept)} из {len(places)} (отброшено районов и пригородов: {len(places) - len(kept)})")
+    print(f"📄 {output}")
+
+
+if __name__ == "__main__":
+    main()
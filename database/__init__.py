@@ -1,4 +1,5 @@
 from .models import User, UserPhoto, Swipe, Match, Chat, Message
 from .database import Database
+from .fsm_storage import SQLiteStorage
 
-__all__ = ['User', 'UserPhoto', 'Swipe', 'Match', 'Chat', 'Message', 'Database']
+__all__ = ['User', 'UserPhoto', 'Swipe', 'Match', 'Chat', 'Message', 'Database', 'SQLiteStorage']
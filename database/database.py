@@ -1,18 +1,73 @@
-import aiosqlite
+import asyncio
 import logging
-from typing import Optional, List, Dict, Any
+import numpy as np
+from typing import Optional, List, Dict, Any, Tuple, Callable
 from datetime import datetime, timedelta
 from .models import User, UserPhoto, Swipe, Match, Chat, Message
+from .pool import ConnectionPool
+from .deck import SwipeDeckManager, DECK_FILTER_FIELDS
+from .geo import haversine_km_many, bounding_box, DEFAULT_SEARCH_RADIUS_KM
+from .seen import SeenSet, SeenSetCache
+from .user_cache import UserCache
+from .write_behind import CounterBuffer
 
 logger = logging.getLogger(__name__)
 
 class Database:
-    def __init__(self, db_path: str):
+    def __init__(
+        self,
+        db_path: str,
+        pool_size: int = 4,
+        pool_timeout: float = 10.0,
+        pool_metrics: bool = True,
+        storage_mode: str = 'default',
+        cache_size_kb: int = 16384,
+        mmap_size_mb: int = 128,
+        deck_size: int = 100,
+        deck_low_water: int = 10,
+        user_cache_size: int = 10000,
+        user_cache_ttl: float = 60.0,
+        counters_flush_interval: float = 1.0,
+        counters_flush_events: int = 500
+    ):
         self.db_path = db_path
+        self.pool = ConnectionPool(
+            db_path,
+            size=pool_size,
+            acquire_timeout=pool_timeout,
+            collect_metrics=pool_metrics,
+            storage_mode=storage_mode,
+            cache_size_kb=cache_size_kb,
+            mmap_size_mb=mmap_size_mb
+        )
+        self.decks = SwipeDeckManager(self, batch_size=deck_size, low_water=deck_low_water)
+        # Кого пользователь уже свайпнул - держим в памяти вместо NOT IN по swipes
+        self.seen = SeenSetCache(self._load_seen_ids)
+        # Анкеты читаются по несколько раз за апдейт - кэшируем их в памяти
+        self.users = UserCache(max_entries=user_cache_size, ttl=user_cache_ttl)
+        # last_active и просмотры анкет пишутся пачками в фоне
+        self.counters = CounterBuffer(
+            self.pool,
+            flush_interval=counters_flush_interval,
+            max_events=counters_flush_events,
+            on_flush=self.users.apply_counters
+        )
+        # Многопроцессный режим: сбросы кэшей рассылаются остальным воркерам
+        self.on_invalidate: Optional[Callable[[str, Tuple[int, ...]], None]] = None
+        # Доступность R*Tree определяется при инициализации схемы
+        self.geo_index_enabled = False
+        # Сигнал отправителю уведомлений: в очереди появились сообщения
+        self.outbox_ready = asyncio.Event()
     
-    async def init_db(self):
-        """Инициализация базы данных"""
-        async with aiosqlite.connect(self.db_path) as db:
+    async def init_db(self, create_schema: bool = True):
+        """Инициализация базы данных
+        
+        create_schema=False - схему уже создал другой процесс (воркеры
+        многопроцессного режима): только открываем пул
+        """
+        await self.pool.open()
+        
+        async def _create_schema(db):
             # Таблица пользователей
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS users (
@@ -118,6 +173,74 @@ class Database:
                 )
             ''')
             
+            # Очередь исходящих уведомлений
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS notification_outbox (
+                    notification_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    text TEXT,
+                    parse_mode TEXT,
+                    disable_web_page_preview BOOLEAN DEFAULT 0,
+                    coalesce_key TEXT UNIQUE,
+                    version INTEGER DEFAULT 0,
+                    attempts INTEGER DEFAULT 0,
+                    next_attempt_at REAL DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Результаты проверки фото по file_unique_id
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS photo_checks (
+                    file_unique_id TEXT PRIMARY KEY,
+                    face_count INTEGER,
+                    basic_valid BOOLEAN,
+                    checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Кэш ответов AI (ключ - хэш метода и параметров запроса)
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS ai_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    method TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    tokens INTEGER DEFAULT 0,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            
+            # Позиции пакетных задач (повторная модерация фото и т.п.)
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+                    name TEXT PRIMARY KEY,
+                    position INTEGER NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Элементы пакетных задач, которые не удалось обработать (уже за позицией)
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS backfill_retries (
+                    name TEXT NOT NULL,
+                    item_id INTEGER NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 1,
+                    last_error TEXT,
+                    PRIMARY KEY (name, item_id)
+                )
+            ''')
+            
+            # Состояния FSM (незаконченное заполнение анкеты), см. fsm_storage.py
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS fsm_states (
+                    storage_key TEXT PRIMARY KEY,
+                    state TEXT,
+                    data TEXT NOT NULL DEFAULT '{}',
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            
             # Миграция: добавляем новые поля для существующих пользователей
             try:
                 await db.execute('ALTER TABLE users ADD COLUMN show_age BOOLEAN DEFAULT 1')
@@ -145,25 +268,124 @@ class Database:
             await db.execute('CREATE INDEX IF NOT EXISTS idx_swipes_from_user ON swipes(from_user_id)')
             await db.execute('CREATE INDEX IF NOT EXISTS idx_swipes_to_user ON swipes(to_user_id)')
             await db.execute('CREATE INDEX IF NOT EXISTS idx_messages_chat ON messages(chat_id)')
+            await db.execute('CREATE INDEX IF NOT EXISTS idx_outbox_next_attempt ON notification_outbox(next_attempt_at)')
+            await db.execute('CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states(updated_at)')
+            
+            # Пространственный индекс для геопоиска
+            cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE name = 'users_geo'")
+            geo_existed = await cursor.fetchone() is not None
+            try:
+                await db.execute('''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS users_geo USING rtree(
+                        user_id, min_lat, max_lat, min_lon, max_lon
+                    )
+                ''')
+            except Exception as e:
+                logger.warning(f"R*Tree недоступен, геопоиск будет использовать обычный индекс: {e}")
+                return False
+            
+            if geo_existed:
+                # Индекс ведется при каждой записи, пересобираем только если он разошелся
+                # с таблицей (например, после изменений в обход Database)
+                cursor = await db.execute('''
+                    SELECT
+                        (SELECT COUNT(*) FROM users_geo),
+                        (SELECT COUNT(*) FROM users WHERE latitude IS NOT NULL AND longitude IS NOT NULL)
+                ''')
+                indexed, located = await cursor.fetchone()
+                if indexed == located:
+                    return True
+                logger.warning(f"Геоиндекс разошелся с таблицей users ({indexed} из {located}), пересобираем")
             
-            await db.commit()
-            logger.info("База данных инициализирована")
+            await db.execute('DELETE FROM users_geo')
+            await db.execute('''
+                INSERT INTO users_geo (user_id, min_lat, max_lat, min_lon, max_lon)
+                SELECT user_id, latitude, latitude, longitude, longitude FROM users
+                WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+            ''')
+            return True
+        
+        if create_schema:
+            # Первая сборка геоиндекса на большой базе может идти дольше обычного таймаута записи
+            self.geo_index_enabled = await self.pool.write(_create_schema, timeout=0)
+        else:
+            async with self.pool.reader() as db:
+                cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE name = 'users_geo'")
+                self.geo_index_enabled = await cursor.fetchone() is not None
+        self.counters.start()
+        logger.info("База данных инициализирована")
+    
+    async def close(self):
+        """Закрыть соединения с базой данных"""
+        # Сначала сохраняем отложенные счетчики, пока пул еще открыт
+        await self.counters.stop()
+        self.decks.clear()
+        self.seen.clear()
+        self.users.clear()
+        await self.pool.close()
+    
+    def _invalidate_users(self, *user_ids: int):
+        """Сбросить анкеты в кэше этого процесса и остальных воркеров"""
+        self.users.invalidate(*user_ids)
+        self._publish('users', user_ids)
+    
+    def _publish(self, kind: str, user_ids: Tuple[int, ...]):
+        if self.on_invalidate is not None and user_ids:
+            self.on_invalidate(kind, tuple(user_ids))
+    
+    def apply_invalidation(self, kind: str, user_ids: Tuple[int, ...]):
+        """Применить сброс кэшей, сделанный другим воркером"""
+        self.users.invalidate(*user_ids)
+        if kind == 'forget':
+            # Анкета удалена вместе со свайпами - убираем ее из множеств просмотренных
+            for user_id in user_ids:
+                self.seen.forget_user(user_id)
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Статистика пула соединений и очереди записи"""
+        return self.pool.stats()
+    
+    def get_user_cache_stats(self) -> Dict[str, Any]:
+        """Статистика кэша анкет"""
+        return self.users.stats()
+    
+    def get_counters_stats(self) -> Dict[str, Any]:
+        """Статистика отложенной записи счетчиков"""
+        return self.counters.stats()
+    
+    async def _load_seen_ids(self, user_id: int) -> List[int]:
+        """Все to_user_id свайпов пользователя (читаются из индекса UNIQUE(from_user_id, to_user_id))"""
+        async with self.pool.reader() as db:
+            cursor = await db.execute(
+                'SELECT to_user_id FROM swipes WHERE from_user_id = ? ORDER BY to_user_id',
+                (user_id,)
+            )
+            rows = await cursor.fetchall()
+            return [row[0] for row in rows]
     
     async def get_user(self, user_id: int) -> Optional[User]:
         """Получить пользователя по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        user = self.users.get(user_id)
+        if user is not None:
+            return user
+        
+        token = self.users.token()
+        async with self.pool.reader() as db:
             cursor = await db.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
             row = await cursor.fetchone()
             if row:
-                return User(**dict(row))
+                user = User(**dict(row))
+                self.users.put(user, token)
+                return user
             return None
     
     async def create_or_update_user(self, user_id: int, **kwargs) -> User:
         """Создать или обновить пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async def _save_user(db):
             # Проверяем, существует ли пользователь
-            existing_user = await self.get_user(user_id)
+            cursor = await db.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
+            row = await cursor.fetchone()
+            existing_user = User(**dict(row)) if row else None
             
             if existing_user:
                 # Обновляем существующего пользователя
@@ -181,9 +403,6 @@ class Database:
                     
                     query = f"UPDATE users SET {', '.join(update_fields)} WHERE user_id = ?"
                     await db.execute(query, values)
-                    await db.commit()
-                
-                return await self.get_user(user_id)
             else:
                 # Создаем нового пользователя
                 kwargs.update({
@@ -198,21 +417,42 @@ class Database:
                 query = f"INSERT INTO users ({', '.join(fields)}) VALUES ({placeholders})"
                 
                 await db.execute(query, list(kwargs.values()))
-                await db.commit()
-                
-                return await self.get_user(user_id)
+            
+            if self.geo_index_enabled and ('latitude' in kwargs or 'longitude' in kwargs):
+                await self._sync_geo_index(db, user_id)
+        
+        await self.pool.write(_save_user)
+        self._invalidate_users(user_id)
+        
+        # Смена фильтров поиска делает колоду кандидатов неактуальной
+        if DECK_FILTER_FIELDS.intersection(kwargs):
+            self.decks.invalidate(user_id)
+        
+        return await self.get_user(user_id)
     
-    async def update_last_active(self, user_id: int):
-        """Обновить время последней активности пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
+    async def _sync_geo_index(self, db, user_id: int):
+        """Обновить точку пользователя в пространственном индексе"""
+        cursor = await db.execute('SELECT latitude, longitude FROM users WHERE user_id = ?', (user_id,))
+        row = await cursor.fetchone()
+        
+        if row and row['latitude'] is not None and row['longitude'] is not None:
             await db.execute(
-                'UPDATE users SET last_active = ? WHERE user_id = ?',
-                (datetime.now(), user_id)
+                'INSERT OR REPLACE INTO users_geo (user_id, min_lat, max_lat, min_lon, max_lon) VALUES (?, ?, ?, ?, ?)',
+                (user_id, row['latitude'], row['latitude'], row['longitude'], row['longitude'])
             )
-            await db.commit()
+        else:
+            await db.execute('DELETE FROM users_geo WHERE user_id = ?', (user_id,))
+    
+    async def update_last_active(self, user_id: int):
+        """Обновить время последней активности пользователя (запись отложенная)"""
+        self.counters.touch(user_id)
+    
+    async def increment_profile_views(self, user_id: int, count: int = 1):
+        """Увеличить счетчик просмотров анкеты (запись отложенная)"""
+        self.counters.add_views(user_id, count)
     
     async def get_users_for_swipe(self, user_id: int, limit: int = 10, exclude_user_id: int = None) -> List[User]:
-        """Получить пользователей для свайпа с учетом геолокации (радиус 100км)"""
+        """Получить пользователей для свайпа с учетом геолокации (в пределах радиуса поиска)"""
         user = await self.get_user(user_id)
         if not user:
             return []
@@ -225,155 +465,112 @@ class Database:
         
         logger.info(f"Age range: {min_age}-{max_age}")
         
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            
+        # Общие условия отбора кандидатов
+        conditions = [
+            'u.user_id != ?',
+            'u.is_active = 1',
+            'u.age BETWEEN ? AND ?',
+        ]
+        params = [user_id, min_age, max_age]
+        
+        if exclude_user_id:
+            conditions.append('u.user_id != ?')
+            params.append(exclude_user_id)
+        
+        if user.looking_for != 'both':
+            # Ищем тот пол, который хочет пользователь
+            conditions.append('u.gender = ?')
+            params.append(user.looking_for)
+        
+        # Загружаем заранее: загрузка сама берет соединение из пула
+        seen = await self.seen.get(user_id) if user.latitude and user.longitude else None
+        
+        async with self.pool.reader() as db:
             # Если у пользователя есть координаты, используем геопоиск
             if user.latitude and user.longitude:
-                logger.info(f"Using geo search with coordinates: lat={user.latitude}, lon={user.longitude}")
+                radius_km = user.search_radius or user.max_distance or DEFAULT_SEARCH_RADIUS_KM
+                logger.info(f"Using geo search with coordinates: lat={user.latitude}, lon={user.longitude}, radius={radius_km}km")
                 
-                if user.looking_for == 'both':
-                    logger.info("Looking for both genders")
-                    # Ищем всех пользователей независимо от пола
-                    exclude_condition = ""
-                    if exclude_user_id:
-                        exclude_condition = f"AND user_id != {exclude_user_id}"
-                    
-                    query = f'''
-                        SELECT * FROM (
-                            SELECT *, 
-                                   (6371 * acos(cos(radians(?)) * cos(radians(latitude)) * 
-                                    cos(radians(longitude) - radians(?)) + 
-                                    sin(radians(?)) * sin(radians(latitude)))) AS distance
-                            FROM users 
-                            WHERE user_id != ? 
-                            {exclude_condition}
-                            AND is_active = 1
-                            AND age BETWEEN ? AND ?
-                            AND latitude IS NOT NULL 
-                            AND longitude IS NOT NULL
-                            AND user_id NOT IN (
-                                SELECT to_user_id FROM swipes WHERE from_user_id = ?
-                            )
-                        ) subquery
-                        WHERE distance <= 100
-                        ORDER BY distance ASC, last_active DESC
-                        LIMIT ?
-                    '''
-                    
-                    logger.info(f"Executing query with params: lat={user.latitude}, lon={user.longitude}, user_id={user_id}, min_age={min_age}, max_age={max_age}, limit={limit}")
-                    
-                    cursor = await db.execute(query, (
-                        user.latitude, user.longitude, user.latitude,  # для расчета расстояния
-                        user_id,
-                        min_age,
-                        max_age,
-                        user_id,
-                        limit
-                    ))
-                else:
-                    # Ищем пользователей конкретного пола
-                    exclude_condition = f"AND user_id != {exclude_user_id}" if exclude_user_id else ""
-                    query = f'''
-                        SELECT * FROM (
-                            SELECT *, 
-                                   (6371 * acos(cos(radians(?)) * cos(radians(latitude)) * 
-                                    cos(radians(longitude) - radians(?)) + 
-                                    sin(radians(?)) * sin(radians(latitude)))) AS distance
-                            FROM users 
-                            WHERE user_id != ? 
-                            {exclude_condition}
-                            AND is_active = 1
-                            AND age BETWEEN ? AND ?
-                            AND gender = ?
-                            AND latitude IS NOT NULL 
-                            AND longitude IS NOT NULL
-                            AND user_id NOT IN (
-                                SELECT to_user_id FROM swipes WHERE from_user_id = ?
-                            )
-                        ) subquery
-                        WHERE distance <= 100
-                        ORDER BY distance ASC, last_active DESC
-                        LIMIT ?
-                    '''
-                    
-                    cursor = await db.execute(query, (
-                        user.latitude, user.longitude, user.latitude,  # для расчета расстояния
-                        user_id,
-                        min_age,
-                        max_age,
-                        user.looking_for,  # Исправлено: ищем тот пол, который хочет пользователь
-                        user_id,
-                        limit
-                    ))
+                # Сначала отбираем ближайших по пространственному индексу (без уже просмотренных),
+                # затем дочитываем анкеты порциями в порядке расстояния, пока не наберем limit
+                nearby_ids, _ = await self._nearby_user_ids(db, user.latitude, user.longitude, radius_km, seen)
+                logger.info(f"Found {len(nearby_ids)} users within {radius_km}km")
+                
+                where = ' AND '.join(conditions)
+                chunk_size = min(max(limit * 2, 256), 5000)
+                rows = []
+                for start in range(0, len(nearby_ids), chunk_size):
+                    chunk = nearby_ids[start:start + chunk_size].tolist()
+                    cursor = await db.execute(
+                        f"SELECT u.* FROM users u WHERE u.user_id IN ({', '.join('?' for _ in chunk)}) AND {where}",
+                        chunk + params
+                    )
+                    rows_by_id = {row['user_id']: row for row in await cursor.fetchall()}
+                    rows.extend(rows_by_id[candidate_id] for candidate_id in chunk if candidate_id in rows_by_id)
+                    if len(rows) >= limit:
+                        break
+                rows = rows[:limit]
             else:
                 # Если нет координат, используем обычный поиск
-                if user.looking_for == 'both':
-                    # Ищем всех пользователей независимо от пола
-                    exclude_condition = f"AND user_id != {exclude_user_id}" if exclude_user_id else ""
-                    query = f'''
-                        SELECT * FROM users 
-                        WHERE user_id != ? 
-                        {exclude_condition}
-                        AND is_active = 1
-                        AND age BETWEEN ? AND ?
-                        AND user_id NOT IN (
-                            SELECT to_user_id FROM swipes WHERE from_user_id = ?
-                        )
-                        ORDER BY last_active DESC
-                        LIMIT ?
-                    '''
-                    
-                    cursor = await db.execute(query, (
-                        user_id,
-                        min_age,
-                        max_age,
-                        user_id,
-                        limit
-                    ))
-                else:
-                    # Ищем пользователей конкретного пола
-                    exclude_condition = f"AND user_id != {exclude_user_id}" if exclude_user_id else ""
-                    query = f'''
-                        SELECT * FROM users 
-                        WHERE user_id != ? 
-                        {exclude_condition}
-                        AND is_active = 1
-                        AND age BETWEEN ? AND ?
-                        AND gender = ?
-                        AND user_id NOT IN (
-                            SELECT to_user_id FROM swipes WHERE from_user_id = ?
-                        )
-                        ORDER BY last_active DESC
-                        LIMIT ?
-                    '''
-                    
-                    cursor = await db.execute(query, (
-                        user_id,
-                        min_age,
-                        max_age,
-                        user.looking_for,  # Исправлено: ищем тот пол, который хочет пользователь
-                        user_id,
-                        limit
-                    ))
+                # Уже просмотренных отсекаем anti-join'ом по индексу swipes(from_user_id, to_user_id)
+                conditions.append(
+                    'NOT EXISTS (SELECT 1 FROM swipes s WHERE s.from_user_id = ? AND s.to_user_id = u.user_id)'
+                )
+                params.append(user_id)
+                query = f'''
+                    SELECT u.* FROM users u
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY u.last_active DESC
+                    LIMIT ?
+                '''
+                cursor = await db.execute(query, params + [limit])
+                rows = await cursor.fetchall()
             
-            rows = await cursor.fetchall()
             logger.info(f"Found {len(rows)} rows in database query")
-            users = []
-            for row in rows:
-                row_dict = dict(row)
-                logger.info(f"Processing user: {row_dict.get('user_id')} - {row_dict.get('name')}, distance: {row_dict.get('distance', 'N/A')}")
-                # Удаляем поле distance из результата, если оно есть
-                if 'distance' in row_dict:
-                    del row_dict['distance']
-                users.append(User(**row_dict))
+            users = [User(**dict(row)) for row in rows]
             logger.info(f"Returning {len(users)} users for swipe")
             return users
     
+    async def _nearby_user_ids(self, db, lat: float, lon: float, radius_km: float, seen: SeenSet = None):
+        """
+        user_id и расстояния всех пользователей в радиусе, отсортированные по удаленности
+        
+        Строки отбираются по bounding box из R*Tree (или индекса idx_users_location),
+        точное расстояние считается векторно только для попавших в прямоугольник.
+        """
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+        if self.geo_index_enabled:
+            query = '''
+                SELECT user_id, min_lat, min_lon FROM users_geo
+                WHERE min_lat >= ? AND max_lat <= ? AND min_lon >= ? AND max_lon <= ?
+            '''
+        else:
+            query = '''
+                SELECT user_id, latitude, longitude FROM users
+                WHERE latitude >= ? AND latitude <= ? AND longitude >= ? AND longitude <= ?
+            '''
+        
+        cursor = await db.execute(query, (min_lat, max_lat, min_lon, max_lon))
+        points = await cursor.fetchall()
+        if not points:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        
+        ids = np.fromiter((point[0] for point in points), dtype=np.int64, count=len(points))
+        lats = np.fromiter((point[1] for point in points), dtype=np.float64, count=len(points))
+        lons = np.fromiter((point[2] for point in points), dtype=np.float64, count=len(points))
+        
+        distances = haversine_km_many(lat, lon, lats, lons)
+        mask = distances <= radius_km
+        if seen is not None:
+            mask &= ~seen.contains_many(ids)
+        
+        ids, distances = ids[mask], distances[mask]
+        order = np.argsort(distances, kind='stable')
+        return ids[order], distances[order]
+    
     async def get_all_users_debug(self) -> List[User]:
         """Получить всех пользователей для отладки"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.reader() as db:
             cursor = await db.execute('SELECT * FROM users')
             rows = await cursor.fetchall()
             users = []
@@ -381,110 +578,326 @@ class Database:
                 users.append(User(**dict(row)))
             return users
     
+    async def _apply_swipe(self, db, from_user_id: int, to_user_id: int, is_like: bool) -> bool:
+        """Записать свайп и обновить счетчики внутри транзакции писателя
+
+        Счетчики меняются, только если свайп действительно добавлен:
+        повторное нажатие кнопки не накручивает статистику.
+        """
+        cursor = await db.execute(
+            'INSERT INTO swipes (from_user_id, to_user_id, is_like) VALUES (?, ?, ?) '
+            'ON CONFLICT (from_user_id, to_user_id) DO NOTHING RETURNING swipe_id',
+            (from_user_id, to_user_id, is_like)
+        )
+        if await cursor.fetchone() is None:
+            return False
+        
+        # Статистика отправителя и получателя одним запросом
+        await db.execute(
+            '''UPDATE users SET
+                   likes_sent = likes_sent + (user_id = ?),
+                   likes_received = likes_received + (user_id = ? AND ?)
+               WHERE user_id IN (?, ?)''',
+            (from_user_id, to_user_id, bool(is_like), from_user_id, to_user_id)
+        )
+        
+        if not is_like:
+            return False
+        
+        # Матч создается, только если встречный лайк уже есть
+        cursor = await db.execute(
+            '''INSERT INTO matches (user1_id, user2_id)
+               SELECT ?, ? WHERE EXISTS (
+                   SELECT 1 FROM swipes WHERE from_user_id = ? AND to_user_id = ? AND is_like = 1
+               )
+               ON CONFLICT (user1_id, user2_id) DO NOTHING
+               RETURNING match_id''',
+            (min(from_user_id, to_user_id), max(from_user_id, to_user_id), to_user_id, from_user_id)
+        )
+        if await cursor.fetchone() is None:
+            return False
+        
+        await db.execute(
+            'UPDATE users SET matches_count = matches_count + 1 WHERE user_id IN (?, ?)',
+            (from_user_id, to_user_id)
+        )
+        return True
+    
+    def _after_swipe(self, from_user_id: int, to_user_id: int):
+        """Обновить кэши после записанного свайпа"""
+        # Счетчики лайков и матчей изменились у обоих пользователей
+        self._invalidate_users(from_user_id, to_user_id)
+        self.seen.add(from_user_id, to_user_id)
+        self.decks.discard(from_user_id, to_user_id)
+    
     async def create_swipe(self, from_user_id: int, to_user_id: int, is_like: bool) -> bool:
         """Создать свайп и проверить на матч"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Создаем свайп
-            await db.execute(
-                'INSERT OR IGNORE INTO swipes (from_user_id, to_user_id, is_like) VALUES (?, ?, ?)',
-                (from_user_id, to_user_id, is_like)
-            )
-            
-            # Обновляем статистику
-            await db.execute(
-                'UPDATE users SET likes_sent = likes_sent + 1 WHERE user_id = ?',
-                (from_user_id,)
-            )
-            
-            if is_like:
-                await db.execute(
-                    'UPDATE users SET likes_received = likes_received + 1 WHERE user_id = ?',
-                    (to_user_id,)
-                )
-            
-            # Проверяем на взаимную симпатию
-            if is_like:
-                cursor = await db.execute(
-                    'SELECT 1 FROM swipes WHERE from_user_id = ? AND to_user_id = ? AND is_like = 1',
-                    (to_user_id, from_user_id)
-                )
-                mutual_like = await cursor.fetchone()
-                
-                if mutual_like:
-                    # Создаем матч
-                    await db.execute(
-                        'INSERT OR IGNORE INTO matches (user1_id, user2_id) VALUES (?, ?)',
-                        (min(from_user_id, to_user_id), max(from_user_id, to_user_id))
-                    )
-                    
-                    # Обновляем счетчик матчей
-                    await db.execute(
-                        'UPDATE users SET matches_count = matches_count + 1 WHERE user_id IN (?, ?)',
-                        (from_user_id, to_user_id)
-                    )
-                    
-                    await db.commit()
-                    return True
-            
-            await db.commit()
-            return False
+        async def _swipe(db):
+            return await self._apply_swipe(db, from_user_id, to_user_id, is_like)
+        
+        is_match = await self.pool.write(_swipe)
+        self._after_swipe(from_user_id, to_user_id)
+        return is_match
+    
+    async def create_swipes(self, swipes: List[Tuple[int, int, bool]]) -> List[bool]:
+        """Применить список свайпов (from_user_id, to_user_id, is_like) одной транзакцией
+
+        Используется для импорта и повторного применения свайпов.
+        Возвращает для каждого свайпа, создан ли им новый матч.
+        """
+        async def _swipes(db):
+            return [
+                await self._apply_swipe(db, from_user_id, to_user_id, is_like)
+                for from_user_id, to_user_id, is_like in swipes
+            ]
+        
+        matches = await self.pool.write(_swipes)
+        for from_user_id, to_user_id, _ in swipes:
+            self._after_swipe(from_user_id, to_user_id)
+        return matches
     
     async def get_unread_likes_count(self, user_id: int) -> int:
         """Получить количество непросмотренных лайков"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute(
-                '''SELECT COUNT(*) FROM swipes 
-                   WHERE to_user_id = ? AND is_like = 1 
-                   AND from_user_id NOT IN (
-                       SELECT to_user_id FROM swipes WHERE from_user_id = ? AND is_like = 1
+                '''SELECT COUNT(*) FROM swipes s
+                   WHERE s.to_user_id = ? AND s.is_like = 1 
+                   AND NOT EXISTS (
+                       SELECT 1 FROM swipes r
+                       WHERE r.from_user_id = ? AND r.to_user_id = s.from_user_id AND r.is_like = 1
                    )''',
                 (user_id, user_id)
             )
             result = await cursor.fetchone()
             return result[0] if result else 0
     
-    async def send_like_notification(self, to_user_id: int, bot):
-        """Отправить уведомление о лайке пользователю"""
-        try:
-            # Проверяем, включены ли уведомления у пользователя
-            user = await self.get_user(to_user_id)
-            if not user or not user.notifications_enabled:
-                return False
-            
-            # Получаем количество непросмотренных лайков
-            likes_count = await self.get_unread_likes_count(to_user_id)
-            
-            if likes_count == 0:
-                return False
-            
-            # Формируем текст уведомления
-            if likes_count == 1:
-                text = "❤️ <b>Кто-то поставил тебе лайк!</b>\n\nПосмотреть можно в разделе «Лайки» 👀"
-            else:
-                # Склоняем число
-                if likes_count == 2:
-                    text = f"❤️ <b>{likes_count} человека поставили тебе лайк!</b>\n\nПосмотреть можно в разделе «Лайки» 👀"
-                elif likes_count in [3, 4]:
-                    text = f"❤️ <b>{likes_count} человека поставили тебе лайк!</b>\n\nПосмотреть можно в разделе «Лайки» 👀"
-                else:
-                    text = f"❤️ <b>{likes_count} человек поставили тебе лайк!</b>\n\nПосмотреть можно в разделе «Лайки» 👀"
-            
-            # Отправляем уведомление
-            await bot.send_message(
-                chat_id=to_user_id,
-                text=text,
-                parse_mode="HTML"
+    @staticmethod
+    def format_likes_notification(likes_count: int) -> str:
+        """Текст уведомления о непросмотренных лайках"""
+        if likes_count == 1:
+            return "❤️ <b>Кто-то поставил тебе лайк!</b>\n\nПосмотреть можно в разделе «Лайки» 👀"
+        
+        # Склоняем число
+        if likes_count in [2, 3, 4]:
+            return f"❤️ <b>{likes_count} человека поставили тебе лайк!</b>\n\nПосмотреть можно в разделе «Лайки» 👀"
+        return f"❤️ <b>{likes_count} человек поставили тебе лайк!</b>\n\nПосмотреть можно в разделе «Лайки» 👀"
+    
+    async def get_likes_notification_text(self, to_user_id: int) -> Optional[str]:
+        """Текст уведомления о лайках или None, если отправлять нечего"""
+        # Проверяем, включены ли уведомления у пользователя
+        user = await self.get_user(to_user_id)
+        if not user or not user.notifications_enabled:
+            return None
+        
+        # Получаем количество непросмотренных лайков
+        likes_count = await self.get_unread_likes_count(to_user_id)
+        if likes_count == 0:
+            return None
+        
+        return self.format_likes_notification(likes_count)
+    
+    async def queue_like_notification(self, to_user_id: int):
+        """Поставить в очередь уведомление о лайке
+
+        Пока уведомление не отправлено, новые лайки не создают новых
+        сообщений: текст «N человек поставили тебе лайк» формируется
+        в момент отправки.
+        """
+        async def _enqueue(db):
+            await db.execute(
+                '''INSERT INTO notification_outbox (chat_id, kind, coalesce_key)
+                   VALUES (?, 'likes', ?)
+                   ON CONFLICT (coalesce_key) DO UPDATE SET version = version + 1''',
+                (to_user_id, f'likes:{to_user_id}')
             )
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to send like notification to user {to_user_id}: {e}")
-            return False
+        
+        await self.pool.write(_enqueue)
+        self.outbox_ready.set()
+    
+    async def queue_notification(self, chat_id: int, text: str, parse_mode: str = "HTML",
+                                 disable_web_page_preview: bool = False):
+        """Поставить в очередь произвольное сообщение пользователю"""
+        async def _enqueue(db):
+            await db.execute(
+                '''INSERT INTO notification_outbox (chat_id, kind, text, parse_mode, disable_web_page_preview)
+                   VALUES (?, 'text', ?, ?, ?)''',
+                (chat_id, text, parse_mode, disable_web_page_preview)
+            )
+        
+        await self.pool.write(_enqueue)
+        self.outbox_ready.set()
+    
+    async def get_due_notifications(self, now: float, limit: int = 100) -> List[Dict[str, Any]]:
+        """Уведомления, время отправки которых наступило"""
+        async with self.pool.reader() as db:
+            cursor = await db.execute(
+                '''SELECT * FROM notification_outbox
+                   WHERE next_attempt_at <= ?
+                   ORDER BY next_attempt_at, notification_id
+                   LIMIT ?''',
+                (now, limit)
+            )
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    async def complete_notifications(self, notifications: List[Dict[str, Any]]):
+        """Удалить отправленные уведомления
+
+        Строка остается в очереди, если после выборки ее version изменилась:
+        значит, пришел новый лайк и уведомление нужно отправить еще раз.
+        """
+        if not notifications:
+            return
+        
+        async def _complete(db):
+            await db.executemany(
+                'DELETE FROM notification_outbox WHERE notification_id = ? AND version = ?',
+                [(n['notification_id'], n['version']) for n in notifications]
+            )
+        
+        await self.pool.write(_complete)
+    
+    async def reschedule_notification(self, notification_id: int, next_attempt_at: float, attempts: int):
+        """Отложить повторную отправку уведомления"""
+        async def _reschedule(db):
+            await db.execute(
+                'UPDATE notification_outbox SET next_attempt_at = ?, attempts = ? WHERE notification_id = ?',
+                (next_attempt_at, attempts, notification_id)
+            )
+        
+        await self.pool.write(_reschedule)
+    
+    async def get_outbox_size(self) -> int:
+        """Количество уведомлений в очереди"""
+        async with self.pool.reader() as db:
+            cursor = await db.execute('SELECT COUNT(*) FROM notification_outbox')
+            row = await cursor.fetchone()
+            return row[0]
+    
+    async def get_photo_check(self, file_unique_id: str) -> Optional[Dict[str, Any]]:
+        """Сохраненный результат проверки фото"""
+        async with self.pool.reader() as db:
+            cursor = await db.execute(
+                'SELECT face_count, basic_valid FROM photo_checks WHERE file_unique_id = ?',
+                (file_unique_id,)
+            )
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+    
+    async def save_photo_check(self, file_unique_id: str, face_count: Optional[int], basic_valid: bool):
+        """Сохранить результат проверки фото"""
+        async def _save(db):
+            await db.execute(
+                'INSERT OR REPLACE INTO photo_checks (file_unique_id, face_count, basic_valid) VALUES (?, ?, ?)',
+                (file_unique_id, face_count, basic_valid)
+            )
+        
+        await self.pool.write(_save)
+    
+    async def get_ai_cache(self, cache_key: str, now: float) -> Optional[Dict[str, Any]]:
+        """Сохраненный ответ AI, если он еще не устарел"""
+        async with self.pool.reader() as db:
+            cursor = await db.execute(
+                'SELECT response, tokens, expires_at FROM ai_cache WHERE cache_key = ? AND expires_at > ?',
+                (cache_key, now)
+            )
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+    
+    async def save_ai_cache(self, cache_key: str, method: str, response: str, tokens: int, expires_at: float):
+        """Сохранить ответ AI"""
+        async def _save(db):
+            await db.execute(
+                '''INSERT OR REPLACE INTO ai_cache (cache_key, method, response, tokens, expires_at)
+                   VALUES (?, ?, ?, ?, ?)''',
+                (cache_key, method, response, tokens, expires_at)
+            )
+        
+        await self.pool.write(_save)
+    
+    async def purge_ai_cache(self, now: float):
+        """Удалить устаревшие ответы AI"""
+        async def _purge(db):
+            await db.execute('DELETE FROM ai_cache WHERE expires_at <= ?', (now,))
+        
+        await self.pool.write(_purge)
+    
+    async def get_photos_after(self, after_photo_id: int, limit: int = 500) -> List[UserPhoto]:
+        """Страница всех фотографий по возрастанию photo_id (для пакетной обработки)"""
+        async with self.pool.reader() as db:
+            cursor = await db.execute(
+                'SELECT * FROM user_photos WHERE photo_id > ? ORDER BY photo_id LIMIT ?',
+                (after_photo_id, limit)
+            )
+            rows = await cursor.fetchall()
+            return [UserPhoto(**dict(row)) for row in rows]
+    
+    async def get_photos_by_ids(self, photo_ids: List[int]) -> List[UserPhoto]:
+        """Фотографии по списку photo_id (удаленные пропускаются)"""
+        if not photo_ids:
+            return []
+        async with self.pool.reader() as db:
+            placeholders = ','.join('?' * len(photo_ids))
+            cursor = await db.execute(
+                f'SELECT * FROM user_photos WHERE photo_id IN ({placeholders}) ORDER BY photo_id',
+                list(photo_ids)
+            )
+            rows = await cursor.fetchall()
+            return [UserPhoto(**dict(row)) for row in rows]
+    
+    async def get_backfill_checkpoint(self, name: str) -> int:
+        """Сохраненная позиция пакетной задачи (0, если задача не запускалась)"""
+        async with self.pool.reader() as db:
+            cursor = await db.execute('SELECT position FROM backfill_checkpoints WHERE name = ?', (name,))
+            row = await cursor.fetchone()
+            return row[0] if row else 0
+    
+    async def save_backfill_checkpoint(self, name: str, position: int):
+        """Сохранить позицию пакетной задачи"""
+        async def _save(db):
+            await db.execute(
+                'INSERT OR REPLACE INTO backfill_checkpoints (name, position, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)',
+                (name, position)
+            )
+        
+        await self.pool.write(_save)
+    
+    async def get_backfill_retries(self, name: str, max_attempts: int) -> List[int]:
+        """Элементы пакетной задачи, ждущие повторной обработки"""
+        async with self.pool.reader() as db:
+            cursor = await db.execute(
+                'SELECT item_id FROM backfill_retries WHERE name = ? AND attempts < ? ORDER BY item_id',
+                (name, max_attempts)
+            )
+            return [row[0] for row in await cursor.fetchall()]
+    
+    async def save_backfill_retry(self, name: str, item_id: int, error: Optional[str]):
+        """Запомнить элемент, который не удалось обработать (повторная ошибка увеличивает attempts)"""
+        async def _save(db):
+            await db.execute(
+                '''INSERT INTO backfill_retries (name, item_id, last_error) VALUES (?, ?, ?)
+                   ON CONFLICT (name, item_id) DO UPDATE SET attempts = attempts + 1, last_error = excluded.last_error''',
+                (name, item_id, error)
+            )
+        
+        await self.pool.write(_save)
+    
+    async def delete_backfill_retries(self, name: str, item_ids: Optional[List[int]] = None):
+        """Убрать элементы из повторной обработки (без item_ids - все элементы задачи)"""
+        async def _delete(db):
+            if item_ids is None:
+                await db.execute('DELETE FROM backfill_retries WHERE name = ?', (name,))
+            else:
+                await db.executemany(
+                    'DELETE FROM backfill_retries WHERE name = ? AND item_id = ?',
+                    [(name, item_id) for item_id in item_ids]
+                )
+        
+        await self.pool.write(_delete)
     
     async def get_user_photos(self, user_id: int) -> List[UserPhoto]:
         """Получить фотографии пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.reader() as db:
             cursor = await db.execute(
                 'SELECT * FROM user_photos WHERE user_id = ? ORDER BY is_main DESC, order_num, uploaded_at',
                 (user_id,)
@@ -494,7 +907,7 @@ class Database:
     
     async def add_user_photo(self, user_id: int, file_id: str, file_unique_id: str, is_main: bool = False) -> UserPhoto:
         """Добавить фотографию пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async def _add_photo(db):
             # Если это главная фотография, убираем флаг у других
             if is_main:
                 await db.execute(
@@ -517,7 +930,6 @@ class Database:
             )
             
             photo_id = cursor.lastrowid
-            await db.commit()
             
             return UserPhoto(
                 photo_id=photo_id,
@@ -528,90 +940,93 @@ class Database:
                 is_main=is_main,
                 uploaded_at=datetime.now()
             )
+        
+        return await self.pool.write(_add_photo)
     
     async def delete_user_photo(self, user_id: int, photo_id: int) -> bool:
         """Удалить фото пользователя"""
+        async def _delete_photo(db):
+            # Проверяем, принадлежит ли фото пользователю
+            cursor = await db.execute(
+                'SELECT order_num FROM user_photos WHERE photo_id = ? AND user_id = ?',
+                (photo_id, user_id)
+            )
+            photo = await cursor.fetchone()
+            
+            if not photo:
+                return False
+            
+            deleted_order = photo[0]
+            
+            # Удаляем фото
+            await db.execute(
+                'DELETE FROM user_photos WHERE photo_id = ? AND user_id = ?',
+                (photo_id, user_id)
+            )
+            
+            # Обновляем порядок оставшихся фото
+            await db.execute(
+                'UPDATE user_photos SET order_num = order_num - 1 WHERE user_id = ? AND order_num > ?',
+                (user_id, deleted_order)
+            )
+            
+            return True
+        
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                # Проверяем, принадлежит ли фото пользователю
-                cursor = await db.execute(
-                    'SELECT order_num FROM user_photos WHERE photo_id = ? AND user_id = ?',
-                    (photo_id, user_id)
-                )
-                photo = await cursor.fetchone()
-                
-                if not photo:
-                    return False
-                
-                deleted_order = photo[0]
-                
-                # Удаляем фото
-                await db.execute(
-                    'DELETE FROM user_photos WHERE photo_id = ? AND user_id = ?',
-                    (photo_id, user_id)
-                )
-                
-                # Обновляем порядок оставшихся фото
-                await db.execute(
-                    'UPDATE user_photos SET order_num = order_num - 1 WHERE user_id = ? AND order_num > ?',
-                    (user_id, deleted_order)
-                )
-                
-                await db.commit()
-                return True
+            return await self.pool.write(_delete_photo)
         except Exception as e:
             logger.error(f"Error deleting photo: {e}")
             return False
     
     async def set_main_photo(self, user_id: int, photo_id: int) -> bool:
         """Установить главное фото"""
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                # Проверяем, принадлежит ли фото пользователю
-                cursor = await db.execute(
-                    'SELECT photo_id FROM user_photos WHERE photo_id = ? AND user_id = ?',
-                    (photo_id, user_id)
-                )
-                photo = await cursor.fetchone()
-                
-                if not photo:
-                    return False
-                
-                # Сбрасываем флаг is_main у всех фото пользователя
-                await db.execute(
-                    'UPDATE user_photos SET is_main = 0 WHERE user_id = ?',
-                    (user_id,)
-                )
-                
-                # Устанавливаем выбранное фото как главное и порядок = 0 (будет первым)
+        async def _set_main(db):
+            # Проверяем, принадлежит ли фото пользователю
+            cursor = await db.execute(
+                'SELECT photo_id FROM user_photos WHERE photo_id = ? AND user_id = ?',
+                (photo_id, user_id)
+            )
+            photo = await cursor.fetchone()
+            
+            if not photo:
+                return False
+            
+            # Сбрасываем флаг is_main у всех фото пользователя
+            await db.execute(
+                'UPDATE user_photos SET is_main = 0 WHERE user_id = ?',
+                (user_id,)
+            )
+            
+            # Устанавливаем выбранное фото как главное и порядок = 0 (будет первым)
+            await db.execute(
+                'UPDATE user_photos SET is_main = 1, order_num = 0 WHERE photo_id = ?',
+                (photo_id,)
+            )
+            
+            # Получаем все остальные фото и переназначаем им порядок начиная с 1
+            cursor = await db.execute(
+                'SELECT photo_id FROM user_photos WHERE user_id = ? AND photo_id != ? ORDER BY uploaded_at',
+                (user_id, photo_id)
+            )
+            other_photos = await cursor.fetchall()
+            
+            for i, (other_photo_id,) in enumerate(other_photos, 1):
                 await db.execute(
-                    'UPDATE user_photos SET is_main = 1, order_num = 0 WHERE photo_id = ?',
-                    (photo_id,)
-                )
-                
-                # Получаем все остальные фото и переназначаем им порядок начиная с 1
-                cursor = await db.execute(
-                    'SELECT photo_id FROM user_photos WHERE user_id = ? AND photo_id != ? ORDER BY uploaded_at',
-                    (user_id, photo_id)
+                    'UPDATE user_photos SET order_num = ? WHERE photo_id = ?',
+                    (i, other_photo_id)
                 )
-                other_photos = await cursor.fetchall()
-                
-                for i, (other_photo_id,) in enumerate(other_photos, 1):
-                    await db.execute(
-                        'UPDATE user_photos SET order_num = ? WHERE photo_id = ?',
-                        (i, other_photo_id)
-                    )
-                
-                await db.commit()
-                return True
+            
+            return True
+        
+        try:
+            return await self.pool.write(_set_main)
         except Exception as e:
             logger.error(f"Error setting main photo: {e}")
             return False
     
     async def get_user_matches(self, user_id: int) -> List[Dict[str, Any]]:
         """Получить матчи пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.reader() as db:
             query = '''
                 SELECT m.*, 
                        u.name, u.age, u.city,
@@ -629,8 +1044,7 @@ class Database:
 
     async def get_incoming_likes(self, user_id: int) -> List[Dict[str, Any]]:
         """Получить пользователей, которые лайкнули данного пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.reader() as db:
             query = '''
                 SELECT u.user_id, u.name, u.age, u.city, u.bio, u.gender,
                        p.file_id as main_photo, s.created_at as liked_at
@@ -639,9 +1053,9 @@ class Database:
                 LEFT JOIN user_photos p ON p.user_id = u.user_id AND p.is_main = 1
                 WHERE s.to_user_id = ? 
                 AND s.is_like = 1
-                AND s.from_user_id NOT IN (
-                    SELECT to_user_id FROM swipes 
-                    WHERE from_user_id = ? AND is_like IS NOT NULL
+                AND NOT EXISTS (
+                    SELECT 1 FROM swipes r 
+                    WHERE r.from_user_id = ? AND r.to_user_id = s.from_user_id AND r.is_like IS NOT NULL
                 )
                 ORDER BY s.created_at DESC
             '''
@@ -652,57 +1066,16 @@ class Database:
 
     async def respond_to_like(self, from_user_id: int, to_user_id: int, is_like: bool) -> bool:
         """Ответить на лайк (создать свайп в ответ и проверить на матч)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Создаем ответный свайп
-            await db.execute(
-                'INSERT OR IGNORE INTO swipes (from_user_id, to_user_id, is_like) VALUES (?, ?, ?)',
-                (from_user_id, to_user_id, is_like)
-            )
-            await db.commit()
-            
-            # Обновляем статистику отправителя
-            await db.execute(
-                'UPDATE users SET likes_sent = likes_sent + 1 WHERE user_id = ?',
-                (from_user_id,)
-            )
-            
-            # Если это лайк, обновляем статистику получателя
-            if is_like:
-                await db.execute(
-                    'UPDATE users SET likes_received = likes_received + 1 WHERE user_id = ?',
-                    (to_user_id,)
-                )
-                
-                # Проверяем на взаимную симпатию (исходный лайк уже есть)
-                cursor = await db.execute(
-                    'SELECT 1 FROM swipes WHERE from_user_id = ? AND to_user_id = ? AND is_like = 1',
-                    (to_user_id, from_user_id)
-                )
-                mutual_like = await cursor.fetchone()
-                
-                if mutual_like:
-                    # Создаем матч
-                    await db.execute(
-                        'INSERT OR IGNORE INTO matches (user1_id, user2_id) VALUES (?, ?)',
-                        (min(from_user_id, to_user_id), max(from_user_id, to_user_id))
-                    )
-                    
-                    # Обновляем счетчик матчей
-                    await db.execute(
-                        'UPDATE users SET matches_count = matches_count + 1 WHERE user_id IN (?, ?)',
-                        (from_user_id, to_user_id)
-                    )
-                    await db.commit()
-                    return True  # Матч создан
-            
-            await db.commit()
-            return False  # Матч не создан
+        async def _respond(db):
+            return await self._apply_swipe(db, from_user_id, to_user_id, is_like)
+        
+        is_match = await self.pool.write(_respond)
+        self._after_swipe(from_user_id, to_user_id)
+        return is_match
 
     async def get_user_statistics(self, user_id: int) -> Dict[str, Any]:
         """Получить расширенную статистику пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            
+        async with self.pool.reader() as db:
             # Базовая статистика пользователя
             cursor = await db.execute(
                 '''SELECT profile_views, likes_sent, likes_received, matches_count, 
@@ -770,9 +1143,7 @@ class Database:
 
     async def get_top_users(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Получить топ пользователей по различным критериям"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            
+        async with self.pool.reader() as db:
             # Топ по популярности (больше всего лайков получено)
             cursor = await db.execute(
                 '''SELECT name, likes_received, matches_count, profile_views
@@ -813,11 +1184,57 @@ class Database:
                 'successful': [dict(row) for row in top_successful]
             }
 
+    async def get_global_statistics(self) -> Dict[str, Any]:
+        """Получить общую статистику бота"""
+        async with self.pool.reader() as db:
+            # Общее количество пользователей
+            cursor = await db.execute('SELECT COUNT(*) as total_users FROM users')
+            total_users = (await cursor.fetchone())['total_users']
+            
+            # Активные пользователи (заходили за последнюю неделю)
+            cursor = await db.execute(
+                "SELECT COUNT(*) as active_users FROM users WHERE last_active >= datetime('now', '-7 days')"
+            )
+            active_users = (await cursor.fetchone())['active_users']
+            
+            # Пользователи с полными анкетами
+            cursor = await db.execute(
+                'SELECT COUNT(*) as complete_profiles FROM users WHERE name IS NOT NULL AND age IS NOT NULL AND gender IS NOT NULL'
+            )
+            complete_profiles = (await cursor.fetchone())['complete_profiles']
+            
+            # Общее количество лайков
+            cursor = await db.execute('SELECT COUNT(*) as total_likes FROM swipes WHERE is_like = 1')
+            total_likes = (await cursor.fetchone())['total_likes']
+            
+            # Общее количество матчей
+            cursor = await db.execute('SELECT COUNT(*) as total_matches FROM matches')
+            total_matches = (await cursor.fetchone())['total_matches']
+            
+            # Средний возраст пользователей
+            cursor = await db.execute('SELECT AVG(age) as avg_age FROM users WHERE age IS NOT NULL')
+            avg_age_result = await cursor.fetchone()
+            avg_age = round(avg_age_result['avg_age'], 1) if avg_age_result['avg_age'] else 0
+            
+            # Активность сегодня
+            cursor = await db.execute(
+                "SELECT COUNT(*) as today_likes FROM swipes WHERE is_like = 1 AND date(created_at) = date('now')"
+            )
+            today_likes = (await cursor.fetchone())['today_likes']
+            
+            return {
+                'total_users': total_users,
+                'active_users': active_users,
+                'complete_profiles': complete_profiles,
+                'total_likes': total_likes,
+                'total_matches': total_matches,
+                'avg_age': avg_age,
+                'today_likes': today_likes
+            }
+
     async def get_profile_recommendations(self, user_id: int) -> Dict[str, Any]:
         """Получить рекомендации по улучшению профиля"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            
+        async with self.pool.reader() as db:
             # Получаем данные пользователя
             cursor = await db.execute(
                 '''SELECT name, age, bio, city, profile_views, likes_received, 
@@ -891,30 +1308,32 @@ class Database:
 
     async def get_users_in_radius(self, user_id: int, lat: float, lon: float, radius_km: int) -> List[Dict[str, Any]]:
         """Получить пользователей в радиусе от указанных координат"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            
-            query = '''
-                SELECT user_id, name, age, city, bio, latitude, longitude,
-                       (6371 * acos(cos(radians(?)) * cos(radians(latitude)) * 
-                        cos(radians(longitude) - radians(?)) + 
-                        sin(radians(?)) * sin(radians(latitude)))) AS distance
-                FROM users 
-                WHERE user_id != ? AND name IS NOT NULL AND latitude IS NOT NULL 
-                AND longitude IS NOT NULL
-                HAVING distance <= ?
-                ORDER BY distance
-            '''
-            
-            cursor = await db.execute(query, (lat, lon, lat, user_id, radius_km))
-            rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+        async with self.pool.reader() as db:
+            nearby_ids, distances = await self._nearby_user_ids(db, lat, lon, radius_km)
+            distance_by_id = dict(zip(nearby_ids.tolist(), distances.tolist()))
+            
+            result = []
+            ids = list(distance_by_id)
+            for start in range(0, len(ids), 5000):
+                chunk = ids[start:start + 5000]
+                cursor = await db.execute(
+                    f'''SELECT user_id, name, age, city, bio, latitude, longitude
+                       FROM users
+                       WHERE user_id IN ({', '.join('?' for _ in chunk)})
+                       AND user_id != ? AND name IS NOT NULL''',
+                    chunk + [user_id]
+                )
+                for row in await cursor.fetchall():
+                    row_dict = dict(row)
+                    row_dict['distance'] = distance_by_id[row_dict['user_id']]
+                    result.append(row_dict)
+        
+        result.sort(key=lambda item: item['distance'])
+        return result
 
     async def get_recently_active_users(self, minutes: int = 30) -> List[Dict[str, Any]]:
         """Получить недавно активных пользователей"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            
+        async with self.pool.reader() as db:
             query = '''
                 SELECT name, age, city, bio, last_active
                 FROM users 
@@ -929,9 +1348,7 @@ class Database:
 
     async def search_users_by_city(self, city: str) -> List[Dict[str, Any]]:
         """Поиск пользователей по городу"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            
+        async with self.pool.reader() as db:
             query = '''
                 SELECT name, age, city, bio
                 FROM users 
@@ -945,9 +1362,7 @@ class Database:
 
     async def search_users_by_name(self, name: str) -> List[Dict[str, Any]]:
         """Поиск пользователей по имени"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            
+        async with self.pool.reader() as db:
             query = '''
                 SELECT name, age, city, bio
                 FROM users 
@@ -961,70 +1376,77 @@ class Database:
 
     async def delete_user_profile(self, user_id: int):
         """Полное удаление профиля пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            try:
-                # Удаляем в правильном порядке (из-за внешних ключей)
-                
-                # 1. Удаляем сообщения чатов (через chat_id и from_user_id)
-                await db.execute('''
-                    DELETE FROM messages 
-                    WHERE from_user_id = ? 
-                    OR chat_id IN (
-                        SELECT c.chat_id FROM chats c
-                        JOIN matches m ON c.match_id = m.match_id
-                        WHERE m.user1_id = ? OR m.user2_id = ?
-                    )
-                ''', (user_id, user_id, user_id))
-                
-                # 2. Удаляем чаты (через связь с matches)
-                await db.execute('''
-                    DELETE FROM chats 
-                    WHERE match_id IN (
-                        SELECT match_id FROM matches 
-                        WHERE user1_id = ? OR user2_id = ?
-                    )
-                ''', (user_id, user_id))
-                
-                # 3. Удаляем матчи
-                await db.execute('DELETE FROM matches WHERE user1_id = ? OR user2_id = ?', (user_id, user_id))
-                
-                # 4. Удаляем свайпы
-                await db.execute('DELETE FROM swipes WHERE from_user_id = ? OR to_user_id = ?', (user_id, user_id))
-                
-                # 5. Удаляем фотографии
-                await db.execute('DELETE FROM user_photos WHERE user_id = ?', (user_id,))
-                
-                # 6. Сбрасываем данные профиля пользователя (оставляем базовую запись)
-                await db.execute('''
-                    UPDATE users SET 
-                        name = NULL,
-                        age = NULL,
-                        city = NULL,
-                        bio = NULL,
-                        gender = NULL,
-                        looking_for = NULL,
-                        latitude = NULL,
-                        longitude = NULL,
-                        is_active = 0,
-                        show_distance = 1,
-                        show_age = 1,
-                        show_location = 1,
-                        search_radius = 50,
-                        min_age = 18,
-                        max_age = 35,
-                        max_distance = 50,
-                        profile_views = 0,
-                        likes_sent = 0,
-                        likes_received = 0,
-                        matches_count = 0,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE user_id = ?
-                ''', (user_id,))
-                
-                await db.commit()
-                logger.info(f"User profile {user_id} deleted successfully")
-                
-            except Exception as e:
-                await db.rollback()
-                logger.error(f"Error deleting user profile {user_id}: {e}")
-                raise
+        async def _delete_profile(db):
+            # Удаляем в правильном порядке (из-за внешних ключей)
+            
+            # 1. Удаляем сообщения чатов (через chat_id и from_user_id)
+            await db.execute('''
+                DELETE FROM messages 
+                WHERE from_user_id = ? 
+                OR chat_id IN (
+                    SELECT c.chat_id FROM chats c
+                    JOIN matches m ON c.match_id = m.match_id
+                    WHERE m.user1_id = ? OR m.user2_id = ?
+                )
+            ''', (user_id, user_id, user_id))
+            
+            # 2. Удаляем чаты (через связь с matches)
+            await db.execute('''
+                DELETE FROM chats 
+                WHERE match_id IN (
+                    SELECT match_id FROM matches 
+                    WHERE user1_id = ? OR user2_id = ?
+                )
+            ''', (user_id, user_id))
+            
+            # 3. Удаляем матчи
+            await db.execute('DELETE FROM matches WHERE user1_id = ? OR user2_id = ?', (user_id, user_id))
+            
+            # 4. Удаляем свайпы
+            await db.execute('DELETE FROM swipes WHERE from_user_id = ? OR to_user_id = ?', (user_id, user_id))
+            
+            # 5. Удаляем фотографии
+            await db.execute('DELETE FROM user_photos WHERE user_id = ?', (user_id,))
+            
+            # Координаты сбрасываются ниже, убираем точку из геоиндекса
+            if self.geo_index_enabled:
+                await db.execute('DELETE FROM users_geo WHERE user_id = ?', (user_id,))
+            
+            # 6. Сбрасываем данные профиля пользователя (оставляем базовую запись)
+            await db.execute('''
+                UPDATE users SET 
+                    name = NULL,
+                    age = NULL,
+                    city = NULL,
+                    bio = NULL,
+                    gender = NULL,
+                    looking_for = NULL,
+                    latitude = NULL,
+                    longitude = NULL,
+                    is_active = 0,
+                    show_distance = 1,
+                    show_age = 1,
+                    show_location = 1,
+                    search_radius = 50,
+                    min_age = 18,
+                    max_age = 35,
+                    max_distance = 50,
+                    profile_views = 0,
+                    likes_sent = 0,
+                    likes_received = 0,
+                    matches_count = 0,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE user_id = ?
+            ''', (user_id,))
+        
+        try:
+            await self.pool.write(_delete_profile)
+            self.counters.forget_user(user_id)
+            self.users.invalidate(user_id)
+            self.decks.invalidate(user_id)
+            self.seen.forget_user(user_id)
+            self._publish('forget', (user_id,))
+            logger.info(f"User profile {user_id} deleted successfully")
+        except Exception as e:
+            logger.error(f"Error deleting user profile {user_id}: {e}")
+            raise
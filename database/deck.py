@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Deque, Dict, Optional, Set
+
+from .models import User
+
+if TYPE_CHECKING:
+    from .database import Database
+
+logger = logging.getLogger(__name__)
+
+# Поля анкеты, от которых зависит выдача кандидатов
+DECK_FILTER_FIELDS = frozenset({
+    'gender', 'looking_for', 'min_age', 'max_age',
+    'search_radius', 'max_distance', 'latitude', 'longitude',
+})
+
+
+class SwipeDeck:
+    """Очередь кандидатов одного пользователя"""
+
+    __slots__ = ('queue', 'queued', 'shown', 'generation', 'refill_task')
+
+    def __init__(self):
+        self.queue: Deque[int] = deque()
+        self.queued: Set[int] = set()
+        # Уже показанные карточки не возвращаем при дозаполнении
+        self.shown: Set[int] = set()
+        self.generation = 0
+        self.refill_task: Optional[asyncio.Task] = None
+
+    def reset(self):
+        self.queue.clear()
+        self.queued.clear()
+        self.shown.clear()
+        self.generation += 1
+        if self.refill_task and not self.refill_task.done():
+            self.refill_task.cancel()
+        self.refill_task = None
+
+
+class SwipeDeckManager:
+    """Предрассчитанные колоды кандидатов для свайпа
+
+    Колода заполняется пачками из ``get_users_for_swipe`` и выдает по одной
+    карточке. Когда в ней остается меньше ``low_water`` анкет, следующая
+    пачка подгружается в фоне.
+    """
+
+    def __init__(self, db: 'Database', batch_size: int = 100, low_water: int = 10, max_decks: int = 10000):
+        """
+        :param db: Экземпляр базы данных
+        :param batch_size: Сколько кандидатов загружать за один запрос
+        :param low_water: Порог, ниже которого колода дозаполняется в фоне
+        :param max_decks: Максимум одновременно хранимых колод (LRU)
+        """
+        self.db = db
+        self.batch_size = max(1, batch_size)
+        self.low_water = max(0, min(low_water, self.batch_size - 1))
+        self.max_decks = max(1, max_decks)
+        self._decks: 'OrderedDict[int, SwipeDeck]' = OrderedDict()
+
+    def _get_deck(self, user_id: int) -> SwipeDeck:
+        deck = self._decks.get(user_id)
+        if deck is None:
+            deck = SwipeDeck()
+            self._decks[user_id] = deck
+            while len(self._decks) > self.max_decks:
+                _, evicted = self._decks.popitem(last=False)
+                evicted.reset()
+        else:
+            self._decks.move_to_end(user_id)
+        return deck
+
+    def invalidate(self, user_id: int):
+        """Сбросить колоду пользователя (например, после смены фильтров)"""
+        deck = self._decks.pop(user_id, None)
+        if deck:
+            deck.reset()
+            logger.info(f"Swipe deck for user {user_id} invalidated")
+
+    def discard(self, user_id: int, candidate_id: int):
+        """Убрать кандидата из колоды пользователя"""
+        deck = self._decks.get(user_id)
+        if deck and candidate_id in deck.queued:
+            deck.queued.discard(candidate_id)
+            deck.queue.remove(candidate_id)
+
+    def clear(self):
+        """Сбросить все колоды"""
+        for deck in self._decks.values():
+            deck.reset()
+        self._decks.clear()
+
+    async def _fill(self, user_id: int, deck: SwipeDeck) -> int:
+        generation = deck.generation
+        # Запрашиваем с запасом: часть выдачи уже лежит в колоде или была показана
+        limit = self.batch_size + len(deck.queued) + len(deck.shown)
+        candidates = await self.db.get_users_for_swipe(user_id, limit=limit)
+
+        if generation != deck.generation:
+            # Колоду сбросили, пока шел запрос
+            return 0
+
+        # Показанные анкеты, которых нет в выдаче, уже получили свайп
+        deck.shown.intersection_update(candidate.user_id for candidate in candidates)
+
+        added = 0
+        for candidate in candidates:
+            if added >= self.batch_size:
+                break
+            candidate_id = candidate.user_id
+            if candidate_id in deck.queued or candidate_id in deck.shown:
+                continue
+            deck.queue.append(candidate_id)
+            deck.queued.add(candidate_id)
+            added += 1
+
+        logger.info(f"Swipe deck for user {user_id} filled with {added} candidates ({len(deck.queue)} queued)")
+        return added
+
+    async def _refill_in_background(self, user_id: int, deck: SwipeDeck):
+        try:
+            await self._fill(user_id, deck)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to refill swipe deck for user {user_id}: {e}")
+        finally:
+            deck.refill_task = None
+
+    def _schedule_refill(self, user_id: int, deck: SwipeDeck):
+        if deck.refill_task is None and len(deck.queue) < self.low_water:
+            deck.refill_task = asyncio.create_task(self._refill_in_background(user_id, deck))
+
+    async def next_candidate(self, user_id: int, exclude_user_id: int = None) -> Optional[User]:
+        """Достать из колоды следующую анкету для показа"""
+        deck = self._get_deck(user_id)
+
+        # Пустую колоду заполняем сразу; если новых анкет нет,
+        # один раз возвращаем в выдачу пропущенные без свайпа
+        recycled = False
+        seen = await self.db.seen.get(user_id)
+        while True:
+            if not deck.queue:
+                if deck.refill_task:
+                    await asyncio.wait([deck.refill_task])
+                if not deck.queue:
+                    await self._fill(user_id, deck)
+
+            while deck.queue:
+                candidate_id = deck.queue.popleft()
+                deck.queued.discard(candidate_id)
+                if candidate_id == exclude_user_id or candidate_id in seen:
+                    continue
+
+                # Отмечаем до await, чтобы фоновое дозаполнение не вернуло анкету в колоду
+                deck.shown.add(candidate_id)
+                candidate = await self.db.get_user(candidate_id)
+                if not candidate or not candidate.is_active or not candidate.name:
+                    continue
+
+                self._schedule_refill(user_id, deck)
+                return candidate
+
+            if recycled or not deck.shown:
+                return None
+            deck.shown.clear()
+            recycled = True
+
+    def stats(self) -> Dict[str, int]:
+        """Статистика колод"""
+        return {
+            'decks': len(self._decks),
+            'queued': sum(len(deck.queue) for deck in self._decks.values()),
+            'refilling': sum(1 for deck in self._decks.values() if deck.refill_task),
+        }
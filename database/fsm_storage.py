@@ -0,0 +1,260 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Set
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from .pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FSMRecord:
+    """Состояние и данные FSM одного ключа"""
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    updated_at: float = 0.0
+    # data в JSON на момент записи - именно это и попадет в базу
+    encoded: str = '{}'
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM в таблице fsm_states вместо MemoryStorage
+
+    Незаконченное заполнение анкеты переживает перезапуск бота. Чтение
+    идет из кэша в памяти (промах - один SELECT), а изменения попадают
+    в кэш сразу и записываются в базу одной транзакцией раз в
+    ``flush_interval`` секунд или после ``max_pending`` измененных ключей,
+    поэтому смена состояния не добавляет коммит на каждое сообщение.
+
+    Состояние, не менявшееся дольше ``ttl`` секунд, считается брошенным:
+    при чтении оно пустое, а из базы удаляется фоновой очисткой.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        ttl: float = 86400.0,
+        cache_size: int = 10000,
+        flush_interval: float = 1.0,
+        max_pending: int = 200
+    ):
+        """
+        :param pool: Пул соединений, через писателя которого идет запись
+        :param ttl: Через сколько секунд без изменений состояние забывается (0 - никогда)
+        :param cache_size: Сколько записанных ключей держать в памяти
+        :param flush_interval: Максимальная задержка записи в секундах
+        :param max_pending: Количество измененных ключей, после которого запись идет сразу
+        """
+        self.pool = pool
+        self.ttl = ttl
+        self.cache_size = max(1, cache_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max(1, max_pending)
+
+        self._cache: 'OrderedDict[str, FSMRecord]' = OrderedDict()
+        # Ключи, измененные после последней записи; из кэша не вытесняются
+        self._dirty: Set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._next_purge = 0.0
+
+        self._metrics: Dict[str, float] = {
+            'hits': 0, 'misses': 0, 'expired': 0, 'writes': 0,
+            'flushes': 0, 'rows': 0, 'failed': 0, 'purged': 0,
+        }
+
+    def start(self):
+        """Запустить фоновую запись (после инициализации схемы)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        """Остановить фоновую запись и сохранить все накопленное"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    @staticmethod
+    def _make_key(key: StorageKey) -> str:
+        thread_id = key.thread_id if key.thread_id is not None else ''
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{thread_id}:{key.destiny}"
+
+    def _expired(self, record: FSMRecord, now: float) -> bool:
+        return self.ttl > 0 and not record.empty and record.updated_at + self.ttl <= now
+
+    async def _get_record(self, key: StorageKey) -> FSMRecord:
+        storage_key = self._make_key(key)
+        now = time.time()
+        record = self._cache.get(storage_key)
+        if record is not None:
+            self._cache.move_to_end(storage_key)
+            self._metrics['hits'] += 1
+        else:
+            self._metrics['misses'] += 1
+            record = await self._load(storage_key)
+            # Пока шел SELECT, ключ мог быть изменен - свежая запись важнее
+            record = self._cache.setdefault(storage_key, record)
+            self._evict()
+
+        if self._expired(record, now):
+            self._metrics['expired'] += 1
+            record = FSMRecord(updated_at=now)
+            self._store(storage_key, record)
+        return record
+
+    async def _load(self, storage_key: str) -> FSMRecord:
+        async with self.pool.reader() as db:
+            cursor = await db.execute(
+                'SELECT state, data, updated_at FROM fsm_states WHERE storage_key = ?',
+                (storage_key,)
+            )
+            row = await cursor.fetchone()
+        if row is None:
+            return FSMRecord()
+        encoded = row['data'] or '{}'
+        try:
+            data = json.loads(encoded)
+        except ValueError:
+            logger.error(f"Broken FSM data for {storage_key}, resetting")
+            data, encoded = {}, '{}'
+        return FSMRecord(state=row['state'], data=data, updated_at=row['updated_at'], encoded=encoded)
+
+    def _store(self, storage_key: str, record: FSMRecord):
+        self._cache[storage_key] = record
+        self._cache.move_to_end(storage_key)
+        self._dirty.add(storage_key)
+        self._metrics['writes'] += 1
+        if len(self._dirty) >= self.max_pending:
+            self._wakeup.set()
+        self._evict()
+
+    def _evict(self):
+        """Вытеснить самые старые записанные ключи сверх cache_size"""
+        excess = len(self._cache) - self.cache_size
+        if excess <= 0:
+            return
+        victims = []
+        for storage_key in self._cache:
+            if storage_key not in self._dirty:
+                victims.append(storage_key)
+                if len(victims) >= excess:
+                    break
+        for storage_key in victims:
+            del self._cache[storage_key]
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get_record(key)
+        new_state = state.state if isinstance(state, State) else state
+        self._store(self._make_key(key), FSMRecord(new_state, record.data, time.time(), record.encoded))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get_record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        """Сохранить данные FSM
+
+        Raises:
+            TypeError, ValueError: данные не сериализуются в JSON - ошибка
+            видна хендлеру сразу, а не теряется при фоновой записи
+        """
+        encoded = json.dumps(data, ensure_ascii=False)
+        record = await self._get_record(key)
+        self._store(self._make_key(key), FSMRecord(record.state, data.copy(), time.time(), encoded))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get_record(key)).data.copy()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                if self.ttl > 0 and time.time() >= self._next_purge:
+                    await self.purge_expired()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"FSM storage flush failed: {e}")
+
+    async def flush(self) -> int:
+        """Записать измененные ключи одной транзакцией"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+
+            dirty, self._dirty = self._dirty, set()
+            records = {storage_key: self._cache[storage_key] for storage_key in dirty}
+            upserts = []
+            deletes = []
+            for storage_key, record in records.items():
+                if record.empty:
+                    # Пустое состояние равно отсутствию строки
+                    deletes.append((storage_key,))
+                    continue
+                upserts.append((storage_key, record.state, record.encoded, record.updated_at))
+
+            async def _flush(db):
+                if upserts:
+                    await db.executemany(
+                        'INSERT OR REPLACE INTO fsm_states (storage_key, state, data, updated_at) VALUES (?, ?, ?, ?)',
+                        upserts
+                    )
+                if deletes:
+                    await db.executemany('DELETE FROM fsm_states WHERE storage_key = ?', deletes)
+
+            try:
+                await self.pool.write(_flush)
+            except Exception:
+                self._metrics['failed'] += 1
+                # Повторим со следующей записью; более новые изменения не затираем
+                for storage_key, record in records.items():
+                    self._cache.setdefault(storage_key, record)
+                self._dirty |= dirty
+                raise
+
+            self._metrics['flushes'] += 1
+            self._metrics['rows'] += len(dirty)
+            self._evict()
+            return len(dirty)
+
+    async def purge_expired(self):
+        """Удалить из базы состояния, не менявшиеся дольше ttl"""
+        now = time.time()
+        self._next_purge = now + max(self.ttl / 10, 60.0)
+
+        async def _purge(db):
+            cursor = await db.execute('DELETE FROM fsm_states WHERE updated_at <= ?', (now - self.ttl,))
+            return cursor.rowcount
+
+        purged = await self.pool.write(_purge)
+        if purged:
+            self._metrics['purged'] += purged
+            logger.info(f"Purged {purged} stale FSM states")
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'cached': len(self._cache),
+            'pending': len(self._dirty),
+            **self._metrics,
+        }
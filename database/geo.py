@@ -0,0 +1,57 @@
+import math
+from typing import Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Радиус поиска, если пользователь его не задал
+DEFAULT_SEARCH_RADIUS_KM = 50
+
+# Запас для bounding box: R*Tree хранит координаты во float32
+_BOX_PADDING_DEG = 1e-4
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние между двумя точками по поверхности Земли в километрах"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_km_many(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Векторная версия haversine_km: расстояния от точки до массива точек"""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    d_phi = phi2 - phi1
+    d_lambda = np.radians(lons - lon)
+
+    a = np.sin(d_phi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    Прямоугольник (min_lat, max_lat, min_lon, max_lon), гарантированно
+    содержащий круг заданного радиуса вокруг точки
+    """
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM) + _BOX_PADDING_DEG
+    min_lat = max(-90.0, lat - d_lat)
+    max_lat = min(90.0, lat + d_lat)
+
+    # У полюсов или при переходе через 180-й меридиан берем всю долготу
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return min_lat, max_lat, -180.0, 180.0
+
+    d_lon = math.degrees(math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)))))
+    d_lon += _BOX_PADDING_DEG
+    min_lon = lon - d_lon
+    max_lon = lon + d_lon
+    if min_lon < -180.0 or max_lon > 180.0:
+        return min_lat, max_lat, -180.0, 180.0
+
+    return min_lat, max_lat, min_lon, max_lon
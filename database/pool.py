@@ -0,0 +1,397 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+# Операция записи: получает соединение писателя, транзакцией управляет пул
+WriteOperation = Callable[[aiosqlite.Connection], Awaitable[Any]]
+
+STORAGE_MODE_DEFAULT = 'default'
+STORAGE_MODE_WAL = 'wal'
+
+
+def _must_propagate(error: BaseException) -> bool:
+    """Нужно ли пробросить исключение из задачи записи дальше
+
+    Отмена, пришедшая из самой операции, касается только этой операции.
+    Пробрасываем лишь отмену задачи писателя и остановку процесса.
+    """
+    if isinstance(error, asyncio.CancelledError):
+        task = asyncio.current_task()
+        return task is not None and task.cancelling() > 0
+    return not isinstance(error, Exception)
+
+
+def _as_write_error(error: BaseException) -> BaseException:
+    # CancelledError в future вызывающего выглядел бы как отмена его самого
+    if isinstance(error, asyncio.CancelledError):
+        wrapped = RuntimeError("Операция записи отменена")
+        wrapped.__cause__ = error
+        return wrapped
+    return error
+
+
+class ConnectionPool:
+    """Пул долгоживущих соединений SQLite: один писатель и N читателей
+
+    В режиме ``wal`` база переводится в WAL, а все изменения выполняет
+    отдельная задача-писатель, которая забирает операции из очереди и
+    фиксирует их пачками. Читатели при этом никогда не ждут писателя.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = 4,
+        acquire_timeout: float = 10.0,
+        collect_metrics: bool = True,
+        storage_mode: str = STORAGE_MODE_DEFAULT,
+        cache_size_kb: int = 16384,
+        mmap_size_mb: int = 128,
+        write_batch_size: int = 64
+    ):
+        """
+        :param db_path: Путь к файлу базы данных
+        :param size: Количество соединений для чтения
+        :param acquire_timeout: Максимальное ожидание свободного соединения в секундах
+        :param collect_metrics: Собирать ли статистику времени ожидания
+        :param storage_mode: 'default' или 'wal' (WAL + очередь писателя)
+        :param cache_size_kb: Размер кэша страниц на соединение (режим wal)
+        :param mmap_size_mb: Объем memory-mapped I/O (режим wal)
+        :param write_batch_size: Максимум операций в одной транзакции писателя
+        """
+        if storage_mode not in (STORAGE_MODE_DEFAULT, STORAGE_MODE_WAL):
+            raise ValueError(f"Неизвестный режим хранения: {storage_mode}")
+
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.acquire_timeout = acquire_timeout
+        self.collect_metrics = collect_metrics
+        self.storage_mode = storage_mode
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size_mb = mmap_size_mb
+        self.write_batch_size = max(1, write_batch_size)
+
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._writer_lock = asyncio.Lock()
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._closed = True
+
+        self._metrics: Dict[str, Dict[str, float]] = {
+            'reader': {'acquired': 0, 'timeouts': 0, 'wait_total': 0.0, 'wait_max': 0.0},
+            'writer': {'acquired': 0, 'timeouts': 0, 'wait_total': 0.0, 'wait_max': 0.0},
+        }
+        self._write_metrics: Dict[str, float] = {
+            'operations': 0, 'failed': 0, 'commits': 0,
+            'commit_total': 0.0, 'commit_max': 0.0, 'queue_max': 0,
+        }
+
+    @property
+    def wal_enabled(self) -> bool:
+        return self.storage_mode == STORAGE_MODE_WAL
+
+    async def _connect(self, writer: bool = False) -> aiosqlite.Connection:
+        # Писатель работает в autocommit, транзакции открывает сам пул
+        conn = await aiosqlite.connect(self.db_path, isolation_level=None if writer else '')
+        conn.row_factory = aiosqlite.Row
+        await conn.execute(f'PRAGMA busy_timeout = {int(self.acquire_timeout * 1000)}')
+
+        if self.wal_enabled:
+            await conn.execute(f'PRAGMA cache_size = -{int(self.cache_size_kb)}')
+            await conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size_mb) * 1024 * 1024}')
+            await conn.execute('PRAGMA temp_store = MEMORY')
+            if writer:
+                await conn.execute('PRAGMA journal_mode = WAL')
+                await conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    async def open(self):
+        """Открыть соединения пула"""
+        if not self._closed:
+            return
+
+        # Писатель открывается первым: он переключает базу в WAL
+        self._writer = await self._connect(writer=True)
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            conn = await self._connect()
+            self._readers.append(conn)
+            self._idle.put_nowait(conn)
+
+        if self.wal_enabled:
+            self._write_queue = asyncio.Queue()
+            self._writer_task = asyncio.create_task(self._writer_loop())
+
+        self._closed = False
+        logger.info(
+            f"Пул соединений открыт: 1 писатель, {self.size} читателей, "
+            f"режим {self.storage_mode} ({self.db_path})"
+        )
+
+    async def close(self):
+        """Закрыть все соединения пула"""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._writer_task:
+            # Писатель обработает оставшуюся очередь и завершится
+            if not self._writer_task.done():
+                self._write_queue.put_nowait(None)
+                await asyncio.wait([self._writer_task])
+            self._writer_task = None
+            self._write_queue = None
+
+        # Дожидаемся завершения текущей записи
+        async with self._writer_lock:
+            await self._writer.close()
+            self._writer = None
+
+        # Даем текущим чтениям вернуть соединения, чтобы не закрыть их посреди запроса
+        returned = 0
+        try:
+            async with asyncio.timeout(self.acquire_timeout or None):
+                while returned < len(self._readers):
+                    await self._idle.get()
+                    returned += 1
+        except TimeoutError:
+            logger.warning(f"Не дождались {len(self._readers) - returned} соединений для чтения при закрытии пула")
+
+        for conn in self._readers:
+            await conn.close()
+        self._readers.clear()
+        self._idle = None
+
+        logger.info(f"Пул соединений закрыт. Статистика: {self.stats()}")
+
+    @property
+    def is_open(self) -> bool:
+        return not self._closed
+
+    def _record_wait(self, kind: str, started: float):
+        if not self.collect_metrics:
+            return
+        waited = time.perf_counter() - started
+        metrics = self._metrics[kind]
+        metrics['acquired'] += 1
+        metrics['wait_total'] += waited
+        if waited > metrics['wait_max']:
+            metrics['wait_max'] = waited
+
+    def _record_timeout(self, kind: str):
+        self._metrics[kind]['timeouts'] += 1
+        logger.warning(f"Таймаут ожидания соединения ({kind}) после {self.acquire_timeout} сек")
+
+    @asynccontextmanager
+    async def reader(self):
+        """Получить соединение для чтения"""
+        if self._closed:
+            raise RuntimeError("Пул соединений не открыт")
+
+        started = time.perf_counter()
+        try:
+            conn = await asyncio.wait_for(self._idle.get(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._record_timeout('reader')
+            raise PoolTimeoutError("Нет свободных соединений для чтения")
+        self._record_wait('reader', started)
+
+        try:
+            yield conn
+        finally:
+            # Пул могли закрыть, пока шло чтение: соединение уже закрыто, возвращать некуда
+            if self._idle is not None:
+                self._idle.put_nowait(conn)
+
+    async def write(self, operation: WriteOperation, timeout: Optional[float] = None) -> Any:
+        """Выполнить операцию записи в отдельной транзакции и вернуть ее результат
+
+        Операция не должна сама вызывать commit/rollback: при исключении
+        ее изменения откатываются, а исключение пробрасывается вызывающему.
+
+        :param timeout: Сколько ждать выполнения (сек); по умолчанию acquire_timeout, 0 - без ограничения
+        """
+        if timeout is None:
+            timeout = self.acquire_timeout
+        if self._closed:
+            raise RuntimeError("Пул соединений не открыт")
+
+        if self.wal_enabled:
+            if self._writer_task.done():
+                # Сюда попадаем только после ошибки, которую писатель уже записал в лог
+                logger.critical("Задача записи остановлена, запускаем заново")
+                self._writer_task = asyncio.create_task(self._writer_loop())
+            future = asyncio.get_running_loop().create_future()
+            self._write_queue.put_nowait((operation, future))
+            depth = self._write_queue.qsize()
+            if depth > self._write_metrics['queue_max']:
+                self._write_metrics['queue_max'] = depth
+            try:
+                # По таймауту future отменяется, и писатель пропустит операцию, если еще не начал ее
+                result = await asyncio.wait_for(future, timeout=timeout or None)
+            except asyncio.TimeoutError:
+                self._record_timeout('writer')
+                raise PoolTimeoutError("Очередь записи не выполнила операцию вовремя")
+            return result
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._writer_lock.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._record_timeout('writer')
+            raise PoolTimeoutError("Соединение для записи занято")
+        self._record_wait('writer', started)
+
+        try:
+            await self._writer.execute('BEGIN IMMEDIATE')
+            try:
+                result = await operation(self._writer)
+            except BaseException:
+                await self._writer.rollback()
+                self._write_metrics['failed'] += 1
+                raise
+            await self._commit()
+            self._write_metrics['operations'] += 1
+            return result
+        finally:
+            self._writer_lock.release()
+
+    async def _commit(self):
+        started = time.perf_counter()
+        await self._writer.commit()
+        elapsed = time.perf_counter() - started
+        self._write_metrics['commits'] += 1
+        self._write_metrics['commit_total'] += elapsed
+        if elapsed > self._write_metrics['commit_max']:
+            self._write_metrics['commit_max'] = elapsed
+
+    async def _writer_loop(self):
+        """Единственная задача, которая пишет в базу в режиме wal"""
+        try:
+            await self._serve_writes()
+        except BaseException as e:
+            logger.critical(f"Задача записи завершилась аварийно: {e!r}; следующий write() запустит ее заново")
+            # Ожидающие в очереди не должны висеть до таймаута
+            while not self._write_queue.empty():
+                item = self._write_queue.get_nowait()
+                if item is not None and not item[1].done():
+                    item[1].set_exception(RuntimeError("Задача записи остановлена"))
+            raise
+
+    async def _serve_writes(self):
+        stopping = False
+        while not stopping:
+            item = await self._write_queue.get()
+            batch = []
+            if item is None:
+                stopping = True
+            else:
+                batch.append(item)
+
+            # Забираем то, что уже накопилось, чтобы зафиксировать одним коммитом
+            while len(batch) < self.write_batch_size and not self._write_queue.empty():
+                item = self._write_queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    continue
+                batch.append(item)
+
+            if not batch:
+                continue
+            try:
+                async with self._writer_lock:
+                    await self._run_batch(batch)
+            except BaseException as e:
+                # Писатель не должен умирать: иначе все следующие write() будут ждать до таймаута
+                logger.error(f"Ошибка задачи записи: {e!r}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(_as_write_error(e))
+                if _must_propagate(e):
+                    raise
+
+    async def _run_batch(self, batch):
+        results = []
+        try:
+            await self._writer.execute('BEGIN IMMEDIATE')
+            for operation, future in batch:
+                if future.done():
+                    # Вызывающий уже не ждет (таймаут или отмена)
+                    continue
+                # Каждая операция в своей точке сохранения: ошибка одной не откатывает остальные
+                await self._writer.execute('SAVEPOINT write_op')
+                try:
+                    result = await operation(self._writer)
+                except BaseException as e:
+                    # Отмена внутри операции или KeyboardInterrupt тоже не должны оставить точку сохранения открытой
+                    await self._writer.execute('ROLLBACK TO write_op')
+                    await self._writer.execute('RELEASE write_op')
+                    self._write_metrics['failed'] += 1
+                    if _must_propagate(e):
+                        raise
+                    results.append((future, None, _as_write_error(e)))
+                    continue
+                await self._writer.execute('RELEASE write_op')
+                results.append((future, result, None))
+            await self._commit()
+        except BaseException as e:
+            logger.error(f"Ошибка фиксации пачки записей: {e!r}")
+            try:
+                if self._writer.in_transaction:
+                    await self._writer.rollback()
+            except Exception as rollback_error:
+                logger.error(f"Не удалось откатить пачку записей: {rollback_error}")
+            if _must_propagate(e):
+                raise
+            results = [(future, None, _as_write_error(e)) for _, future in batch]
+
+        for future, result, error in results:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                self._write_metrics['operations'] += 1
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика ожидания соединений"""
+        result = {
+            'size': self.size,
+            'storage_mode': self.storage_mode,
+            'idle_readers': self._idle.qsize() if self._idle else 0,
+        }
+        for kind, metrics in self._metrics.items():
+            acquired = metrics['acquired']
+            result[kind] = {
+                'acquired': int(acquired),
+                'timeouts': int(metrics['timeouts']),
+                'avg_wait_ms': round(metrics['wait_total'] / acquired * 1000, 3) if acquired else 0.0,
+                'max_wait_ms': round(metrics['wait_max'] * 1000, 3),
+            }
+
+        write = self._write_metrics
+        commits = write['commits']
+        result['writes'] = {
+            'queue_depth': self._write_queue.qsize() if self._write_queue else 0,
+            'queue_max': int(write['queue_max']),
+            'operations': int(write['operations']),
+            'failed': int(write['failed']),
+            'commits': int(commits),
+            'avg_commit_ms': round(write['commit_total'] / commits * 1000, 3) if commits else 0.0,
+            'max_commit_ms': round(write['commit_max'] * 1000, 3),
+        }
+        return result
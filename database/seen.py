@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SeenSet:
+    """Компактное множество user_id, которым пользователь уже поставил свайп
+
+    Хранится как отсортированный массив 64-битных целых: ~8 байт на свайп
+    и поиск бинарным поиском.
+    """
+
+    __slots__ = ('_ids',)
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self._ids = array('q', sorted(set(ids)))
+
+    def __contains__(self, user_id: int) -> bool:
+        i = bisect_left(self._ids, user_id)
+        return i < len(self._ids) and self._ids[i] == user_id
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def contains_many(self, user_ids: np.ndarray) -> np.ndarray:
+        """Маска: какие из переданных user_id уже просмотрены"""
+        if not self._ids:
+            return np.zeros(len(user_ids), dtype=bool)
+        ids = np.frombuffer(self._ids, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(ids, user_ids), len(ids) - 1)
+        return ids[positions] == user_ids
+
+    def add(self, user_id: int):
+        if user_id not in self:
+            insort(self._ids, user_id)
+
+    def discard(self, user_id: int):
+        i = bisect_left(self._ids, user_id)
+        if i < len(self._ids) and self._ids[i] == user_id:
+            del self._ids[i]
+
+    @property
+    def nbytes(self) -> int:
+        return self._ids.itemsize * len(self._ids)
+
+
+class SeenSetCache:
+    """LRU-кэш множеств просмотренных анкет по пользователям"""
+
+    def __init__(self, loader: Callable[[int], Awaitable[List[int]]], max_viewers: int = 10000):
+        """
+        :param loader: Корутина, возвращающая to_user_id всех свайпов пользователя
+        :param max_viewers: Максимум пользователей, чьи множества держим в памяти
+        """
+        self._loader = loader
+        self.max_viewers = max(1, max_viewers)
+        self._sets: 'OrderedDict[int, SeenSet]' = OrderedDict()
+        # Свайпы, сделанные пока множество загружается из базы
+        self._loading: Dict[int, List[int]] = {}
+        self._load_tasks: Dict[int, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, viewer_id: int) -> SeenSet:
+        """Множество просмотренных анкет пользователя (загружается при первом обращении)"""
+        seen = self._sets.get(viewer_id)
+        if seen is not None:
+            self._sets.move_to_end(viewer_id)
+            self.hits += 1
+            return seen
+
+        self.misses += 1
+        task = self._load_tasks.get(viewer_id)
+        if task is None:
+            task = asyncio.create_task(self._load(viewer_id))
+            self._load_tasks[viewer_id] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, viewer_id: int) -> SeenSet:
+        self._loading[viewer_id] = []
+        try:
+            seen = SeenSet(await self._loader(viewer_id))
+            for user_id in self._loading[viewer_id]:
+                seen.add(user_id)
+        finally:
+            self._loading.pop(viewer_id, None)
+            self._load_tasks.pop(viewer_id, None)
+
+        self._sets[viewer_id] = seen
+        while len(self._sets) > self.max_viewers:
+            self._sets.popitem(last=False)
+        return seen
+
+    def add(self, viewer_id: int, user_id: int):
+        """Отметить свайп (множество обновляется, только если уже в памяти)"""
+        seen = self._sets.get(viewer_id)
+        if seen is not None:
+            seen.add(user_id)
+        elif viewer_id in self._loading:
+            self._loading[viewer_id].append(user_id)
+
+    def forget_user(self, user_id: int):
+        """Удалить все сведения о пользователе (после удаления его свайпов)"""
+        self._sets.pop(user_id, None)
+        for seen in self._sets.values():
+            seen.discard(user_id)
+
+    def clear(self):
+        self._sets.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'viewers': len(self._sets),
+            'entries': sum(len(seen) for seen in self._sets.values()),
+            'bytes': sum(seen.nbytes for seen in self._sets.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
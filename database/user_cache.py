@@ -0,0 +1,129 @@
+import copy
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from .models import User
+
+
+class UserCache:
+    """LRU-кэш анкет с ограничением по времени жизни
+
+    Хранит объекты ``User`` по user_id. Любая запись в таблицу users должна
+    вызывать ``invalidate``; загрузки анкеты, начатые до ее инвалидации,
+    в кэш не попадают (см. ``token``/``put``). Инвалидация одной анкеты
+    не мешает кэшировать загружаемые в это время другие.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 60.0):
+        """
+        :param max_entries: Максимум анкет в памяти (0 - кэш выключен)
+        :param ttl: Время жизни записи в секундах
+        """
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl
+        self._entries: 'OrderedDict[int, Tuple[float, User]]' = OrderedDict()
+        # Время последней инвалидации анкет (по возрастанию): защищает от записи
+        # устаревших данных. Хранится ttl секунд: загрузки дольше ttl put отклоняет
+        self._invalidated: 'OrderedDict[int, float]' = OrderedDict()
+        self._cleared_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, user_id: int) -> Optional[User]:
+        """Копия анкеты из кэша или None при промахе"""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            expires_at, user = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                # Отдаем копию, чтобы изменения в хендлерах не портили кэш
+                return copy.copy(user)
+            del self._entries[user_id]
+        self.misses += 1
+        return None
+
+    def token(self) -> float:
+        """Отметка, которую нужно получить перед чтением анкеты из базы"""
+        return time.monotonic()
+
+    def put(self, user: User, token: float):
+        """Положить анкету, если с момента получения token она не инвалидировалась"""
+        if not self.enabled or token <= self._cleared_at:
+            return
+        now = time.monotonic()
+        if token + self.ttl <= now:
+            # Инвалидации старше ttl уже забыты - такой загрузке не верим
+            return
+        invalidated_at = self._invalidated.get(user.user_id)
+        if invalidated_at is not None and invalidated_at >= token:
+            return
+        self._entries[user.user_id] = (now + self.ttl, copy.copy(user))
+        self._entries.move_to_end(user.user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *user_ids: int):
+        """Сбросить анкеты после изменения в базе"""
+        self.invalidations += 1
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        for user_id in user_ids:
+            self._entries.pop(user_id, None)
+            self._invalidated[user_id] = now
+            self._invalidated.move_to_end(user_id)
+        # Загрузки старше ttl put все равно отклонит
+        while self._invalidated:
+            user_id, invalidated_at = next(iter(self._invalidated.items()))
+            if invalidated_at + self.ttl > now:
+                break
+            del self._invalidated[user_id]
+
+    def apply_counters(self, last_active: Dict[int, datetime], views: Dict[int, int]):
+        """Перенести записанные счетчики в закэшированные анкеты, не сбрасывая их
+
+        last_active и profile_views могут отставать от базы (отложенная запись),
+        поэтому остальным воркерам об этих изменениях не сообщаем.
+        """
+        for user_id, when in last_active.items():
+            entry = self._entries.get(user_id)
+            if entry is None:
+                continue
+            # В том же виде, в каком значение вернет SELECT
+            stored = when.isoformat(' ')
+            current = entry[1].last_active
+            if isinstance(current, datetime):
+                current = current.isoformat(' ')
+            if current is None or current < stored:
+                entry[1].last_active = stored
+        for user_id, count in views.items():
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry[1].profile_views += count
+
+    def clear(self):
+        self._cleared_at = time.monotonic()
+        self._entries.clear()
+        self._invalidated.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
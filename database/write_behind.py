@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from .pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    """Отложенная запись частых обновлений анкет
+
+    ``last_active`` и ``profile_views`` меняются почти на каждое действие
+    пользователя. Вместо отдельной транзакции на каждое событие изменения
+    накапливаются в памяти и записываются одной транзакцией раз в
+    ``flush_interval`` секунд или после ``max_events`` событий.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        flush_interval: float = 1.0,
+        max_events: int = 500,
+        on_flush: Optional[Callable[..., None]] = None
+    ):
+        """
+        :param pool: Пул соединений, через писателя которого идет запись
+        :param flush_interval: Максимальная задержка записи в секундах
+        :param max_events: Количество событий, после которого запись идет сразу
+        :param on_flush: Вызывается с записанными last_active и просмотрами (обновление кэшей)
+        """
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.max_events = max(1, max_events)
+        self.on_flush = on_flush
+
+        self._last_active: Dict[int, datetime] = {}
+        self._views: Dict[int, int] = {}
+        self._events = 0
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self._metrics: Dict[str, float] = {
+            'events': 0, 'flushes': 0, 'rows': 0, 'failed': 0,
+            'flush_total': 0.0, 'flush_max': 0.0,
+        }
+
+    def start(self):
+        """Запустить фоновую запись"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Остановить фоновую запись и сохранить все накопленное"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def touch(self, user_id: int, when: datetime = None):
+        """Отметить активность пользователя"""
+        self._last_active[user_id] = when or datetime.now()
+        self._record_event()
+
+    def add_views(self, user_id: int, count: int = 1):
+        """Добавить просмотры анкеты"""
+        self._views[user_id] = self._views.get(user_id, 0) + count
+        self._record_event()
+
+    def forget_user(self, user_id: int):
+        """Отбросить накопленное для пользователя (например, после удаления анкеты)"""
+        self._last_active.pop(user_id, None)
+        self._views.pop(user_id, None)
+
+    def _record_event(self):
+        self._events += 1
+        self._metrics['events'] += 1
+        if self._events >= self.max_events:
+            self._wakeup.set()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {e}")
+
+    async def flush(self) -> int:
+        """Записать накопленные изменения одной транзакцией"""
+        async with self._flush_lock:
+            if not self._last_active and not self._views:
+                return 0
+
+            # Новые события копятся в свежих словарях, пока идет запись
+            last_active, self._last_active = self._last_active, {}
+            views, self._views = self._views, {}
+            self._events = 0
+
+            async def _flush(db):
+                if last_active:
+                    # Не откатываем время назад, если запись пришла с опозданием
+                    await db.executemany(
+                        'UPDATE users SET last_active = ? WHERE user_id = ? '
+                        'AND (last_active IS NULL OR last_active < ?)',
+                        [(when, user_id, when) for user_id, when in last_active.items()]
+                    )
+                if views:
+                    await db.executemany(
+                        'UPDATE users SET profile_views = profile_views + ? WHERE user_id = ?',
+                        [(count, user_id) for user_id, count in views.items()]
+                    )
+
+            started = time.perf_counter()
+            try:
+                await self.pool.write(_flush)
+            except Exception:
+                self._metrics['failed'] += 1
+                self._restore(last_active, views)
+                raise
+
+            elapsed = time.perf_counter() - started
+            rows = len(last_active) + len(views)
+            self._metrics['flushes'] += 1
+            self._metrics['rows'] += rows
+            self._metrics['flush_total'] += elapsed
+            self._metrics['flush_max'] = max(self._metrics['flush_max'], elapsed)
+
+            if self.on_flush:
+                self.on_flush(last_active, views)
+            return rows
+
+    def _restore(self, last_active: Dict[int, datetime], views: Dict[int, int]):
+        """Вернуть незаписанные изменения в буфер для следующей попытки"""
+        for user_id, when in last_active.items():
+            current = self._last_active.get(user_id)
+            if current is None or current < when:
+                self._last_active[user_id] = when
+        for user_id, count in views.items():
+            self._views[user_id] = self._views.get(user_id, 0) + count
+
+    def stats(self) -> Dict[str, float]:
+        flushes = self._metrics['flushes']
+        return {
+            'pending_last_active': len(self._last_active),
+            'pending_views': len(self._views),
+            'events': self._metrics['events'],
+            'flushes': flushes,
+            'rows': self._metrics['rows'],
+            'failed': self._metrics['failed'],
+            'avg_flush_ms': round(self._metrics['flush_total'] / flushes * 1000, 3) if flushes else 0.0,
+            'max_flush_ms': round(self._metrics['flush_max'] * 1000, 3),
+        }
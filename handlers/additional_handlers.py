@@ -13,6 +13,7 @@ from utils.keyboards import (
 from handlers.profile import ProfileStates
 from utils.face_detection import validate_profile_photo
 from utils.message_utils import safe_edit_message, safe_answer_message
+from middlewares import COST_PHOTO
 import logging
 
 logger = logging.getLogger(__name__)
@@ -126,7 +127,7 @@ async def add_photo_handler(callback: CallbackQuery, state: FSMContext, db: Data
     )
     await state.set_state(PhotoStates.adding_photo)
 
-@router.message(PhotoStates.adding_photo, F.photo)
+@router.message(PhotoStates.adding_photo, F.photo, flags={"throttling_cost": COST_PHOTO})
 async def process_add_photo(message: Message, state: FSMContext, db: Database):
     """Обработка добавления нового фото в существующий профиль"""
     user_id = message.from_user.id
@@ -151,7 +152,9 @@ async def process_add_photo(message: Message, state: FSMContext, db: Database):
     is_valid, validation_message = await validate_profile_photo(
         bot=message.bot,
         file_id=photo.file_id,
-        is_main_photo=False  # Дополнительное фото, менее строгие требования
+        is_main_photo=False,  # Дополнительное фото, менее строгие требования
+        file_unique_id=photo.file_unique_id,
+        db=db
     )
     
     # Удаляем сообщение о проверке
@@ -3,13 +3,14 @@ from aiogram.types import CallbackQuery, Message, InputMediaPhoto
 from database import Database
 from utils.keyboards import get_main_menu_keyboard, get_like_response_keyboard
 from utils.message_utils import safe_edit_message, safe_answer_message
+from middlewares import COST_SEARCH
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = Router()
 
-@router.callback_query(F.data == "my_chats")
+@router.callback_query(F.data == "my_chats", flags={"throttling_cost": COST_SEARCH})
 async def show_incoming_likes(callback: CallbackQuery, db: Database):
     """Показать входящие лайки для просмотра"""
     await callback.answer()
@@ -81,7 +82,7 @@ async def show_like_profile(message, db: Database, user_id: int, like_index: int
         # Без фото
         await safe_edit_message(message, text=profile_text, reply_markup=keyboard)
 
-@router.callback_query(F.data.regexp(r"^like_response_(like|dislike)_\d+_\d+$"))
+@router.callback_query(F.data.regexp(r"^like_response_(like|dislike)_\d+_\d+$"), flags={"throttling_cost": COST_SEARCH})
 async def handle_like_response(callback: CallbackQuery, db: Database):
     """Обработка ответа на лайк"""
     await callback.answer()
@@ -131,18 +132,15 @@ async def handle_like_response(callback: CallbackQuery, db: Database):
                 f"• Начинай диалог! 💕"
             )
             
-            # Отправляем уведомление второму пользователю через бота
-            from aiogram import Bot
-            from config import Config
-            bot = Bot(token=Config.BOT_TOKEN)
-            await bot.send_message(
-                chat_id=liked_user_id,
-                text=match_text_for_liked_user,
+            # Уведомление второму пользователю уйдет из очереди в фоне
+            await db.queue_notification(
+                liked_user_id,
+                match_text_for_liked_user,
                 parse_mode="HTML",
                 disable_web_page_preview=True
             )
         except Exception as e:
-            logger.error(f"Failed to send match notification to user {liked_user_id}: {e}")
+            logger.error(f"Failed to queue match notification for user {liked_user_id}: {e}")
         
         await callback.message.answer(
             match_text,
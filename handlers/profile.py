@@ -20,9 +20,10 @@ from utils.validators import *
 from utils.ai_helper import ai_helper
 from utils.message_utils import safe_edit_message, safe_answer_message
 from utils.face_detection import validate_profile_photo
+from utils.geocoder import reverse_geocoder
+from middlewares import COST_AI, COST_PHOTO
 from config import Config
 import logging
-import aiohttp
 import json
 
 logger = logging.getLogger(__name__)
@@ -168,7 +169,7 @@ async def process_location_input(message: Message, state: FSMContext, db: Databa
         lon = message.location.longitude
         
         # Получаем город по координатам
-        city = await get_city_from_coordinates(lat, lon)
+        city = await reverse_geocoder.city_name(lat, lon)
         
         # Сохраняем в базу данных
         user_id = message.from_user.id
@@ -209,7 +210,7 @@ async def process_location_input(message: Message, state: FSMContext, db: Databa
             reply_markup=get_location_keyboard()
         )
 
-@router.message(ProfileStates.waiting_for_bio)
+@router.message(ProfileStates.waiting_for_bio, flags={"throttling_cost": COST_AI})
 async def process_bio_input(message: Message, state: FSMContext, db: Database):
     """Обработка ввода описания"""
     bio = message.text.strip()
@@ -248,32 +249,6 @@ async def process_bio_input(message: Message, state: FSMContext, db: Database):
         reply_markup=get_back_to_menu_keyboard()
     )
 
-async def get_city_from_coordinates(lat: float, lon: float) -> str:
-    """Получить название города по координатам через OpenStreetMap Nominatim API"""
-    try:
-        url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lon}&zoom=10&addressdetails=1"
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers={'User-Agent': 'Meet Bot'}) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    # Извлекаем город из ответа
-                    address = data.get('address', {})
-                    city = (address.get('city') or 
-                           address.get('town') or 
-                           address.get('village') or 
-                           address.get('municipality') or
-                           address.get('county') or
-                           'Неизвестный город')
-                    
-                    return city
-                else:
-                    return "Неизвестный город"
-    except Exception as e:
-        logger.error(f"Ошибка при получении города: {e}")
-        return "Неизвестный город"
-
 async def finalize_profile_creation(message, state: FSMContext, db: Database, user_id: int = None):
     """Завершить создание профиля"""
     # Определяем user_id
@@ -397,7 +372,7 @@ async def show_my_profile(callback: CallbackQuery, db: Database):
     user_id = callback.from_user.id
     await show_user_profile(callback.message, db, user_id, is_own=True, edit_message=True)
 
-@router.message(ProfileStates.waiting_for_photo, F.photo)
+@router.message(ProfileStates.waiting_for_photo, F.photo, flags={"throttling_cost": COST_PHOTO})
 async def process_photo_input(message: Message, state: FSMContext, db: Database):
     """Обработка добавления фото"""
     user_id = message.from_user.id
@@ -429,7 +404,9 @@ async def process_photo_input(message: Message, state: FSMContext, db: Database)
     is_valid, validation_message = await validate_profile_photo(
         bot=message.bot,
         file_id=photo.file_id,
-        is_main_photo=is_main
+        is_main_photo=is_main,
+        file_unique_id=photo.file_unique_id,
+        db=db
     )
     
     # Удаляем сообщение о проверке
@@ -12,8 +12,9 @@ from utils.keyboards import (
 from utils.validators import validate_name, validate_age, validate_bio
 from utils.ai_helper import ai_helper
 from utils.profile_utils import is_profile_complete
+from utils.geocoder import reverse_geocoder
+from middlewares import COST_AI
 import logging
-import aiohttp
 import json
 
 logger = logging.getLogger(__name__)
@@ -360,32 +361,6 @@ async def ask_for_city(message, state: FSMContext, db: Database, user_id: int =
             reply_markup=get_location_keyboard()
         )
 
-async def get_city_from_coordinates(lat: float, lon: float) -> str:
-    """Получить название города по координатам через OpenStreetMap Nominatim API"""
-    try:
-        url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lon}&zoom=10&addressdetails=1"
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers={'User-Agent': 'Meet Bot'}) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    # Извлекаем город из ответа
-                    address = data.get('address', {})
-                    city = (address.get('city') or 
-                           address.get('town') or 
-                           address.get('village') or 
-                           address.get('municipality') or
-                           address.get('county') or
-                           'Неизвестный город')
-                    
-                    return city
-                else:
-                    return "Неизвестный город"
-    except Exception as e:
-        logger.error(f"Ошибка при получении города: {e}")
-        return "Неизвестный город"
-
 @router.message(ProfileEditStates.editing_city)
 async def process_city_edit(message: Message, state: FSMContext, db: Database):
     """Обработка геолокации или текста для города"""
@@ -395,7 +370,7 @@ async def process_city_edit(message: Message, state: FSMContext, db: Database):
         lon = message.location.longitude
         
         # Получаем город по координатам
-        city = await get_city_from_coordinates(lat, lon)
+        city = await reverse_geocoder.city_name(lat, lon)
         
         # Сохраняем в state и в базу данных
         await state.update_data(
@@ -468,7 +443,7 @@ async def ask_for_bio(message, state: FSMContext, db: Database, user_id: int = N
             reply_markup=get_skip_or_keep_keyboard("bio", has_bio)
         )
 
-@router.message(ProfileEditStates.editing_bio)
+@router.message(ProfileEditStates.editing_bio, flags={"throttling_cost": COST_AI})
 async def process_bio_edit(message: Message, state: FSMContext, db: Database):
     """Обработка описания"""
     bio = message.text.strip()
@@ -646,7 +621,7 @@ async def finalize_profile_edit(message, state: FSMContext, db: Database):
             reply_markup=get_back_to_profile_keyboard()
         )
 
-@router.callback_query(F.data == "improve_with_ai")
+@router.callback_query(F.data == "improve_with_ai", flags={"throttling_cost": COST_AI})
 async def improve_profile_with_ai(callback: CallbackQuery, db: Database):
     """Улучшить анкету с помощью AI"""
     await callback.answer("🤖 Анализирую твою анкету...")
@@ -2,7 +2,6 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
-import aiosqlite
 from database import Database
 from utils.keyboards import (
     get_main_menu_keyboard, 
@@ -259,43 +258,14 @@ async def show_global_statistics(callback: CallbackQuery, db: Database):
     """Показать общую статистику бота"""
     await callback.answer()
     
-    async with aiosqlite.connect(db.db_path) as database:
-        database.row_factory = aiosqlite.Row
-        
-        # Общее количество пользователей
-        cursor = await database.execute('SELECT COUNT(*) as total_users FROM users')
-        total_users = (await cursor.fetchone())['total_users']
-        
-        # Активные пользователи (заходили за последнюю неделю)
-        cursor = await database.execute(
-            "SELECT COUNT(*) as active_users FROM users WHERE last_active >= datetime('now', '-7 days')"
-        )
-        active_users = (await cursor.fetchone())['active_users']
-        
-        # Пользователи с полными анкетами
-        cursor = await database.execute(
-            'SELECT COUNT(*) as complete_profiles FROM users WHERE name IS NOT NULL AND age IS NOT NULL AND gender IS NOT NULL'
-        )
-        complete_profiles = (await cursor.fetchone())['complete_profiles']
-        
-        # Общее количество лайков
-        cursor = await database.execute('SELECT COUNT(*) as total_likes FROM swipes WHERE is_like = 1')
-        total_likes = (await cursor.fetchone())['total_likes']
-        
-        # Общее количество матчей
-        cursor = await database.execute('SELECT COUNT(*) as total_matches FROM matches')
-        total_matches = (await cursor.fetchone())['total_matches']
-        
-        # Средний возраст пользователей
-        cursor = await database.execute('SELECT AVG(age) as avg_age FROM users WHERE age IS NOT NULL')
-        avg_age_result = await cursor.fetchone()
-        avg_age = round(avg_age_result['avg_age'], 1) if avg_age_result['avg_age'] else 0
-        
-        # Активность сегодня
-        cursor = await database.execute(
-            "SELECT COUNT(*) as today_likes FROM swipes WHERE is_like = 1 AND date(created_at) = date('now')"
-        )
-        today_likes = (await cursor.fetchone())['today_likes']
+    stats = await db.get_global_statistics()
+    total_users = stats['total_users']
+    active_users = stats['active_users']
+    complete_profiles = stats['complete_profiles']
+    total_likes = stats['total_likes']
+    total_matches = stats['total_matches']
+    avg_age = stats['avg_age']
+    today_likes = stats['today_likes']
     
     # Процент успешности (матчи от лайков)
     match_rate = round((total_matches / total_likes * 100), 1) if total_likes > 0 else 0
@@ -3,15 +3,16 @@ from aiogram.types import CallbackQuery
 from database import Database
 from handlers.profile import show_user_profile
 from utils.keyboards import get_swipe_keyboard, get_main_menu_keyboard
-from utils.ai_helper import ai_helper
+from utils.conversation_starters import conversation_starters
 from utils.message_utils import safe_edit_message, safe_answer_message
+from middlewares import COST_SEARCH
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = Router()
 
-@router.callback_query(F.data == "start_swiping")
+@router.callback_query(F.data == "start_swiping", flags={"throttling_cost": COST_SEARCH})
 async def start_swiping(callback: CallbackQuery, db: Database):
     """Начать просмотр анкет"""
     await callback.answer()
@@ -40,11 +41,10 @@ async def show_next_profile(message, db: Database, user_id: int, exclude_user_id
     current_user = await db.get_user(user_id)
     logger.info(f"User {user_id} searching for profiles: gender={current_user.gender}, looking_for={current_user.looking_for}")
     
-    # Получаем анкеты для просмотра
-    potential_matches = await db.get_users_for_swipe(user_id, limit=10, exclude_user_id=exclude_user_id)
-    logger.info(f"Found {len(potential_matches)} potential matches for user {user_id}")
+    # Берем следующую анкету из колоды кандидатов
+    candidate = await db.decks.next_candidate(user_id, exclude_user_id=exclude_user_id)
     
-    if not potential_matches:
+    if not candidate:
         # Проверим, есть ли вообще пользователи в базе (для отладки)
         all_users = await db.get_all_users_debug()
         logger.info(f"Total users in database: {len(all_users)}")
@@ -62,18 +62,13 @@ async def show_next_profile(message, db: Database, user_id: int, exclude_user_id
         )
         return
     
-    candidate = potential_matches[0]
-    
     # Увеличиваем счетчик просмотров анкеты
-    await db.create_or_update_user(
-        candidate.user_id,
-        profile_views=candidate.profile_views + 1
-    )
+    await db.increment_profile_views(candidate.user_id)
     
     # Показываем анкету
     await show_user_profile(message, db, candidate.user_id, is_own=False, edit_message=True, for_swipe=True)
 
-@router.callback_query(F.data.regexp(r"^like_\d+$"))
+@router.callback_query(F.data.regexp(r"^like_\d+$"), flags={"throttling_cost": COST_SEARCH})
 async def process_like(callback: CallbackQuery, db: Database):
     """Обработка лайка"""
     await callback.answer("❤️")
@@ -84,18 +79,15 @@ async def process_like(callback: CallbackQuery, db: Database):
     # Создаем свайп и проверяем на матч
     is_match = await db.create_swipe(user_id, target_user_id, is_like=True)
     
-    # Отправляем уведомление о лайке (только если это не матч)
+    # Ставим в очередь уведомление о лайке (только если это не матч)
     if not is_match:
         try:
-            from aiogram import Bot
-            from config import Config
-            bot = Bot(token=Config.BOT_TOKEN)
-            await db.send_like_notification(target_user_id, bot)
+            await db.queue_like_notification(target_user_id)
         except Exception as e:
-            logger.error(f"Failed to send like notification: {e}")
+            logger.error(f"Failed to queue like notification: {e}")
     
     if is_match:
-        # Получаем данные пользователей для генерации стартера разговора
+        # Получаем данные пользователей
         user = await db.get_user(user_id)
         target_user = await db.get_user(target_user_id)
         
@@ -112,25 +104,6 @@ async def process_like(callback: CallbackQuery, db: Database):
             f"• Или перейди к профилю: <a href='{target_user_link}'>@{target_user.name}</a>"
         )
         
-        # Генерируем стартер разговора с AI
-        if user and target_user:
-            user_data = {
-                'name': user.name,
-                'age': user.age,
-                'city': user.city,
-                'bio': user.bio
-            }
-            target_data = {
-                'name': target_user.name,
-                'age': target_user.age,
-                'city': target_user.city,
-                'bio': target_user.bio
-            }
-            
-            conversation_starter = await ai_helper.generate_conversation_starter(user_data, target_data)
-            if conversation_starter:
-                match_text += f"\n\n💡 <b>Идея для начала разговора:</b>\n<i>{conversation_starter}</i>"
-        
         # Также отправляем уведомление второму пользователю
         try:
             match_text_for_target = (
@@ -141,21 +114,19 @@ async def process_like(callback: CallbackQuery, db: Database):
                 f"• Или перейди к профилю: <a href='{current_user_link}'>@{user.name}</a>"
             )
             
-            if conversation_starter:
-                match_text_for_target += f"\n\n💡 <b>Идея для начала разговора:</b>\n<i>{conversation_starter}</i>"
-            
-            # Отправляем уведомление второму пользователю через бота
-            from aiogram import Bot
-            from config import Config
-            bot = Bot(token=Config.BOT_TOKEN)
-            await bot.send_message(
-                chat_id=target_user_id,
-                text=match_text_for_target,
+            # Уведомление второму пользователю уйдет из очереди в фоне
+            await db.queue_notification(
+                target_user_id,
+                match_text_for_target,
                 parse_mode="HTML",
                 disable_web_page_preview=True
             )
         except Exception as e:
-            logger.error(f"Failed to send match notification to user {target_user_id}: {e}")
+            logger.error(f"Failed to queue match notification for user {target_user_id}: {e}")
+        
+        # Идею для начала разговора AI сгенерирует в фоне и пришлет обоим отдельным сообщением
+        if user and target_user:
+            conversation_starters.schedule(db, user, target_user)
         
         from utils.keyboards import get_back_to_menu_keyboard
         await safe_edit_message(
@@ -167,7 +138,7 @@ async def process_like(callback: CallbackQuery, db: Database):
         # Показываем следующую анкету
         await show_next_profile(callback.message, db, user_id)
 
-@router.callback_query(F.data.regexp(r"^dislike_\d+$"))
+@router.callback_query(F.data.regexp(r"^dislike_\d+$"), flags={"throttling_cost": COST_SEARCH})
 async def process_dislike(callback: CallbackQuery, db: Database):
     """Обработка дизлайка"""
     await callback.answer("👎")
@@ -181,7 +152,7 @@ async def process_dislike(callback: CallbackQuery, db: Database):
     # Показываем следующую анкету
     await show_next_profile(callback.message, db, user_id)
 
-@router.callback_query(F.data.regexp(r"^next_profile_\d+$"))
+@router.callback_query(F.data.regexp(r"^next_profile_\d+$"), flags={"throttling_cost": COST_SEARCH})
 async def show_next_profile_callback(callback: CallbackQuery, db: Database):
     """Показать следующую анкету через кнопку (без сохранения как дислайк)"""
     await callback.answer("⏭️")
@@ -22,6 +22,8 @@ async def init_database():
     if Config.DEBUG:
         print("🧪 Режим отладки: добавляем тестовые данные...")
         await create_test_data(db)
+    
+    await db.close()
 
 async def create_test_data(db: Database):
     """Создание тестовых данных для разработки"""
@@ -1,3 +1,3 @@
-from .throttling import ThrottlingMiddleware
+from .throttling import ThrottlingMiddleware, COST_DEFAULT, COST_SEARCH, COST_PHOTO, COST_AI
 
-__all__ = ['ThrottlingMiddleware']
+__all__ = ['ThrottlingMiddleware', 'COST_DEFAULT', 'COST_SEARCH', 'COST_PHOTO', 'COST_AI']
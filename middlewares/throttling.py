@@ -1,22 +1,134 @@
-from typing import Callable, Dict, Any, Awaitable
+from typing import Callable, Dict, Any, Awaitable, Optional
 from aiogram import BaseMiddleware
-from aiogram.types import TelegramObject
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import TelegramObject, CallbackQuery
 import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Стоимость хендлера в токенах, задается флагом:
+#   @router.callback_query(F.data == "...", flags={"throttling_cost": COST_AI})
+COST_DEFAULT = 1  # Меню, навигация
+COST_SEARCH = 2   # Свайпы и выдача анкет
+COST_PHOTO = 2    # Загрузка фото с детекцией лиц (альбом из 5 фото укладывается в burst)
+COST_AI = 5       # Запросы к OpenAI
+
+class TokenBucketLimiter:
+    """Token bucket для множества ключей (user_id)
+
+    Реализован как GCRA: на ключ хранится одно число - "теоретическое время
+    прибытия" (TAT) следующего события. Это эквивалентно ведру на ``burst``
+    токенов, пополняемому со скоростью ``rate`` в секунду, но без отдельного
+    счетчика токенов и времени последнего пополнения.
+
+    Ключ с TAT в прошлом соответствует полному ведру, поэтому его можно
+    удалить без изменения поведения. Ключи живут в двух поколениях:
+    раз в ``rotate_interval`` секунд старое поколение выбрасывается целиком,
+    а ключи, к которым обращались, переезжают в новое. Память пропорциональна
+    числу пользователей, активных за последние два интервала, а вытеснение
+    не требует обхода словаря.
+    """
+
+    def __init__(self, rate: float, burst: int, idle_ttl: float = 60.0):
+        """
+        :param rate: Сколько событий в секунду восстанавливается (0 - без ограничения)
+        :param burst: Сколько событий подряд можно без ожидания
+        :param idle_ttl: Через сколько секунд без событий ключ может быть забыт
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        # Насколько TAT может опережать текущее время (ведро пусто)
+        self.tolerance = (self.burst - 1) * self.interval
+        # Старое поколение можно выбросить, только если все его ключи уже с полным ведром
+        self.rotate_interval = max(idle_ttl, self.tolerance + self.interval)
+        self._current: Dict[int, float] = {}
+        self._previous: Dict[int, float] = {}
+        self._next_rotation: Optional[float] = None
+
+    def hit(self, key: int, now: Optional[float] = None, cost: int = 1) -> bool:
+        """Учесть событие стоимостью ``cost`` токенов; False - лимит превышен"""
+        if self.rate <= 0:
+            return True
+        if now is None:
+            now = time.monotonic()
+        if self._next_rotation is None:
+            self._next_rotation = now + self.rotate_interval
+        elif now >= self._next_rotation:
+            self._rotate(now)
+
+        tat = self._current.get(key)
+        if tat is None:
+            tat = self._previous.pop(key, now)
+        if tat < now:
+            tat = now
+
+        # Дороже целого ведра событие не может быть, иначе оно не пройдет никогда
+        consumed = min(max(1, cost), self.burst) * self.interval
+        if tat + consumed - now > self.tolerance + self.interval:
+            # Отказ не тратит токены; ключ остается в текущем поколении
+            self._current[key] = tat
+            return False
+
+        self._current[key] = tat + consumed
+        return True
+
+    def retry_after(self, key: int, now: Optional[float] = None) -> float:
+        """Через сколько секунд у ключа появится токен"""
+        if now is None:
+            now = time.monotonic()
+        tat = self._current.get(key, self._previous.get(key, now))
+        return max(0.0, tat - self.tolerance - now)
+
+    def _rotate(self, now: float):
+        if now >= self._next_rotation + self.rotate_interval:
+            # Событий не было дольше двух интервалов - все ведра полные
+            self._previous = {}
+        else:
+            self._previous = self._current
+        self._current = {}
+        self._next_rotation = now + self.rotate_interval
+
+    def __len__(self) -> int:
+        return len(self._current) + len(self._previous)
+
 class ThrottlingMiddleware(BaseMiddleware):
-    """Middleware для защиты от спама"""
-    
-    def __init__(self, rate_limit: float = 1.0):
+    """Middleware для защиты от спама
+
+    Отдельные token bucket для сообщений и нажатий кнопок: можно отправить
+    подряд ``burst`` событий (например, альбом фото), дальше они
+    пропускаются со скоростью ``rate`` в секунду. Хендлер может объявить
+    стоимость флагом ``throttling_cost`` - дорогие операции (AI, фото,
+    поиск) расходуют ведро быстрее.
+
+    Регистрируется как внутренний middleware (``dp.message.middleware``),
+    чтобы хендлер и его флаги уже были известны; события, для которых
+    хендлер не нашелся, не учитываются.
+    """
+
+    def __init__(
+        self,
+        message_rate: float = 1.0,
+        message_burst: int = 10,
+        callback_rate: float = 2.0,
+        callback_burst: int = 5,
+        idle_ttl: float = 60.0
+    ):
         """
-        :param rate_limit: Минимальный интервал между сообщениями в секундах
+        :param message_rate: Сообщений в секунду в среднем
+        :param message_burst: Сообщений подряд без ограничения (альбом - до 10 фото)
+        :param callback_rate: Нажатий кнопок в секунду в среднем
+        :param callback_burst: Нажатий подряд без ограничения
+        :param idle_ttl: Через сколько секунд неактивности пользователь забывается
         """
         super().__init__()
-        self.rate_limit = rate_limit
-        self.last_message_time: Dict[int, float] = {}
-    
+        self.messages = TokenBucketLimiter(message_rate, message_burst, idle_ttl)
+        self.callbacks = TokenBucketLimiter(callback_rate, callback_burst, idle_ttl)
+        self.passed = 0
+        # Отклоненные события по хендлерам
+        self.rejected: Dict[str, int] = {}
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
@@ -24,30 +136,45 @@ class ThrottlingMiddleware(BaseMiddleware):
         data: Dict[str, Any]
     ) -> Any:
         """Основная логика middleware"""
-        
+
         # Получаем user_id из события
-        user_id = None
-        if hasattr(event, 'from_user') and event.from_user:
-            user_id = event.from_user.id
-        
-        if user_id:
-            current_time = time.time()
-            last_time = self.last_message_time.get(user_id, 0)
-            
-            # Проверяем, не превышен ли лимит
-            if current_time - last_time < self.rate_limit:
-                logger.warning(f"Throttling user {user_id}")
-                
-                # Если это callback query, отвечаем с уведомлением
-                if hasattr(event, 'answer'):
-                    await event.answer(
-                        "⏳ Слишком быстро! Подожди немного.",
-                        show_alert=True
-                    )
-                return
-            
-            # Обновляем время последнего сообщения
-            self.last_message_time[user_id] = current_time
-        
+        user = getattr(event, 'from_user', None)
+        if user is None:
+            return await handler(event, data)
+
+        is_callback = isinstance(event, CallbackQuery)
+        limiter = self.callbacks if is_callback else self.messages
+        cost = get_flag(data, 'throttling_cost', default=COST_DEFAULT)
+        if not limiter.hit(user.id, cost=cost):
+            name = self._handler_name(data)
+            self.rejected[name] = self.rejected.get(name, 0) + 1
+            logger.debug(f"Throttling user {user.id} on {name} (cost {cost})")
+
+            # На нажатие кнопки нужно ответить, иначе у пользователя крутятся "часики"
+            if is_callback:
+                await event.answer(
+                    "⏳ Слишком быстро! Подожди немного.",
+                    show_alert=True
+                )
+            return
+
         # Продолжаем обработку
+        self.passed += 1
         return await handler(event, data)
+
+    @staticmethod
+    def _handler_name(data: Dict[str, Any]) -> str:
+        handler_object = data.get('handler')
+        callback = getattr(handler_object, 'callback', None)
+        if callback is None:
+            return 'unknown'
+        module = callback.__module__.rsplit('.', 1)[-1]
+        return f"{module}.{callback.__name__}"
+
+    def stats(self) -> Dict[str, Any]:
+        """Пропущенные и отклоненные события, число отслеживаемых пользователей"""
+        return {
+            'passed': self.passed,
+            'rejected': dict(sorted(self.rejected.items(), key=lambda item: -item[1])),
+            'tracked_users': len(self.messages) + len(self.callbacks),
+        }
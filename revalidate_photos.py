@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Пакетная повторная проверка фотографий (например, после ужесточения правил)
+
+Режимы:
+    python revalidate_photos.py                      # все фото из user_photos
+    python revalidate_photos.py --reset              # начать заново, а не с сохраненной позиции
+    python revalidate_photos.py --paths DIR [DIR...] --output results.jsonl
+
+Фото из базы скачиваются по file_id, результаты сразу записываются в
+photo_checks, а позиция - в backfill_checkpoints: прерванный запуск
+продолжится с места остановки. Фото, которые не удалось проверить
+(например, ошибка скачивания), попадают в backfill_retries и проверяются
+первыми при следующем запуске, но не больше MAX_ATTEMPTS раз. Для локальных файлов результаты пишутся
+в JSONL, уже обработанные файлы при повторном запуске пропускаются.
+
+Работающий бот держит результаты проверок в памяти; новые значения он
+увидит после перезапуска.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+# Добавляем текущую директорию в Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from database import Database
+from utils.bot_factory import create_bot
+from utils.face_detection import (
+    analyze_photos_batch,
+    face_engine,
+    photo_downloader,
+    photo_verdict,
+)
+
+CHECKPOINT_NAME = 'revalidate_photos'
+CHECKPOINT_EVERY = 50
+PAGE_SIZE = 500
+MAX_ATTEMPTS = 3
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+class Progress:
+    """Счетчик обработанных фото и скорости"""
+
+    def __init__(self, report_every: float = 5.0):
+        self.started = time.perf_counter()
+        self.last_report = self.started
+        self.report_every = report_every
+        self.done = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def add(self, error: str = None, rejected: bool = False):
+        self.done += 1
+        self.failed += error is not None
+        self.rejected += rejected
+        now = time.perf_counter()
+        if now - self.last_report >= self.report_every:
+            self.last_report = now
+            print(f"⏳ Обработано: {self.done}, {self.rate():.1f} фото/с")
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.done / elapsed if elapsed else 0.0
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        print(
+            f"✅ Готово: {self.done} фото за {elapsed:.1f} с ({self.rate():.1f} фото/с), "
+            f"не прошли проверку: {self.rejected}, ошибок: {self.failed}"
+        )
+
+
+class Watermark:
+    """Позиция, до которой (включительно) все фото уже обработаны
+
+    Результаты приходят не по порядку, поэтому сохранять можно только
+    наименьший photo_id, перед которым не осталось незавершенных.
+    """
+
+    def __init__(self, position: int):
+        self.position = position
+        self._issued = []
+        self._completed = set()
+
+    def issue(self, photo_id: int):
+        self._issued.append(photo_id)
+
+    def complete(self, photo_id: int):
+        self._completed.add(photo_id)
+        while self._issued and self._issued[0] in self._completed:
+            self._completed.discard(self._issued[0])
+            self.position = self._issued.pop(0)
+
+
+async def revalidate_database(db: Database, concurrency: int, limit: int, reset: bool):
+    if not Config.BOT_TOKEN:
+        print("❌ Для скачивания фото нужен BOT_TOKEN")
+        return
+
+    if reset:
+        await db.delete_backfill_retries(CHECKPOINT_NAME)
+    position = 0 if reset else await db.get_backfill_checkpoint(CHECKPOINT_NAME)
+    retry_ids = await db.get_backfill_retries(CHECKPOINT_NAME, MAX_ATTEMPTS)
+    print(f"🗂️ Проверка фото из базы, начиная с photo_id > {position}, повторно: {len(retry_ids)}")
+
+    bot = create_bot(Config.BOT_TOKEN, pool_size=concurrency, api_url=Config.TELEGRAM_API_URL or None)
+    watermark = Watermark(position)
+    photos = {}
+    retries = set()
+
+    async def items():
+        issued = 0
+        # Сначала фото, которые не удалось проверить в прошлые запуски (они уже за позицией)
+        retry_photos = await db.get_photos_by_ids(retry_ids)
+        missing = set(retry_ids) - {photo.photo_id for photo in retry_photos}
+        if missing:
+            await db.delete_backfill_retries(CHECKPOINT_NAME, list(missing))
+        for photo in retry_photos:
+            if limit and issued >= limit:
+                return
+            photos[photo.photo_id] = photo
+            retries.add(photo.photo_id)
+            issued += 1
+            yield photo.photo_id, photo.file_id
+
+        after = position
+        while True:
+            page = await db.get_photos_after(after, PAGE_SIZE)
+            for photo in page:
+                if limit and issued >= limit:
+                    return
+                photos[photo.photo_id] = photo
+                watermark.issue(photo.photo_id)
+                issued += 1
+                yield photo.photo_id, photo.file_id
+            if len(page) < PAGE_SIZE:
+                return
+            after = page[-1].photo_id
+
+    progress = Progress()
+    try:
+        async for photo_id, check, error in analyze_photos_batch(items(), bot=bot, concurrency=concurrency):
+            photo = photos.pop(photo_id)
+            rejected = False
+            if check is not None:
+                await db.save_photo_check(photo.file_unique_id, check.face_count, check.basic_valid)
+                is_valid, message = photo_verdict(check, is_main_photo=photo.is_main)
+                if not is_valid:
+                    rejected = True
+                    print(f"⚠️ photo_id={photo_id} user_id={photo.user_id}: {message}")
+                if photo_id in retries:
+                    await db.delete_backfill_retries(CHECKPOINT_NAME, [photo_id])
+            else:
+                print(f"❌ photo_id={photo_id} user_id={photo.user_id}: {error}")
+                # Позиция уйдет дальше, а фото проверим при следующем запуске
+                await db.save_backfill_retry(CHECKPOINT_NAME, photo_id, error)
+
+            if photo_id not in retries:
+                watermark.complete(photo_id)
+            progress.add(error, rejected)
+            if progress.done % CHECKPOINT_EVERY == 0:
+                await db.save_backfill_checkpoint(CHECKPOINT_NAME, watermark.position)
+    finally:
+        await db.save_backfill_checkpoint(CHECKPOINT_NAME, watermark.position)
+        await bot.session.close()
+        progress.summary()
+        print(f"📍 Сохраненная позиция: photo_id {watermark.position}")
+
+
+async def revalidate_paths(paths, output: str, concurrency: int, limit: int):
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob('*') if p.suffix.lower() in EXTENSIONS))
+        else:
+            files.append(path)
+
+    # Уже обработанные файлы берем из существующего вывода
+    processed = set()
+    if os.path.exists(output):
+        with open(output, encoding='utf-8') as f:
+            processed = {json.loads(line)['path'] for line in f if line.strip()}
+
+    pending = [p for p in files if str(p) not in processed]
+    skipped = len(files) - len(pending)
+    if limit:
+        pending = pending[:limit]
+    print(f"🗂️ Файлов: {len(files)}, уже обработано: {skipped}, к проверке: {len(pending)}")
+
+    progress = Progress()
+    with open(output, 'a', encoding='utf-8') as out:
+        async for path, check, error in analyze_photos_batch(((str(p), p) for p in pending), concurrency=concurrency):
+            record = {'path': path, 'error': error}
+            rejected = False
+            if check is not None:
+                is_valid, message = photo_verdict(check)
+                rejected = not is_valid
+                record.update(face_count=check.face_count, basic_valid=check.basic_valid, valid=is_valid, message=message)
+            # Строка на файл и сразу на диск: это и есть точка возобновления
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            out.flush()
+            progress.add(error, rejected)
+    progress.summary()
+    print(f"📄 Результаты: {output}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Пакетная повторная проверка фотографий")
+    parser.add_argument('--paths', nargs='+', help="Локальные файлы или папки вместо фото из базы")
+    parser.add_argument('--output', default='revalidate_results.jsonl', help="Файл результатов для --paths")
+    parser.add_argument('--concurrency', type=int, default=8, help="Фото в обработке одновременно")
+    parser.add_argument('--limit', type=int, default=0, help="Обработать не больше N фото")
+    parser.add_argument('--reset', action='store_true', help="Игнорировать сохраненную позицию")
+    args = parser.parse_args()
+
+    await face_engine.start()
+    try:
+        if args.paths:
+            await revalidate_paths(args.paths, args.output, args.concurrency, args.limit)
+        else:
+            await photo_downloader.start()
+            db = Database(Config.DATABASE_URL, storage_mode=Config.DB_STORAGE_MODE)
+            await db.init_db()
+            try:
+                await revalidate_database(db, args.concurrency, args.limit, args.reset)
+            finally:
+                await db.close()
+                await photo_downloader.close()
+    finally:
+        face_engine.shutdown()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main())
@@ -1,16 +1,262 @@
-from typing import Optional, Dict, Any
+import asyncio
+import bisect
+import hashlib
+import json
 import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
 from config import Config
 
 logger = logging.getLogger(__name__)
 
-class AIHelper:
+class LatencyHistogram:
+    """Гистограмма времени ответа одного метода AI"""
+    
+    # Верхние границы корзин (сек); последняя корзина - все, что дольше
+    BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0)
+    
     def __init__(self):
+        self.counts: List[int] = [0] * (len(self.BUCKETS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.timeouts = 0
+    
+    def observe(self, elapsed: float):
+        self.counts[bisect.bisect_left(self.BUCKETS, elapsed)] += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+    
+    def percentile(self, q: float) -> Optional[float]:
+        """Верхняя граница корзины, в которую попадает q-й перцентиль"""
+        count = sum(self.counts)
+        if not count:
+            return None
+        threshold = q * count
+        seen = 0
+        for bound, bucket in zip(self.BUCKETS + (self.max,), self.counts):
+            seen += bucket
+            if seen >= threshold:
+                return bound
+        return self.max
+    
+    def stats(self) -> Dict[str, Any]:
+        count = sum(self.counts)
+        labels = [f"<={bound}s" for bound in self.BUCKETS] + [f">{self.BUCKETS[-1]}s"]
+        return {
+            'count': count,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'avg_ms': round(self.total / count * 1000, 1) if count else 0.0,
+            'max_ms': round(self.max * 1000, 1),
+            'p50_s': self.percentile(0.5),
+            'p95_s': self.percentile(0.95),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+class AIResponseCache:
+    """LRU-кэш ответов AI с временем жизни
+    
+    Ключ - хэш метода и всех параметров запроса, поэтому одинаковый запрос
+    (повторное нажатие "улучшить описание", проверка того же текста)
+    не идет в OpenAI повторно. После ``attach(db)`` записи дублируются
+    в таблицу ai_cache и переживают перезапуск; устаревшие строки
+    удаляются при записи не чаще раза в ``ttl / 10`` секунд.
+    """
+    
+    def __init__(self, max_entries: int = 2000, ttl: float = 86400):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.db = None
+        self._entries: 'OrderedDict[str, Tuple[str, int, float]]' = OrderedDict()
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.saved_tokens = 0
+        self._next_purge = 0.0
+    
+    @staticmethod
+    def make_key(method: str, *params) -> str:
+        raw = json.dumps([method, *params], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    async def attach(self, db):
+        """Сохранять ответы в базе; устаревшие записи удаляются сразу"""
+        self.db = db
+        await self._purge(time.time())
+    
+    async def _purge(self, now: float):
+        self._next_purge = now + max(self.ttl / 10, 60.0)
+        await self.db.purge_ai_cache(now)
+    
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            response, tokens, expires_at = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_tokens += tokens
+                return response
+            del self._entries[key]
+        
+        if self.db is not None:
+            try:
+                row = await self.db.get_ai_cache(key, now)
+            except Exception as e:
+                logger.error(f"Failed to read AI cache: {e}")
+                row = None
+            if row is not None:
+                self.db_hits += 1
+                self.saved_tokens += row['tokens']
+                self._remember(key, row['response'], row['tokens'], row['expires_at'])
+                return row['response']
+        
+        # Промах считает вызывающий: запрос мог присоединиться к уже идущему
+        return None
+    
+    async def put(self, key: str, method: str, response: str, tokens: int):
+        if self.ttl <= 0:
+            return
+        now = time.time()
+        expires_at = now + self.ttl
+        self._remember(key, response, tokens, expires_at)
+        if self.db is None:
+            return
+        # Ответ уже получен и оплачен - ошибка базы не должна его терять
+        try:
+            await self.db.save_ai_cache(key, method, response, tokens, expires_at)
+            if now >= self._next_purge:
+                await self._purge(now)
+        except Exception as e:
+            logger.error(f"Failed to save AI cache: {e}")
+    
+    def _remember(self, key: str, response: str, tokens: int, expires_at: float):
+        self._entries[key] = (response, tokens, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.db_hits + self.misses + self.coalesced
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': round((lookups - self.misses) / lookups, 3) if lookups else 0.0,
+            'saved_tokens': self.saved_tokens,
+        }
+
+class AIUnavailable(Exception):
+    """Запрос к AI не отправлялся: автомат разомкнут после серии сбоев"""
+
+class CircuitBreaker:
+    """Автомат отключения запросов к AI
+    
+    * closed - запросы идут как обычно, считаются сбои подряд;
+    * open - после ``failure_threshold`` сбоев подряд запросы сразу
+      отклоняются, и вызывающий без ожидания уходит в локальный fallback;
+    * half_open - через ``recovery_timeout`` секунд пропускается до
+      ``probe_limit`` пробных запросов: успех замыкает автомат, сбой снова
+      размыкает его на ``recovery_timeout``.
+    """
+    
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+    
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0, probe_limit: int = 1):
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self.probe_limit = max(1, probe_limit)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probes = 0
+        self.trips = 0
+        self.rejected = 0
+    
+    def allow(self) -> bool:
+        """Можно ли отправить запрос; в half_open занимает место пробы"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probes = 0
+            logger.info("AI circuit breaker half-open, probing")
+        
+        if self.state == self.HALF_OPEN:
+            if self._probes >= self.probe_limit:
+                self.rejected += 1
+                return False
+            self._probes += 1
+        return True
+    
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("AI circuit breaker closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probes = 0
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+                logger.warning(f"AI circuit breaker opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probes = 0
+    
+    def record_cancelled(self):
+        """Запрос отменен вызывающим - освободить место пробы без вывода"""
+        if self.state == self.HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'trips': self.trips,
+            'rejected': self.rejected,
+        }
+
+def _is_upstream_failure(error: Exception) -> bool:
+    """Сбой на стороне OpenAI (а не ошибка в нашем запросе)"""
+    status = getattr(error, 'status_code', None)
+    return status is None or status == 429 or status >= 500
+
+class AIHelper:
+    def __init__(self, timeout: float = None, max_concurrency: int = None, model: str = "gpt-3.5-turbo"):
+        """
+        :param timeout: Максимальное время одного запроса к OpenAI, без ожидания в очереди (сек)
+        :param max_concurrency: Сколько запросов к OpenAI выполняется одновременно
+        :param model: Модель для всех запросов
+        """
+        self.timeout = timeout if timeout is not None else Config.OPENAI_TIMEOUT
+        self.model = model
+        # Остальные вызовы ждут своей очереди, а не открывают новые соединения
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency or Config.OPENAI_MAX_CONCURRENCY))
+        self._latency: Dict[str, LatencyHistogram] = {}
+        self.cache = AIResponseCache(max_entries=Config.AI_CACHE_SIZE, ttl=Config.AI_CACHE_TTL)
+        self.breaker = CircuitBreaker(
+            failure_threshold=Config.AI_BREAKER_FAILURES,
+            recovery_timeout=Config.AI_BREAKER_RECOVERY
+        )
+        # Одинаковые запросы в полете: остальные ждут результат первого
+        self._inflight: Dict[str, asyncio.Task] = {}
+        
         self.client = None
         if Config.OPENAI_API_KEY and Config.OPENAI_API_KEY != "YOUR_OPENAI_API_KEY_HERE":
             try:
-                from openai import OpenAI
-                self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+                from openai import AsyncOpenAI
+                # Повторы делает сам клиент, но в пределах общего таймаута вызова
+                self.client = AsyncOpenAI(api_key=Config.OPENAI_API_KEY, timeout=self.timeout, max_retries=1)
                 logger.info("OpenAI client initialized successfully")
             except ImportError:
                 logger.warning("OpenAI package not found. AI features will be disabled.")
@@ -19,6 +265,101 @@ class AIHelper:
         else:
             logger.warning("OpenAI API key not found. AI features will be disabled.")
     
+    async def _complete(self, method: str, prompt: str, max_tokens: int, temperature: float,
+                        cached: bool = False) -> str:
+        """Запрос к chat completions без блокировки event loop
+        
+        Сам запрос (после ожидания семафора) ограничен ``self.timeout``;
+        по истечении поднимается ``asyncio.TimeoutError``. Пока автомат
+        ``self.breaker`` разомкнут, сразу поднимается ``AIUnavailable``
+        (ответ из кэша при этом по-прежнему отдается). С ``cached=True``
+        ответ берется из кэша, а одинаковые одновременные запросы
+        выполняются одним обращением к OpenAI.
+        """
+        if not cached:
+            text, _ = await self._request(method, prompt, max_tokens, temperature)
+            return text
+        
+        key = AIResponseCache.make_key(method, self.model, prompt, max_tokens, temperature)
+        task = self._inflight.get(key)
+        if task is None:
+            text = await self.cache.get(key)
+            if text is not None:
+                return text
+            # Пока шла проверка кэша в базе, такой же запрос мог уже уйти
+            task = self._inflight.get(key)
+        
+        if task is not None:
+            self.cache.coalesced += 1
+            text, tokens = await asyncio.shield(task)
+            self.cache.saved_tokens += tokens
+            return text
+        
+        async def fetch():
+            text, tokens = await self._request(method, prompt, max_tokens, temperature)
+            await self.cache.put(key, method, text, tokens)
+            return text, tokens
+        
+        self.cache.misses += 1
+        task = asyncio.create_task(fetch())
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Отмена одного ожидающего не должна отменять запрос для остальных
+        text, _ = await asyncio.shield(task)
+        return text
+    
+    async def _request(self, method: str, prompt: str, max_tokens: int, temperature: float) -> Tuple[str, int]:
+        """Один запрос к OpenAI: текст ответа и потраченные токены"""
+        if not self.breaker.allow():
+            raise AIUnavailable("AI temporarily disabled after repeated failures")
+        
+        histogram = self._latency.setdefault(method, LatencyHistogram())
+        
+        try:
+            # Таймаут и время ответа считаем только для самого запроса: ожидание
+            # семафора - локальная очередь, а не сбой OpenAI для автомата
+            async with self._semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await asyncio.wait_for(
+                        self.client.chat.completions.create(
+                            model=self.model,
+                            messages=[{"role": "user", "content": prompt}],
+                            max_tokens=max_tokens,
+                            temperature=temperature
+                        ),
+                        timeout=self.timeout
+                    )
+                finally:
+                    histogram.observe(time.perf_counter() - started)
+            tokens = response.usage.total_tokens if response.usage else 0
+            result = response.choices[0].message.content.strip(), tokens
+        except asyncio.CancelledError:
+            self.breaker.record_cancelled()
+            raise
+        except asyncio.TimeoutError:
+            histogram.timeouts += 1
+            self.breaker.record_failure()
+            raise
+        except Exception as e:
+            histogram.errors += 1
+            if _is_upstream_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Гистограммы времени ответа по методам"""
+        return {method: histogram.stats() for method, histogram in self._latency.items()}
+    
+    async def close(self):
+        """Закрыть HTTP-соединения клиента"""
+        if self.client is not None:
+            await self.client.close()
+    
     async def improve_bio_with_ai(self, current_bio: str, user_data: Dict[str, Any]) -> Optional[str]:
         """Улучшить описание анкеты с помощью AI"""
         if not self.client:
@@ -48,16 +389,14 @@ class AIHelper:
             Верни только улучшенный текст без дополнительных комментариев.
             """
             
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=200,
-                temperature=0.7
-            )
-            
-            improved_bio = response.choices[0].message.content.strip()
+            improved_bio = await self._complete("improve_bio", prompt, max_tokens=200, temperature=0.7, cached=True)
             return improved_bio
             
+        except AIUnavailable:
+            return None
+        except asyncio.TimeoutError:
+            logger.warning(f"OpenAI request timed out after {self.timeout}s")
+            return None
         except Exception as e:
             logger.error(f"Error improving bio with AI: {e}")
             return None
@@ -91,27 +430,29 @@ class AIHelper:
             3. [третий вариант]
             """
             
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=150,
-                temperature=0.8
-            )
-            
-            starters = response.choices[0].message.content.strip()
+            starters = await self._complete("conversation_starter", prompt, max_tokens=150, temperature=0.8)
             return starters
             
+        except AIUnavailable:
+            return None
+        except asyncio.TimeoutError:
+            logger.warning(f"OpenAI request timed out after {self.timeout}s")
+            return None
         except Exception as e:
             logger.error(f"Error generating conversation starter: {e}")
             return None
     
+    @staticmethod
+    def _basic_content_check(text: str) -> bool:
+        """Базовая проверка без AI"""
+        forbidden_words = ['sex', 'секс', 'интим', 'nsfw', 'porn', 'порно']
+        text_lower = text.lower()
+        return not any(word in text_lower for word in forbidden_words)
+    
     async def check_content_safety(self, text: str) -> bool:
         """Проверить контент на безопасность"""
         if not self.client:
-            # Базовая проверка без AI
-            forbidden_words = ['sex', 'секс', 'интим', 'nsfw', 'porn', 'порно']
-            text_lower = text.lower()
-            return not any(word in text_lower for word in forbidden_words)
+            return self._basic_content_check(text)
         
         try:
             prompt = f"""
@@ -129,22 +470,15 @@ class AIHelper:
             Ответь только "ДА" если текст уместен, или "НЕТ" если неуместен.
             """
             
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=10,
-                temperature=0.1
-            )
-            
-            result = response.choices[0].message.content.strip().upper()
+            result = (await self._complete("content_safety", prompt, max_tokens=10, temperature=0.1, cached=True)).upper()
             return result == "ДА"
             
+        except AIUnavailable:
+            return self._basic_content_check(text)
         except Exception as e:
             logger.error(f"Error checking content: {e}")
             # Fallback к базовой проверке
-            forbidden_words = ['sex', 'секс', 'интим', 'nsfw', 'porn', 'порно']
-            text_lower = text.lower()
-            return not any(word in text_lower for word in forbidden_words)
+            return self._basic_content_check(text)
     
     async def suggest_profile_improvements(self, user_data: Dict[str, Any]) -> Optional[str]:
         """Предложить улучшения для профиля"""
@@ -172,16 +506,14 @@ class AIHelper:
             Будь конструктивным и дружелюбным.
             """
             
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=300,
-                temperature=0.7
-            )
-            
-            suggestions = response.choices[0].message.content.strip()
+            suggestions = await self._complete("profile_suggestions", prompt, max_tokens=300, temperature=0.7, cached=True)
             return suggestions
             
+        except AIUnavailable:
+            return None
+        except asyncio.TimeoutError:
+            logger.warning(f"OpenAI request timed out after {self.timeout}s")
+            return None
         except Exception as e:
             logger.error(f"Error generating profile suggestions: {e}")
             return None
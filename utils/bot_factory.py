@@ -0,0 +1,39 @@
+"""
+Создание единственного экземпляра Bot с общим пулом HTTP-соединений
+"""
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+
+class PooledAiohttpSession(AiohttpSession):
+    """HTTP-сессия aiogram с ограниченным числом одновременных соединений"""
+
+    def __init__(self, limit: int = 100, **kwargs):
+        """
+        :param limit: Максимум одновременно открытых соединений к Bot API
+        """
+        super().__init__(**kwargs)
+        self._connector_init['limit'] = limit
+        self._connector_init['limit_per_host'] = limit
+
+
+def create_bot(token: str, pool_size: int = 100, api_url: Optional[str] = None) -> Bot:
+    """
+    Создать Bot для всего приложения
+
+    Все уведомления должны отправляться через этот экземпляр (в хендлерах он
+    приходит аргументом ``bot``), а не через новый ``Bot(token=...)``: каждый
+    новый экземпляр открывает свою aiohttp-сессию.
+
+    Args:
+        token: Токен бота
+        pool_size: Размер пула HTTP-соединений
+        api_url: Адрес собственного Bot API сервера (по умолчанию api.telegram.org)
+    """
+    session_kwargs = {'limit': pool_size}
+    if api_url:
+        session_kwargs['api'] = TelegramAPIServer.from_base(api_url)
+    return Bot(token=token, session=PooledAiohttpSession(**session_kwargs))
@@ -0,0 +1,96 @@
+"""
+Фоновая генерация идей для начала разговора после матча
+"""
+import asyncio
+import html
+import logging
+from typing import Dict, Tuple
+
+from config import Config
+from database import Database, User
+from utils.ai_helper import AIHelper, ai_helper
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationStarterTasks:
+    """Фоновые задачи генерации стартеров разговора
+
+    Сообщение о матче уходит сразу, а идея для начала разговора
+    генерируется здесь и досылается обоим пользователям отдельным
+    сообщением через очередь уведомлений. Задача, не уложившаяся
+    в ``deadline``, отменяется - поздний совет никому не нужен.
+    """
+
+    def __init__(self, helper: AIHelper = None, deadline: float = None, max_pending: int = None):
+        """
+        :param helper: AIHelper для генерации (по умолчанию глобальный)
+        :param deadline: Максимальное время на одну генерацию (сек)
+        :param max_pending: Сколько генераций может ждать одновременно; лишние пропускаются
+        """
+        self.helper = helper or ai_helper
+        self.deadline = deadline if deadline is not None else Config.CONVERSATION_STARTER_DEADLINE
+        self.max_pending = max_pending if max_pending is not None else Config.CONVERSATION_STARTER_MAX_PENDING
+        self._tasks: Dict[Tuple[int, int], asyncio.Task] = {}
+        self.stats = {'scheduled': 0, 'delivered': 0, 'empty': 0, 'expired': 0, 'skipped': 0}
+
+    def schedule(self, db: Database, user: User, target_user: User) -> bool:
+        """Запустить генерацию для матча, не дожидаясь ее; False - задача не создана"""
+        if self.helper.client is None:
+            return False
+
+        key = tuple(sorted((user.user_id, target_user.user_id)))
+        if key in self._tasks:
+            return False
+        if len(self._tasks) >= self.max_pending:
+            self.stats['skipped'] += 1
+            logger.warning(f"Conversation starter skipped for {key}: {len(self._tasks)} pending")
+            return False
+
+        task = asyncio.create_task(self._deliver(db, user, target_user))
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        self.stats['scheduled'] += 1
+        return True
+
+    async def _deliver(self, db: Database, user: User, target_user: User):
+        user_data = {'name': user.name, 'age': user.age, 'city': user.city, 'bio': user.bio}
+        target_data = {'name': target_user.name, 'age': target_user.age, 'city': target_user.city, 'bio': target_user.bio}
+
+        try:
+            starter = await asyncio.wait_for(
+                self.helper.generate_conversation_starter(user_data, target_data),
+                timeout=self.deadline
+            )
+        except asyncio.TimeoutError:
+            self.stats['expired'] += 1
+            logger.info(f"Conversation starter for {user.user_id}/{target_user.user_id} expired after {self.deadline}s")
+            return
+
+        if not starter:
+            self.stats['empty'] += 1
+            return
+
+        starter = html.escape(starter)
+        try:
+            for recipient, partner in ((user, target_user), (target_user, user)):
+                await db.queue_notification(
+                    recipient.user_id,
+                    f"💡 <b>Идея для начала разговора с {html.escape(partner.name)}:</b>\n<i>{starter}</i>",
+                    parse_mode="HTML"
+                )
+            self.stats['delivered'] += 1
+        except Exception as e:
+            logger.error(f"Failed to queue conversation starter for {user.user_id}/{target_user.user_id}: {e}")
+
+    async def stop(self):
+        """Отменить незавершенные генерации (при остановке бота)"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+# Глобальный экземпляр
+conversation_starters = ConversationStarterTasks()
@@ -1,11 +1,18 @@
 import io
 import asyncio
+import time
 import aiohttp
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image
 import cv2
 import numpy as np
 import logging
-from typing import Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Optional, Tuple, Union
+from config import Config
 
 logger = logging.getLogger(__name__)
 
@@ -17,65 +24,367 @@ except Exception as e:
     logger.error(f"OpenCV not available: {e}")
     OPENCV_AVAILABLE = False
 
+class PhotoTooLarge(Exception):
+    """Файл больше допустимого размера, скачивание прервано"""
+
+class PhotoDownloader:
+    """Скачивание фото через общую aiohttp-сессию
+    
+    Сессия создается при запуске бота (``start``) и закрывается при остановке
+    (``close``): соединения к серверу файлов и DNS переиспользуются между
+    загрузками. Тело ответа читается потоком и обрывается, как только
+    превышен ``max_bytes``. Без запущенной сессии файл скачивается через
+    ``bot.download_file`` (HTTP-сессия самого бота).
+    """
+    
+    CHUNK_SIZE = 64 * 1024
+    
+    def __init__(self, max_bytes: int = 10 * 1024 * 1024, pool_size: int = 20, timeout: float = 30.0):
+        """
+        :param max_bytes: Максимальный размер файла
+        :param pool_size: Максимум одновременных соединений
+        :param timeout: Таймаут скачивания одного файла в секундах
+        """
+        self.max_bytes = max_bytes
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    async def start(self):
+        """Создать общую сессию"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+    
+    async def close(self):
+        """Закрыть общую сессию"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+    
+    async def download(self, bot, file_id: str) -> bytes:
+        """
+        Скачать файл по file_id
+        
+        Raises:
+            PhotoTooLarge: если файл больше max_bytes
+        """
+        file_info = await bot.get_file(file_id)
+        
+        # Telegram сообщает размер заранее - не начинаем заведомо лишнюю загрузку
+        if file_info.file_size and file_info.file_size > self.max_bytes:
+            raise PhotoTooLarge()
+        
+        if self._session is None:
+            buffer = io.BytesIO()
+            # download_file, а не download: get_file уже выполнен
+            await bot.download_file(
+                file_info.file_path, destination=buffer, timeout=int(self.timeout), chunk_size=self.CHUNK_SIZE
+            )
+            if buffer.getbuffer().nbytes > self.max_bytes:
+                raise PhotoTooLarge()
+            return buffer.getvalue()
+        
+        url = bot.session.api.file_url(bot.token, file_info.file_path)
+        async with self._session.get(url, raise_for_status=True) as response:
+            if response.content_length and response.content_length > self.max_bytes:
+                raise PhotoTooLarge()
+            
+            buffer = bytearray()
+            async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+                if len(buffer) + len(chunk) > self.max_bytes:
+                    raise PhotoTooLarge()
+                buffer += chunk
+            return bytes(buffer)
+
+photo_downloader = PhotoDownloader(
+    max_bytes=Config.MAX_PHOTO_SIZE_MB * 1024 * 1024,
+    pool_size=Config.PHOTO_DOWNLOAD_POOL_SIZE
+)
+
 async def download_photo(bot, file_id: str) -> Optional[bytes]:
-    """Скачивает фото по file_id"""
+    """
+    Скачивает фото по file_id
+    
+    Raises:
+        PhotoTooLarge: если файл больше Config.MAX_PHOTO_SIZE_MB
+    """
     try:
-        file_info = await bot.get_file(file_id)
-        file_path = file_info.file_path
-        
-        # Получаем URL для скачивания
-        bot_token = bot.token
-        download_url = f"https://api.telegram.org/file/bot{bot_token}/{file_path}"
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(download_url) as response:
-                if response.status == 200:
-                    return await response.read()
-                else:
-                    logger.error(f"Failed to download photo: HTTP {response.status}")
-                    return None
+        return await photo_downloader.download(bot, file_id)
+    except PhotoTooLarge:
+        raise
     except Exception as e:
         logger.error(f"Error downloading photo: {e}")
         return None
 
-def detect_faces_opencv(image_bytes: bytes) -> Tuple[bool, int]:
+# Флаги уменьшенного декодирования JPEG: декодер сразу выдает картинку в 2/4/8 раз меньше
+_REDUCED_GRAYSCALE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+# Минимальный размер лица в пикселях исходного фото
+MIN_FACE_SIZE = 30
+# Меньше окна каскада (24x24) искать бессмысленно
+_CASCADE_WINDOW = 24
+
+def _decode_for_detection(image_bytes: bytes, max_side: Optional[int]) -> Tuple[Optional[np.ndarray], float]:
+    """
+    Декодировать фото в оттенки серого с длинной стороной не больше max_side
+    
+    Уменьшенное декодирование JPEG выбирается с самым большим коэффициентом,
+    при котором длинная сторона остается не меньше max_side или лицо
+    MIN_FACE_SIZE остается не меньше окна каскада. Фото Telegram (до 1280 px)
+    при max_side 1024 декодируются целиком и только затем уменьшаются.
+    
+    Returns:
+        Tuple[Optional[np.ndarray], float]: (изображение или None, во сколько раз
+        уменьшено относительно исходного)
+    """
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    if not max_side:
+        return cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE), 1.0
+    
+    # Размер берем из заголовка, не декодируя пиксели
+    try:
+        width, height = Image.open(io.BytesIO(image_bytes)).size
+    except Exception:
+        width = height = 0
+    long_side = max(width, height)
+    
+    flag, factor = cv2.IMREAD_GRAYSCALE, 1
+    for reduction, reduced_flag in _REDUCED_GRAYSCALE_FLAGS:
+        if long_side // reduction >= max_side or MIN_FACE_SIZE // reduction >= _CASCADE_WINDOW:
+            flag, factor = reduced_flag, reduction
+            break
+    
+    gray = cv2.imdecode(nparr, flag)
+    if gray is None:
+        return None, 1.0
+    
+    # Реальный коэффициент: для не-JPEG уменьшенное декодирование может не сработать
+    scale = max(gray.shape[:2]) / long_side if long_side else 1.0
+    if max(gray.shape[:2]) > max_side:
+        resize = max_side / max(gray.shape[:2])
+        gray = cv2.resize(gray, None, fx=resize, fy=resize, interpolation=cv2.INTER_AREA)
+        scale *= resize
+    return gray, scale
+
+def detect_face_boxes(image_bytes: bytes, cascade, max_side: Optional[int] = None) -> Tuple[Optional[list], Dict[str, float]]:
+    """
+    Найти лица на фото, при необходимости предварительно уменьшив его
+    
+    Args:
+        image_bytes: Содержимое файла
+        cascade: Haar-каскад
+        max_side: Максимальная длинная сторона для детекции (None - исходный размер)
+        
+    Returns:
+        Tuple[Optional[list], Dict[str, float]]: (рамки лиц (x, y, w, h) в координатах
+        исходного фото или None, если изображение не декодировалось; длительность
+        этапов в секундах)
+    """
+    timings = {}
+    started = time.perf_counter()
+    gray, scale = _decode_for_detection(image_bytes, max_side)
+    timings['decode'] = time.perf_counter() - started
+    
+    if gray is None:
+        return None, timings
+    
+    # minSize задан для исходного фото - пересчитываем под уменьшенное
+    min_size = max(_CASCADE_WINDOW, round(MIN_FACE_SIZE * scale))
+    
+    started = time.perf_counter()
+    faces = cascade.detectMultiScale(
+        gray,
+        scaleFactor=1.1,
+        minNeighbors=5,
+        minSize=(min_size, min_size),
+        flags=cv2.CASCADE_SCALE_IMAGE
+    )
+    timings['detect'] = time.perf_counter() - started
+    
+    boxes = [tuple(int(round(v / scale)) for v in face) for face in faces]
+    return boxes, timings
+
+def _count_faces(image_bytes: bytes, cascade, max_side: Optional[int] = None) -> Tuple[Optional[int], Dict[str, float]]:
+    """Количество лиц (None, если изображение не декодировалось) и время этапов"""
+    boxes, timings = detect_face_boxes(image_bytes, cascade, max_side)
+    return (None if boxes is None else len(boxes)), timings
+
+def detect_faces_opencv(image_bytes: bytes, max_side: Optional[int] = None) -> Tuple[bool, int]:
     """
-    Детекция лиц с помощью OpenCV
+    Детекция лиц с помощью OpenCV (синхронно, в текущем процессе)
+    
+    Args:
+        image_bytes: Содержимое файла
+        max_side: Уменьшить фото до этой длинной стороны перед детекцией
     
     Returns:
         Tuple[bool, int]: (есть ли лица, количество лиц)
     """
     try:
-        # Конвертируем bytes в numpy array
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        face_count, _ = _count_faces(image_bytes, face_cascade, max_side)
         
-        if image is None:
+        if face_count is None:
             logger.error("Failed to decode image")
             return False, 0
         
-        # Конвертируем в градации серого для детекции
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Детектируем лица
-        faces = face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30),
-            flags=cv2.CASCADE_SCALE_IMAGE
-        )
-        
-        face_count = len(faces)
-        has_faces = face_count > 0
-        
         logger.info(f"Detected {face_count} faces using OpenCV")
-        return has_faces, face_count
+        return face_count > 0, face_count
         
     except Exception as e:
         logger.error(f"Error in OpenCV face detection: {e}")
         return False, 0
 
+# Каскад процесса-воркера: загружается один раз при старте процесса
+_worker_cascade = None
+
+def _init_worker():
+    global _worker_cascade
+    _worker_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+def _detect_in_worker(image_bytes: bytes, submitted_at: float, max_side: Optional[int]) -> Tuple[Optional[int], Dict[str, float]]:
+    """Задача для процесса-воркера: время в очереди + декодирование + детекция"""
+    queued = time.time() - submitted_at
+    face_count, timings = _count_faces(image_bytes, _worker_cascade, max_side)
+    timings['queue'] = max(0.0, queued)
+    return face_count, timings
+
+def _warmup_worker() -> bool:
+    return _worker_cascade is not None
+
+class FaceDetectionBusy(Exception):
+    """Очередь детекции переполнена, фото нужно отправить позже"""
+
+class FaceDetectionEngine:
+    """Детекция лиц в пуле процессов
+    
+    Декодирование и detectMultiScale занимают сотни миллисекунд на больших
+    фото и блокировали бы event loop. Здесь они выполняются в отдельных
+    процессах; число одновременных задач ограничено ``max_pending``.
+    """
+    
+    STAGES = ('queue', 'decode', 'detect', 'total')
+    
+    def __init__(self, workers: int = 2, max_pending: int = 32, max_side: Optional[int] = 1024):
+        """
+        :param workers: Количество процессов-воркеров
+        :param max_pending: Максимум фото в обработке и в очереди одновременно
+        :param max_side: Длинная сторона фото для детекции (0/None - без уменьшения)
+        """
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.max_side = max_side or None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._metrics = {stage: {'count': 0, 'total': 0.0, 'max': 0.0} for stage in self.STAGES}
+        self.rejected = 0
+        self.failed = 0
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+            logger.info(f"Face detection pool started with {self.workers} workers")
+        return self._executor
+    
+    async def start(self):
+        """Заранее запустить воркеры и загрузить в них каскад"""
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(executor, _warmup_worker) for _ in range(self.workers)])
+    
+    def shutdown(self):
+        """Остановить процессы-воркеры"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            logger.info("Face detection pool stopped")
+    
+    async def detect(self, image_bytes: bytes) -> Tuple[bool, int]:
+        """
+        Детекция лиц в пуле процессов
+        
+        Returns:
+            Tuple[bool, int]: (есть ли лица, количество лиц)
+        
+        Raises:
+            FaceDetectionBusy: если в обработке уже max_pending фото
+        """
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise FaceDetectionBusy()
+        
+        self._pending += 1
+        started = time.perf_counter()
+        executor = self._get_executor()
+        try:
+            loop = asyncio.get_running_loop()
+            face_count, timings = await loop.run_in_executor(
+                executor, _detect_in_worker, image_bytes, time.time(), self.max_side
+            )
+        except BrokenProcessPool:
+            # Воркер упал (например, OOM) - пересоздаем пул при следующем запросе
+            self.failed += 1
+            if self._executor is executor:
+                # Сломанный пул сам не завершает поток управления и оставшиеся процессы
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            raise
+        finally:
+            self._pending -= 1
+        
+        timings['total'] = time.perf_counter() - started
+        self._record(timings)
+        
+        if face_count is None:
+            logger.error("Failed to decode image")
+            return False, 0
+        
+        logger.info(
+            f"Detected {face_count} faces using OpenCV "
+            f"(queue {timings['queue'] * 1000:.0f} ms, decode {timings['decode'] * 1000:.0f} ms, "
+            f"detect {timings['detect'] * 1000:.0f} ms)"
+        )
+        return face_count > 0, face_count
+    
+    def _record(self, timings: Dict[str, float]):
+        for stage, value in timings.items():
+            metric = self._metrics[stage]
+            metric['count'] += 1
+            metric['total'] += value
+            metric['max'] = max(metric['max'], value)
+    
+    def stats(self) -> Dict[str, object]:
+        """Статистика пула: очередь, отказы и время этапов в миллисекундах"""
+        stages = {
+            stage: {
+                'count': metric['count'],
+                'avg_ms': round(metric['total'] / metric['count'] * 1000, 3) if metric['count'] else 0.0,
+                'max_ms': round(metric['max'] * 1000, 3),
+            }
+            for stage, metric in self._metrics.items()
+        }
+        return {
+            'workers': self.workers,
+            'pending': self._pending,
+            'max_pending': self.max_pending,
+            'rejected': self.rejected,
+            'failed': self.failed,
+            'stages': stages,
+        }
+
+face_engine = FaceDetectionEngine(
+    workers=Config.FACE_DETECTION_WORKERS,
+    max_pending=Config.FACE_DETECTION_MAX_PENDING,
+    max_side=Config.FACE_DETECTION_MAX_SIDE
+)
+
 def detect_faces_pil_basic(image_bytes: bytes) -> Tuple[bool, int]:
     """
     Базовая проверка изображения с помощью PIL
@@ -114,9 +423,215 @@ def detect_faces_pil_basic(image_bytes: bytes) -> Tuple[bool, int]:
         logger.error(f"Error in PIL basic validation: {e}")
         return False, 0
 
+@dataclass
+class PhotoCheck:
+    """Результат анализа фото, не зависящий от того, главное оно или нет"""
+    face_count: Optional[int]  # None - OpenCV недоступен
+    basic_valid: bool  # Прошло ли базовую проверку PIL
+
+class PhotoCheckCache:
+    """LRU-кэш результатов проверки фото по file_unique_id
+    
+    file_unique_id одинаков для одного и того же файла у всех пользователей
+    и при повторной загрузке, поэтому детекцию достаточно выполнить один раз.
+    Если передана база, результаты дополнительно сохраняются в таблицу
+    photo_checks и переживают перезапуск.
+    """
+    
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max(1, max_entries)
+        self._entries: 'OrderedDict[str, PhotoCheck]' = OrderedDict()
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+    
+    async def get(self, file_unique_id: str, db=None) -> Optional[PhotoCheck]:
+        check = self._entries.get(file_unique_id)
+        if check is not None:
+            self._entries.move_to_end(file_unique_id)
+            self.hits += 1
+            return check
+        
+        if db is not None:
+            row = await db.get_photo_check(file_unique_id)
+            if row is not None:
+                self.db_hits += 1
+                check = PhotoCheck(face_count=row['face_count'], basic_valid=bool(row['basic_valid']))
+                self._remember(file_unique_id, check)
+                return check
+        
+        self.misses += 1
+        return None
+    
+    async def put(self, file_unique_id: str, check: PhotoCheck, db=None):
+        self._remember(file_unique_id, check)
+        if db is not None:
+            await db.save_photo_check(file_unique_id, check.face_count, check.basic_valid)
+    
+    def _remember(self, file_unique_id: str, check: PhotoCheck):
+        self._entries[file_unique_id] = check
+        self._entries.move_to_end(file_unique_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+        }
+
+photo_checks = PhotoCheckCache(max_entries=Config.PHOTO_CHECK_CACHE_SIZE)
+
+class PhotoCheckError(Exception):
+    """Фото не удалось проверить (результат не кэшируется)"""
+
+_PHOTO_TOO_LARGE_MESSAGE = f"❌ Фото слишком большое (максимум {Config.MAX_PHOTO_SIZE_MB}MB)"
+
+async def analyze_photo(bot, file_id: str) -> PhotoCheck:
+    """
+    Скачать фото один раз и выполнить все проверки
+    
+    Raises:
+        PhotoCheckError: с сообщением для пользователя, если фото не скачалось,
+        слишком большое или очередь детекции переполнена
+    """
+    # Скачиваем фото (размер ограничивается прямо во время загрузки)
+    try:
+        image_bytes = await download_photo(bot, file_id)
+    except PhotoTooLarge:
+        raise PhotoCheckError(_PHOTO_TOO_LARGE_MESSAGE)
+    if not image_bytes:
+        raise PhotoCheckError("❌ Не удалось загрузить фото")
+    
+    return await analyze_photo_bytes(image_bytes)
+
+async def analyze_photo_bytes(image_bytes: bytes) -> PhotoCheck:
+    """Проверки уже скачанного фото"""
+    basic_valid, _ = detect_faces_pil_basic(image_bytes)
+    
+    # Если OpenCV недоступен, остается только базовая проверка
+    if not OPENCV_AVAILABLE:
+        logger.warning("OpenCV not available, using basic image validation")
+        return PhotoCheck(face_count=None, basic_valid=basic_valid)
+    
+    # Детекция лиц в пуле процессов, не блокируя бота
+    try:
+        _, face_count = await face_engine.detect(image_bytes)
+    except FaceDetectionBusy:
+        logger.warning("Face detection queue is full, photo rejected")
+        raise PhotoCheckError("⏳ Сейчас слишком много загрузок. Попробуй отправить фото еще раз через минуту")
+    
+    return PhotoCheck(face_count=face_count, basic_valid=basic_valid)
+
+async def _analyze_source(bot, source: Union[str, Path]) -> PhotoCheck:
+    """Проверить фото по file_id или по локальному пути"""
+    if isinstance(source, Path):
+        if source.stat().st_size > photo_downloader.max_bytes:
+            raise PhotoCheckError(_PHOTO_TOO_LARGE_MESSAGE)
+        image_bytes = await asyncio.to_thread(source.read_bytes)
+        return await analyze_photo_bytes(image_bytes)
+    return await analyze_photo(bot, source)
+
+async def analyze_photos_batch(
+    items: Union[Iterable[Tuple[Any, Union[str, Path]]], AsyncIterable[Tuple[Any, Union[str, Path]]]],
+    bot=None,
+    concurrency: int = 8
+) -> AsyncIterator[Tuple[Any, Optional[PhotoCheck], Optional[str]]]:
+    """
+    Пакетная проверка фото (например, для повторной модерации)
+    
+    Скачивание идет не более чем в ``concurrency`` потоков, детекция - в пуле
+    процессов ``face_engine``. Результаты отдаются по мере готовности, не
+    обязательно в порядке входа.
+    
+    Args:
+        items: Пары (ключ, источник); источник - file_id (нужен bot) или Path
+        bot: Bot instance для скачивания по file_id
+        concurrency: Максимум фото в обработке одновременно
+        
+    Yields:
+        Tuple[Any, Optional[PhotoCheck], Optional[str]]: (ключ, результат или None,
+        сообщение об ошибке или None)
+    """
+    # Не больше, чем пул детекции принимает без отказа
+    concurrency = max(1, min(concurrency, face_engine.max_pending))
+    sources: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    results: asyncio.Queue = asyncio.Queue()
+    done_marker = object()
+    
+    async def produce():
+        try:
+            if hasattr(items, '__aiter__'):
+                async for item in items:
+                    await sources.put(item)
+            else:
+                for item in items:
+                    await sources.put(item)
+        finally:
+            # Останавливаем воркеры, даже если источник упал
+            for _ in range(concurrency):
+                await sources.put(None)
+    
+    async def work():
+        try:
+            while True:
+                item = await sources.get()
+                if item is None:
+                    break
+                key, source = item
+                try:
+                    await results.put((key, await _analyze_source(bot, source), None))
+                except PhotoCheckError as e:
+                    await results.put((key, None, str(e)))
+                except Exception as e:
+                    logger.error(f"Error checking photo {key}: {e}")
+                    await results.put((key, None, f"❌ Ошибка при обработке фото: {e}"))
+        finally:
+            await results.put(done_marker)
+    
+    tasks = [asyncio.create_task(produce())]
+    tasks += [asyncio.create_task(work()) for _ in range(concurrency)]
+    try:
+        finished = 0
+        while finished < concurrency:
+            result = await results.get()
+            if result is done_marker:
+                finished += 1
+                continue
+            yield result
+        # Пробрасываем ошибку чтения источника, если она была
+        await tasks[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def photo_verdict(check: PhotoCheck, is_main_photo: bool = True) -> Tuple[bool, str]:
+    """Итог проверки фото для пользователя"""
+    if check.face_count is None:
+        if check.basic_valid:
+            return True, "✅ Фото принято (базовая проверка)"
+        return False, "❌ Фото не подходит. Убедись что это качественное фото"
+    
+    if check.face_count == 1:
+        return True, "✅ Обнаружено лицо на фото"
+    
+    if check.face_count > 1:
+        message = f"❌ На фото должно быть только одно лицо (обнаружено: {check.face_count})"
+    else:
+        message = "❌ На фото не обнаружено лицо. Загрузи фото где четко видно твое лицо"
+    
+    # Для дополнительных фото допускаем, но предупреждаем
+    if not is_main_photo and check.basic_valid:
+        return True, "⚠️ Фото принято, но лучше загружать фото с лицом"
+    
+    return False, message
+
 async def detect_faces_in_photo(bot, file_id: str) -> Tuple[bool, str]:
     """
-    Основная функция для детекции лиц в фото
+    Основная функция для детекции лиц в фото (без кэша)
     
     Args:
         bot: Bot instance
@@ -126,71 +641,48 @@ async def detect_faces_in_photo(bot, file_id: str) -> Tuple[bool, str]:
         Tuple[bool, str]: (результат проверки, сообщение об ошибке/успехе)
     """
     try:
-        # Скачиваем фото
-        image_bytes = await download_photo(bot, file_id)
-        if not image_bytes:
-            return False, "❌ Не удалось загрузить фото"
-        
-        # Проверяем размер файла (максимум 10MB)
-        if len(image_bytes) > 10 * 1024 * 1024:
-            return False, "❌ Фото слишком большое (максимум 10MB)"
-        
-        # Пробуем OpenCV детекцию лиц
-        if OPENCV_AVAILABLE:
-            has_faces, face_count = detect_faces_opencv(image_bytes)
-            
-            if has_faces:
-                if face_count == 1:
-                    return True, "✅ Обнаружено лицо на фото"
-                else:
-                    return False, f"❌ На фото должно быть только одно лицо (обнаружено: {face_count})"
-            else:
-                return False, "❌ На фото не обнаружено лицо. Загрузи фото где четко видно твое лицо"
-        
-        # Если OpenCV недоступен, используем базовую проверку
-        else:
-            logger.warning("OpenCV not available, using basic image validation")
-            is_valid, _ = detect_faces_pil_basic(image_bytes)
-            
-            if is_valid:
-                return True, "✅ Фото принято (базовая проверка)"
-            else:
-                return False, "❌ Фото не подходит. Убедись что это качественное фото"
-    
+        return photo_verdict(await analyze_photo(bot, file_id), is_main_photo=True)
+    except PhotoCheckError as e:
+        return False, str(e)
     except Exception as e:
         logger.error(f"Error in face detection: {e}")
         return False, "❌ Ошибка при обработке фото"
 
-async def validate_profile_photo(bot, file_id: str, is_main_photo: bool = True) -> Tuple[bool, str]:
+async def validate_profile_photo(
+    bot,
+    file_id: str,
+    is_main_photo: bool = True,
+    file_unique_id: Optional[str] = None,
+    db=None
+) -> Tuple[bool, str]:
     """
     Валидация фото для профиля
     
+    Фото скачивается не более одного раза, а результат анализа кэшируется
+    по file_unique_id, так что повторная загрузка того же файла детекцию
+    не запускает.
+    
     Args:
         bot: Bot instance  
         file_id: Telegram file ID
         is_main_photo: Является ли главным фото (для главного фото требования строже)
+        file_unique_id: Постоянный ID файла для кэша результатов
+        db: База данных для сохранения результатов между перезапусками
         
     Returns:
         Tuple[bool, str]: (результат валидации, сообщение)
     """
-    # Для главного фото требуем обязательную детекцию лица
-    if is_main_photo:
-        return await detect_faces_in_photo(bot, file_id)
-    
-    # Для дополнительных фото можем быть менее строгими
-    has_face, message = await detect_faces_in_photo(bot, file_id)
+    try:
+        check = await photo_checks.get(file_unique_id, db) if file_unique_id else None
+        if check is None:
+            check = await analyze_photo(bot, file_id)
+            if file_unique_id:
+                await photo_checks.put(file_unique_id, check, db)
+        
+        return photo_verdict(check, is_main_photo)
     
-    if has_face:
-        return True, message
-    else:
-        # Для дополнительных фото допускаем, но предупреждаем
-        try:
-            image_bytes = await download_photo(bot, file_id)
-            if image_bytes:
-                is_valid, _ = detect_faces_pil_basic(image_bytes)
-                if is_valid:
-                    return True, "⚠️ Фото принято, но лучше загружать фото с лицом"
-        except:
-            pass
-        
-        return False, message
+    except PhotoCheckError as e:
+        return False, str(e)
+    except Exception as e:
+        logger.error(f"Error in face detection: {e}")
+        return False, "❌ Ошибка при обработке фото"
@@ -0,0 +1,306 @@
+"""
+Офлайн-определение города по координатам
+
+Города берутся из data/cities.csv.gz (GeoNames, см. data/build_cities.py)
+и раскладываются в KD-дерево по точкам на единичной сфере: евклидово
+расстояние между такими точками монотонно с расстоянием по поверхности
+Земли, поэтому ближайший сосед в дереве - ближайший город без проблем
+со 180-м меридианом и полюсами.
+"""
+import asyncio
+import csv
+import gzip
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+UNKNOWN_CITY = "Неизвестный город"
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'cities.csv.gz')
+
+
+@dataclass
+class City:
+    """Город из набора данных"""
+    name: str
+    country_code: str
+    latitude: float
+    longitude: float
+    population: int = 0
+
+
+def to_unit_vectors(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Широта/долгота в градусах -> точки (x, y, z) на единичной сфере"""
+    lat = np.radians(latitudes)
+    lon = np.radians(longitudes)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def chord_to_km(chord: float) -> float:
+    """Длина хорды единичной сферы -> расстояние по поверхности Земли"""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+class KDTree:
+    """Статическое KD-дерево для поиска ближайшей точки
+
+    Строится один раз с помощью NumPy (разбиение по медиане вдоль оси
+    наибольшего разброса). Узлы хранятся в плоских списках, а координаты
+    листьев - кортежами: для одиночных запросов обычный Python быстрее,
+    чем множество мелких вызовов NumPy.
+    """
+
+    def __init__(self, points: np.ndarray, leaf_size: int = 16):
+        self.leaf_size = max(1, leaf_size)
+        self._order: List[int] = []
+        self._coords: List[Tuple[float, ...]] = []
+        # Для узла i: ось разбиения (-1 - лист), значение разбиения,
+        # левый и правый потомок; для листа - диапазон в _order/_coords
+        self._axis: List[int] = []
+        self._split: List[float] = []
+        self._left: List[int] = []
+        self._right: List[int] = []
+        if len(points):
+            self._build(np.asarray(points, dtype=np.float64), np.arange(len(points)))
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def _new_node(self) -> int:
+        self._axis.append(-1)
+        self._split.append(0.0)
+        self._left.append(0)
+        self._right.append(0)
+        return len(self._axis) - 1
+
+    def _build(self, points: np.ndarray, indices: np.ndarray):
+        # Явный стек вместо рекурсии: (узел, индексы точек)
+        root = self._new_node()
+        stack = [(root, indices)]
+        while stack:
+            node, idx = stack.pop()
+            subset = points[idx]
+            if len(idx) <= self.leaf_size:
+                start = len(self._order)
+                self._order.extend(idx.tolist())
+                self._coords.extend(map(tuple, subset.tolist()))
+                self._left[node], self._right[node] = start, len(self._order)
+                continue
+
+            axis = int(np.argmax(subset.max(axis=0) - subset.min(axis=0)))
+            middle = len(idx) // 2
+            partition = np.argpartition(subset[:, axis], middle)
+            self._axis[node] = axis
+            self._split[node] = float(subset[partition[middle], axis])
+            left, right = self._new_node(), self._new_node()
+            self._left[node], self._right[node] = left, right
+            stack.append((left, idx[partition[:middle]]))
+            stack.append((right, idx[partition[middle:]]))
+
+    def query(self, point: Tuple[float, float, float]) -> Tuple[int, float]:
+        """Индекс ближайшей точки и евклидово расстояние до нее"""
+        if not self._order:
+            return -1, math.inf
+
+        best_index, best_sq = -1, math.inf
+        axis_of, split_of, left_of, right_of = self._axis, self._split, self._left, self._right
+        coords, order = self._coords, self._order
+        px, py, pz = point
+        # (узел, нижняя оценка квадрата расстояния до его области, смещения по осям)
+        stack = [(0, 0.0, (0.0, 0.0, 0.0))]
+        while stack:
+            node, bound_sq, offsets = stack.pop()
+            if bound_sq >= best_sq:
+                continue
+            axis = axis_of[node]
+            if axis < 0:
+                for i in range(left_of[node], right_of[node]):
+                    x, y, z = coords[i]
+                    sq = (x - px) ** 2 + (y - py) ** 2 + (z - pz) ** 2
+                    if sq < best_sq:
+                        best_sq, best_index = sq, order[i]
+                continue
+
+            diff = point[axis] - split_of[node]
+            near, far = (left_of[node], right_of[node]) if diff < 0 else (right_of[node], left_of[node])
+            # Оценка для дальнего поддерева: смещение по оси разбиения заменяется на diff
+            far_offsets = list(offsets)
+            far_offsets[axis] = diff
+            far_bound = bound_sq - offsets[axis] ** 2 + diff * diff
+            # Дальнее поддерево кладем в стек первым, чтобы ближнее обошлось раньше
+            stack.append((far, far_bound, tuple(far_offsets)))
+            stack.append((near, bound_sq, offsets))
+        return best_index, math.sqrt(best_sq)
+
+
+class ReverseGeocoder:
+    """Определение ближайшего города по координатам
+
+    Основной путь - KD-дерево по локальному набору городов. Ответы
+    кэшируются по координатам, округленным до ``precision`` знаков
+    (2 знака - около 1 км). Запрос к Nominatim делается только если
+    включен ``online_fallback`` и ближе ``max_distance_km`` городов нет.
+    """
+
+    NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
+    # Правила Nominatim: не больше одного запроса в секунду
+    NOMINATIM_INTERVAL = 1.0
+
+    def __init__(
+        self,
+        dataset_path: str = DEFAULT_DATASET,
+        max_distance_km: float = 100.0,
+        cache_size: int = 10000,
+        precision: int = 2,
+        online_fallback: bool = False
+    ):
+        """
+        :param dataset_path: CSV (можно .gz) с колонками latitude, longitude, name, country_code, population
+        :param max_distance_km: Дальше этого расстояния город считается не найденным
+        :param cache_size: Сколько округленных координат держать в кэше
+        :param precision: До скольких знаков округлять координаты для кэша
+        :param online_fallback: Спрашивать Nominatim, если город не найден офлайн
+        """
+        self.dataset_path = dataset_path
+        self.max_distance_km = max_distance_km
+        self.cache_size = max(1, cache_size)
+        self.precision = precision
+        self.online_fallback = online_fallback
+
+        self.cities: List[City] = []
+        self._tree: Optional[KDTree] = None
+        self._cache: 'OrderedDict[Tuple[float, float], str]' = OrderedDict()
+        self._session = None
+        self._online_lock = asyncio.Lock()
+        self._online_last = 0.0
+        self.stats = {'lookups': 0, 'cache_hits': 0, 'offline': 0, 'online': 0, 'unknown': 0}
+
+    def load(self):
+        """Загрузить набор городов и построить дерево (доли секунды, вызывать один раз)"""
+        opener = gzip.open if self.dataset_path.endswith('.gz') else open
+        cities = []
+        with opener(self.dataset_path, 'rt', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                cities.append(City(
+                    name=row['name'],
+                    country_code=row['country_code'],
+                    latitude=float(row['latitude']),
+                    longitude=float(row['longitude']),
+                    population=int(row.get('population') or 0)
+                ))
+
+        latitudes = np.fromiter((c.latitude for c in cities), dtype=np.float64, count=len(cities))
+        longitudes = np.fromiter((c.longitude for c in cities), dtype=np.float64, count=len(cities))
+        self._tree = KDTree(to_unit_vectors(latitudes, longitudes))
+        self.cities = cities
+        logger.info(f"Reverse geocoder loaded {len(cities)} cities")
+
+    @property
+    def loaded(self) -> bool:
+        return self._tree is not None
+
+    def nearest(self, lat: float, lon: float) -> Tuple[Optional[City], float]:
+        """Ближайший город и расстояние до него (км)"""
+        if self._tree is None:
+            self.load()
+        lat_rad, lon_rad = math.radians(lat), math.radians(lon)
+        cos_lat = math.cos(lat_rad)
+        point = (cos_lat * math.cos(lon_rad), cos_lat * math.sin(lon_rad), math.sin(lat_rad))
+        index, chord = self._tree.query(point)
+        if index < 0:
+            return None, math.inf
+        return self.cities[index], chord_to_km(chord)
+
+    async def city_name(self, lat: float, lon: float) -> str:
+        """Название города для координат (или "Неизвестный город")"""
+        self.stats['lookups'] += 1
+        key = (round(lat, self.precision), round(lon, self.precision))
+        name = self._cache.get(key)
+        if name is not None:
+            self._cache.move_to_end(key)
+            self.stats['cache_hits'] += 1
+            return name
+
+        if self._tree is None:
+            await asyncio.to_thread(self.load)
+
+        city, distance = self.nearest(lat, lon)
+        if city is not None and distance <= self.max_distance_km:
+            self.stats['offline'] += 1
+            name = city.name
+        elif self.online_fallback:
+            name = await self._lookup_online(lat, lon)
+            if name is None:
+                # Сетевую ошибку не кэшируем - в следующий раз можно повторить
+                self.stats['unknown'] += 1
+                return UNKNOWN_CITY
+            self.stats['online'] += 1
+        else:
+            self.stats['unknown'] += 1
+            name = UNKNOWN_CITY
+
+        self._cache[key] = name
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return name
+
+    async def _lookup_online(self, lat: float, lon: float) -> Optional[str]:
+        """Запрос к OpenStreetMap Nominatim; None - запрос не удался"""
+        import aiohttp
+
+        async with self._online_lock:
+            wait = self._online_last + self.NOMINATIM_INTERVAL - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._online_last = time.monotonic()
+
+            try:
+                if self._session is None or self._session.closed:
+                    self._session = aiohttp.ClientSession(
+                        headers={'User-Agent': 'Meet Bot'},
+                        timeout=aiohttp.ClientTimeout(total=5)
+                    )
+                params = {'format': 'json', 'lat': lat, 'lon': lon, 'zoom': 10, 'addressdetails': 1}
+                async with self._session.get(self.NOMINATIM_URL, params=params) as response:
+                    if response.status != 200:
+                        logger.warning(f"Nominatim returned HTTP {response.status}")
+                        return None
+                    data = await response.json()
+            except Exception as e:
+                logger.error(f"Ошибка при получении города: {e}")
+                return None
+
+        # Извлекаем город из ответа
+        address = data.get('address', {})
+        return (address.get('city') or
+                address.get('town') or
+                address.get('village') or
+                address.get('municipality') or
+                address.get('county') or
+                UNKNOWN_CITY)
+
+    async def close(self):
+        """Закрыть HTTP-сессию запасного онлайн-поиска"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+# Глобальный экземпляр
+reverse_geocoder = ReverseGeocoder(
+    dataset_path=Config.GEOCODER_DATASET or DEFAULT_DATASET,
+    max_distance_km=Config.GEOCODER_MAX_DISTANCE_KM,
+    cache_size=Config.GEOCODER_CACHE_SIZE,
+    online_fallback=Config.GEOCODER_ONLINE_FALLBACK
+)
@@ -0,0 +1,201 @@
+"""
+Фоновая отправка уведомлений из очереди notification_outbox
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationSender:
+    """Отправитель уведомлений с учетом лимитов Telegram
+
+    Хендлеры только ставят сообщения в очередь (``Database.queue_*``),
+    а эта задача отправляет их в фоне:
+
+    * не чаще ``global_rate`` сообщений в секунду на весь бот;
+    * не чаще одного сообщения в ``per_chat_interval`` секунд в один чат;
+    * при ``RetryAfter`` вся отправка приостанавливается на указанное время;
+    * при сетевых ошибках - повтор с экспоненциальной задержкой.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        db: Database,
+        global_rate: float = 30.0,
+        per_chat_interval: float = 1.0,
+        max_attempts: int = 5,
+        batch_size: int = 100,
+        poll_interval: float = 5.0
+    ):
+        """
+        :param bot: Общий экземпляр бота
+        :param db: База данных с очередью уведомлений
+        :param global_rate: Максимум сообщений в секунду на весь бот
+        :param per_chat_interval: Минимальный интервал между сообщениями в один чат (сек)
+        :param max_attempts: Сколько раз пытаться отправить сообщение
+        :param batch_size: Сколько уведомлений забирать из базы за раз
+        :param poll_interval: Как часто проверять очередь без сигнала (сек)
+        """
+        self.bot = bot
+        self.db = db
+        self.send_interval = 1.0 / global_rate if global_rate > 0 else 0.0
+        self.per_chat_interval = per_chat_interval
+        self.max_attempts = max(1, max_attempts)
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+
+        self._task: Optional[asyncio.Task] = None
+        self._next_send_at = 0.0
+        self._paused_until = 0.0
+        # Ближайшее время, на которое отложено уведомление в текущем проходе
+        self._wake_at = 0.0
+        self._chat_last_sent: Dict[int, float] = {}
+        self.stats = {'sent': 0, 'dropped': 0, 'retried': 0, 'retry_after': 0}
+
+    def start(self):
+        """Запустить фоновую отправку"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info("Отправитель уведомлений запущен")
+
+    async def stop(self):
+        """Остановить отправку (неотправленное остается в базе)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Отправитель уведомлений остановлен")
+
+    async def _run(self):
+        while True:
+            # Сбрасываем сигнал до выборки: сообщения, поставленные во время
+            # отправки, разбудят следующую итерацию
+            self.db.outbox_ready.clear()
+            try:
+                delay = await self._process_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification sender error: {e}")
+                delay = self.poll_interval
+
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.db.outbox_ready.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _process_due(self) -> float:
+        """Отправить наступившие уведомления; возвращает паузу до следующей проверки"""
+        now = time.time()
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        notifications = await self.db.get_due_notifications(now, limit=self.batch_size)
+        if not notifications:
+            return self.poll_interval
+
+        sent = []
+        self._wake_at = time.time() + self.poll_interval
+        for notification in notifications:
+            chat_id = notification['chat_id']
+            now = time.time()
+            if now < self._paused_until:
+                break
+
+            # Лимит на чат: откладываем, а не ждем, чтобы не задерживать остальных
+            chat_ready_at = self._chat_last_sent.get(chat_id, 0.0) + self.per_chat_interval
+            if now < chat_ready_at:
+                await self._reschedule(notification, chat_ready_at, notification['attempts'])
+                continue
+
+            await self._wait_global_slot()
+            if await self._send(notification):
+                sent.append(notification)
+
+        await self.db.complete_notifications(sent)
+        self._forget_idle_chats()
+        if len(notifications) == self.batch_size:
+            return 0.0
+        return max(0.0, self._wake_at - time.time())
+
+    async def _reschedule(self, notification: Dict[str, Any], next_attempt_at: float, attempts: int):
+        self._wake_at = min(self._wake_at, next_attempt_at)
+        await self.db.reschedule_notification(notification['notification_id'], next_attempt_at, attempts)
+
+    async def _wait_global_slot(self):
+        now = time.monotonic()
+        if now < self._next_send_at:
+            await asyncio.sleep(self._next_send_at - now)
+            now = self._next_send_at
+        self._next_send_at = now + self.send_interval
+
+    async def _send(self, notification: Dict[str, Any]) -> bool:
+        """Отправить одно уведомление; True - удалить его из очереди"""
+        chat_id = notification['chat_id']
+
+        if notification['kind'] == 'likes':
+            # Текст собирается сейчас: все лайки, накопившиеся в очереди, идут одним сообщением
+            text = await self.db.get_likes_notification_text(chat_id)
+            if text is None:
+                return True
+            parse_mode = "HTML"
+        else:
+            text = notification['text']
+            parse_mode = notification['parse_mode']
+
+        try:
+            await self.bot.send_message(
+                chat_id=chat_id,
+                text=text,
+                parse_mode=parse_mode,
+                disable_web_page_preview=bool(notification['disable_web_page_preview'])
+            )
+        except TelegramRetryAfter as e:
+            self.stats['retry_after'] += 1
+            self._paused_until = time.time() + e.retry_after
+            logger.warning(f"Telegram flood control: pausing notifications for {e.retry_after}s")
+            await self._reschedule(notification, self._paused_until, notification['attempts'])
+            return False
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Бот заблокирован или чат недоступен - повтор не поможет
+            self.stats['dropped'] += 1
+            logger.info(f"Notification to {chat_id} dropped: {e}")
+            return True
+        except Exception as e:
+            attempts = notification['attempts'] + 1
+            if attempts >= self.max_attempts:
+                self.stats['dropped'] += 1
+                logger.error(f"Notification to {chat_id} dropped after {attempts} attempts: {e}")
+                return True
+            self.stats['retried'] += 1
+            backoff = min(2 ** attempts, 300)
+            logger.warning(f"Notification to {chat_id} failed, retry in {backoff}s: {e}")
+            await self._reschedule(notification, time.time() + backoff, attempts)
+            return False
+
+        self.stats['sent'] += 1
+        self._chat_last_sent[chat_id] = time.time()
+        return True
+
+    def _forget_idle_chats(self):
+        """Не держать в памяти чаты, лимит которых уже истек"""
+        threshold = time.time() - self.per_chat_interval
+        for chat_id in [c for c, sent_at in self._chat_last_sent.items() if sent_at < threshold]:
+            del self._chat_last_sent[chat_id]
@@ -0,0 +1,146 @@
+"""
+Прием обновлений через webhook (альтернатива long polling)
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """Обработчик webhook с ограничением одновременно работающих хендлеров
+
+    Telegram получает ответ 200 сразу после разбора JSON, а обновление
+    обрабатывается в фоне. Одновременно выполняется не больше
+    ``max_concurrency`` обновлений, остальные ждут семафора. Если
+    в ожидании скопилось ``max_pending`` обновлений, новые отклоняются
+    с кодом 503 - Telegram доставит их повторно позже, а память бота
+    не растет без предела.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        max_concurrency: int = 64,
+        max_pending: int = 1000,
+        secret_token: Optional[str] = None,
+        **data: Any
+    ):
+        """
+        :param max_concurrency: Сколько обновлений обрабатывается одновременно
+        :param max_pending: Сколько принятых обновлений может быть в работе и очереди
+        :param secret_token: Секрет из setWebhook (заголовок X-Telegram-Bot-Api-Secret-Token)
+        """
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_pending = max(self.max_concurrency, max_pending)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # Время от приема до конца обработки для последних обновлений
+        self._latencies: Deque[float] = deque(maxlen=10000)
+        self.counters = {'accepted': 0, 'rejected': 0, 'handled': 0, 'failed': 0}
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        if len(self._background_feed_update_tasks) >= self.max_pending:
+            self.counters['rejected'] += 1
+            return web.Response(status=503, text="Overloaded")
+
+        update = await request.json(loads=bot.session.json_loads)
+        task = asyncio.create_task(self._bounded_feed_update(bot, update, time.perf_counter()))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        self.counters['accepted'] += 1
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def _bounded_feed_update(self, bot: Bot, update: Dict[str, Any], received: float):
+        async with self._semaphore:
+            try:
+                await self._background_feed_update(bot=bot, update=update)
+                self.counters['handled'] += 1
+            except Exception as e:
+                self.counters['failed'] += 1
+                logger.error(f"Webhook update {update.get('update_id')} failed: {e}")
+            finally:
+                self._latencies.append(time.perf_counter() - received)
+
+    async def close(self):
+        """Дождаться обновлений в работе; сессию бота закрывает main"""
+        tasks = list(self._background_feed_update_tasks)
+        if tasks:
+            logger.info(f"Waiting for {len(tasks)} webhook updates to finish")
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+
+        def percentile(q: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2)
+
+        return {
+            **self.counters,
+            'in_flight': len(self._background_feed_update_tasks),
+            'p50_ms': percentile(0.5),
+            'p99_ms': percentile(0.99),
+        }
+
+
+class WebhookServer:
+    """aiohttp-сервер, принимающий обновления Telegram"""
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        host: str = '0.0.0.0',
+        port: int = 8080,
+        path: str = '/webhook',
+        secret_token: Optional[str] = None,
+        max_concurrency: int = 64,
+        max_pending: int = 1000,
+        **data: Any
+    ):
+        """
+        :param host: Адрес, на котором слушать
+        :param port: Порт (0 - любой свободный, см. ``port`` после start)
+        :param path: Путь, на который Telegram отправляет обновления
+        :param data: Дополнительные данные для хендлеров (как в start_polling)
+        """
+        self.host = host
+        self.port = port
+        self.path = path
+        self.handler = BoundedRequestHandler(
+            dispatcher,
+            bot,
+            max_concurrency=max_concurrency,
+            max_pending=max_pending,
+            secret_token=secret_token,
+            **data
+        )
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self):
+        """Начать принимать запросы"""
+        app = web.Application()
+        self.handler.register(app, path=self.path)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # При port=0 узнаем, какой порт выдала система
+        self.port = site._server.sockets[0].getsockname()[1]
+        logger.info(f"Webhook server listening on {self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        """Перестать принимать запросы и дождаться обновлений в работе"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
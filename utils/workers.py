@@ -0,0 +1,286 @@
+"""
+Многопроцессный режим: входной процесс и воркеры, разделенные по user_id
+
+Входной процесс только получает обновления (long polling или webhook),
+достает из них user_id и кладет в очередь воркера ``user_id % N``.
+Все обновления одного пользователя попадают в один процесс и
+обрабатываются там по очереди, поэтому состояние FSM, лимиты, колода и
+множество просмотренных анкет пользователя живут в одном воркере, а разные
+пользователи распределяются по ядрам.
+
+Анкеты же кэшируются в каждом воркере, который их показывал, поэтому
+сбросы кэша Database рассылаются остальным воркерам через
+``InvalidationBus``. Запись в базу у каждого воркера своя: транзакции
+разных процессов по очереди ждут блокировку SQLite (BEGIN IMMEDIATE
+и busy_timeout пула).
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import queue
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.methods import TelegramMethod
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+def update_user_id(update: Dict[str, Any]) -> int:
+    """user_id автора обновления (0, если автора нет, например у опросов)"""
+    for key, value in update.items():
+        if key == 'update_id' or not isinstance(value, dict):
+            continue
+        author = value.get('from') or value.get('user') or value.get('chat')
+        if isinstance(author, dict):
+            return author.get('id') or 0
+    return 0
+
+
+class UpdateRouter:
+    """Раскладывает обновления по очередям воркеров (входной процесс)"""
+
+    def __init__(self, queues: List[Any]):
+        """
+        :param queues: multiprocessing.Queue для каждого воркера (с maxsize)
+        """
+        self.queues = queues
+        self.stats = {'routed': [0] * len(queues), 'full': 0}
+
+    def shard(self, update: Dict[str, Any]) -> int:
+        return update_user_id(update) % len(self.queues)
+
+    def route(self, update: Dict[str, Any]) -> bool:
+        """Передать обновление воркеру; False - очередь воркера заполнена"""
+        index = self.shard(update)
+        try:
+            self.queues[index].put_nowait(update)
+        except queue.Full:
+            self.stats['full'] += 1
+            return False
+        self.stats['routed'][index] += 1
+        return True
+
+    def stop_workers(self):
+        """Попросить воркеры завершиться после уже полученных обновлений"""
+        for worker_queue in self.queues:
+            worker_queue.put(None)
+
+
+async def poll_updates(
+    router: UpdateRouter,
+    token: str,
+    api_url: Optional[str] = None,
+    allowed_updates: Optional[List[str]] = None,
+    timeout: int = 30
+):
+    """Long polling во входном процессе
+
+    Обновления не превращаются в объекты aiogram - воркеру передается
+    разобранный JSON. Если очередь воркера заполнена, опрос ждет: так
+    сохраняется порядок обновлений и Telegram копит их у себя.
+    """
+    api = TelegramAPIServer.from_base(api_url) if api_url else PRODUCTION
+    url = api.api_url(token=token, method='getUpdates')
+    offset = 0
+    backoff = 1.0
+    client_timeout = aiohttp.ClientTimeout(total=timeout + 10)
+
+    async with aiohttp.ClientSession(timeout=client_timeout) as session:
+        while True:
+            payload = {'offset': offset, 'timeout': timeout, 'allowed_updates': allowed_updates}
+            try:
+                async with session.post(url, json=payload) as response:
+                    data = await response.json(loads=json.loads)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"getUpdates failed: {e}, retrying in {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            if not data.get('ok'):
+                logger.error(f"getUpdates error: {data.get('description')}, retrying in {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            backoff = 1.0
+
+            for update in data['result']:
+                while not router.route(update):
+                    await asyncio.sleep(0.05)
+                offset = update['update_id'] + 1
+
+
+def create_webhook_app(router: UpdateRouter, path: str, secret_token: Optional[str] = None) -> web.Application:
+    """aiohttp-приложение входного процесса: прием webhook и раскладка по воркерам"""
+
+    async def handle(request: web.Request) -> web.Response:
+        if secret_token and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret_token:
+            return web.Response(status=401, text="Unauthorized")
+        update = await request.json(loads=json.loads)
+        if not router.route(update):
+            # Telegram повторит доставку позже
+            return web.Response(status=503, text="Overloaded")
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    return app
+
+
+class WorkerFeeder:
+    """Обработка обновлений из очереди в процессе-воркере
+
+    Обновления одного пользователя выполняются строго по очереди, разных
+    пользователей - параллельно, но не больше ``max_concurrency`` сразу.
+    Из очереди забирается не больше ``max_pending`` обновлений: дальше
+    очередь заполняется, и входной процесс притормаживает прием.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        updates: Any,
+        max_concurrency: int = 64,
+        max_pending: int = 1000,
+        **data: Any
+    ):
+        """
+        :param updates: multiprocessing.Queue от входного процесса (None - завершиться)
+        :param max_concurrency: Сколько обновлений обрабатывается одновременно
+        :param max_pending: Сколько обновлений может быть в работе и ожидании
+        :param data: Дополнительные данные для хендлеров
+        """
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.updates = updates
+        self.data = data
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        # Освобождается из цикла событий, ждет в потоке чтения очереди
+        self._pending = threading.Semaphore(max(1, max_pending))
+        # Очередь обработки каждого пользователя: замок и число ждущих обновлений
+        self._user_locks: Dict[int, asyncio.Lock] = {}
+        self._user_pending: Dict[int, int] = {}
+        self._tasks = set()
+        self.stats = {'handled': 0, 'failed': 0}
+
+    async def run(self):
+        """Обрабатывать обновления до сигнала завершения, затем дождаться начатых"""
+        loop = asyncio.get_running_loop()
+        finished = asyncio.Event()
+
+        def dispatch(update: Optional[Dict[str, Any]]):
+            if update is None:
+                finished.set()
+                return
+            task = asyncio.create_task(self._feed(update))
+            self._tasks.add(task)
+            task.add_done_callback(self._task_done)
+
+        def read():
+            # Блокирующее чтение очереди - в отдельном потоке, чтобы не держать цикл событий
+            while True:
+                self._pending.acquire()
+                update = self.updates.get()
+                loop.call_soon_threadsafe(dispatch, update)
+                if update is None:
+                    return
+
+        threading.Thread(target=read, name='update-reader', daemon=True).start()
+        parent = multiprocessing.parent_process()
+        while not finished.is_set():
+            try:
+                await asyncio.wait_for(finished.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                # Входной процесс упал и команды завершиться не будет
+                if parent is not None and not parent.is_alive():
+                    logger.error("Front process is gone, stopping worker")
+                    break
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._pending.release()
+
+    async def _feed(self, update: Dict[str, Any]):
+        user_id = update_user_id(update)
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = self._user_locks[user_id] = asyncio.Lock()
+        self._user_pending[user_id] = self._user_pending.get(user_id, 0) + 1
+        try:
+            # Задачи создаются в порядке очереди, а Lock пропускает ждущих по порядку
+            async with lock, self._semaphore:
+                result = await self.dispatcher.feed_raw_update(self.bot, update, **self.data)
+                if isinstance(result, TelegramMethod):
+                    await self.dispatcher.silent_call_request(self.bot, result)
+                self.stats['handled'] += 1
+        except Exception as e:
+            self.stats['failed'] += 1
+            logger.error(f"Update {update.get('update_id')} failed: {e}")
+        finally:
+            self._user_pending[user_id] -= 1
+            if not self._user_pending[user_id]:
+                del self._user_pending[user_id]
+                del self._user_locks[user_id]
+
+
+class InvalidationBus:
+    """Рассылка сбросов кэшей Database между воркерами
+
+    У каждого воркера своя очередь (multiprocessing.Queue без ограничения
+    размера): сброс, сделанный в одном воркере, кладется в очереди всех
+    остальных, а поток чтения применяет входящие сбросы в цикле событий.
+    """
+
+    def __init__(self, index: int, queues: List[Any]):
+        """
+        :param index: Номер текущего воркера
+        :param queues: Очереди сбросов всех воркеров (одинаковый список у всех)
+        """
+        self.index = index
+        self.queues = queues
+        self.stats = {'sent': 0, 'received': 0}
+
+    def publish(self, kind: str, user_ids: Tuple[int, ...]):
+        """Отправить сброс остальным воркерам (не блокирует)"""
+        for index, peer_queue in enumerate(self.queues):
+            if index != self.index:
+                peer_queue.put_nowait((kind, user_ids))
+        self.stats['sent'] += 1
+
+    def start(self, db: Any):
+        """Применять сбросы других воркеров к db (``Database.apply_invalidation``)"""
+        loop = asyncio.get_running_loop()
+
+        def apply(message: Tuple[str, Tuple[int, ...]]):
+            self.stats['received'] += 1
+            db.apply_invalidation(*message)
+
+        def read():
+            own_queue = self.queues[self.index]
+            while True:
+                message = own_queue.get()
+                if message is None:
+                    return
+                try:
+                    loop.call_soon_threadsafe(apply, message)
+                except RuntimeError:
+                    # Цикл событий уже закрыт - воркер завершается
+                    return
+
+        threading.Thread(target=read, name='invalidation-reader', daemon=True).start()
+
+    def stop(self):
+        """Остановить чтение; неотправленные сбросы уже остановленным воркерам не ждем"""
+        self.queues[self.index].put(None)
+        for index, peer_queue in enumerate(self.queues):
+            if index != self.index:
+                peer_queue.cancel_join_thread()